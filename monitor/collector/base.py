@@ -1,5 +1,32 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Callable, Optional, TypeVar
+import heapq
+
+T = TypeVar("T")
+
+
+def top_k(
+        items: Iterable[T],
+        n: int,
+        key: Callable[[T], Any],
+        build: Optional[Callable[[T], Dict[str, Any]]] = None,
+) -> List[Any]:
+    """
+    流式 Top-K：边消费 items 边维护大小为 n 的最小堆，内存 O(n)，耗时 O(N log n)。
+    结果按 key 降序排列，key 相同时保持输入顺序；build 仅对最终胜出的元素调用，用于构造返回的 dict。
+    """
+    if n <= 0:
+        return []
+    heap = []
+    for i, item in enumerate(items):
+        k = key(item)
+        # 堆元素为 (key, -序号, item)：key 相同时先淘汰后出现的元素
+        if len(heap) < n:
+            heapq.heappush(heap, (k, -i, item))
+        elif k > heap[0][0]:
+            heapq.heapreplace(heap, (k, -i, item))
+    heap.sort(reverse=True)
+    return [build(item) if build else item for _, _, item in heap]
 
 
 class Collector(ABC):
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : conntrack.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : TCP 连接表跟踪：批量解析 /proc/net/tcp{,6}，相邻快照做集合差分得到新建/关闭/状态变化的连接，
+              增量维护连接首次出现时间、状态直方图和按对端地址的聚合。
+"""
+import re
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from .base import top_k
+from .net_accounting import TCP_STATES
+
+TCP_FILES = ("tcp", "tcp6")
+LISTEN = "0A"
+
+# 只取 local、remote、state 三列；findall 在 C 层完成整文件匹配，Python 层只处理变化的连接
+# 每行中 ": " 只出现在行首序号之后，无需锚定行首
+_ROW = re.compile(r": ([0-9A-F]+:[0-9A-F]{4}) ([0-9A-F]+:[0-9A-F]{4}) ([0-9A-F]{2}) ")
+
+Row = Tuple[str, str, str]  # (local, remote, state)，地址为内核原始十六进制
+
+
+def decode_ip(hex_ip: str) -> str:
+    """/proc/net/tcp 中的地址按 32 位字以主机字节序存放（小端），逐字翻转后再格式化"""
+    raw = bytes.fromhex(hex_ip)
+    raw = b"".join(raw[i:i + 4][::-1] for i in range(0, len(raw), 4))
+    return socket.inet_ntop(socket.AF_INET if len(raw) == 4 else socket.AF_INET6, raw)
+
+
+def decode_addr(hex_addr: str) -> str:
+    ip, _, port = hex_addr.partition(":")
+    ip = decode_ip(ip)
+    return f"[{ip}]:{int(port, 16)}" if ":" in ip else f"{ip}:{int(port, 16)}"
+
+
+def _is_unspecified(hex_ip: str) -> bool:
+    return not hex_ip.strip("0")
+
+
+def read_rows(root: str = "/proc") -> Set[Row]:
+    rows: Set[Row] = set()
+    for proto in TCP_FILES:
+        try:
+            with open(f"{root}/net/{proto}") as f:
+                rows.update(_ROW.findall(f.read()))
+        except OSError:
+            continue
+    return rows
+
+
+class ConnectionTracker:
+    """
+    连接表跟踪器：
+    - 每次刷新整体读取连接表，与上一次的行集合做差集，只对新增/消失的行做 Python 层处理；
+    - 同一四元组仅状态变化时保留其首次出现时间；
+    - 启动时已存在的连接没有可靠的建立时间，只计入状态和对端统计，不进入“最近连接”。
+    """
+
+    def __init__(self, min_interval: float = 1.0, recent_size: int = 4096, root: str = "/proc"):
+        self.min_interval = min_interval
+        self.root = root
+        self._rows: Set[Row] = set()
+        self._conns: Dict[Tuple[str, str], Tuple[str, Optional[float]]] = {}  # (local, remote) -> (状态码, 首次出现时间)
+        self._states: Dict[str, int] = {}  # 状态码 -> 连接数
+        self._peers: Dict[str, Dict[str, int]] = {}  # 对端 IP（十六进制）-> {状态码: 连接数}
+        self._recent: deque = deque(maxlen=recent_size)  # (首次出现时间, (local, remote))
+        self._timestamp = 0.0
+        self._lock = threading.Lock()
+
+    # -------- 增量维护 --------
+    def _count(self, row: Row, delta: int) -> None:
+        local, remote, state = row
+        self._states[state] = self._states.get(state, 0) + delta
+        if not self._states[state]:
+            del self._states[state]
+        peer = remote.partition(":")[0]
+        if state == LISTEN or _is_unspecified(peer):
+            return
+        states = self._peers.setdefault(peer, {})
+        states[state] = states.get(state, 0) + delta
+        if not states[state]:
+            del states[state]
+            if not states:
+                del self._peers[peer]
+
+    def _apply(self, rows: Set[Row], now: Optional[float]) -> None:
+        removed = self._rows - rows
+        added = rows - self._rows
+        for row in removed:
+            self._count(row, -1)
+        changed = {(local, remote) for local, remote, _ in added} & {(local, remote) for local, remote, _ in removed}
+        for local, remote, _ in removed:
+            if (local, remote) not in changed:
+                self._conns.pop((local, remote), None)
+        for row in added:
+            self._count(row, 1)
+            key = row[:2]
+            if key in changed:
+                self._conns[key] = (row[2], self._conns[key][1])
+                continue
+            self._conns[key] = (row[2], now)
+            if now is not None and row[2] != LISTEN:
+                self._recent.append((now, key))
+        self._rows = rows
+
+    def refresh(self, force: bool = False) -> None:
+        """刷新连接表，距上次刷新不足 min_interval 时跳过；读取连接表不持锁，查询不必等待解析完成"""
+        now = time.time()
+        if not force and self._timestamp and now - self._timestamp < self.min_interval:
+            return
+        rows = read_rows(self.root)
+        with self._lock:
+            # 第一次刷新作为基准，不记录首次出现时间
+            self._apply(rows, now if self._timestamp else None)
+            self._timestamp = now
+
+    # -------- 查询（只读取后台采样线程刷新的结果） --------
+    def _describe(self, key: Tuple[str, str], now: float) -> Dict[str, Any]:
+        local, remote = key
+        state, first_seen = self._conns[key]
+        return {
+            "laddr": decode_addr(local),
+            "raddr": None if _is_unspecified(remote.partition(":")[0]) else decode_addr(remote),
+            "status": TCP_STATES.get(state, state),
+            "first_seen": first_seen,
+            "age": round(now - first_seen, 3) if first_seen else None,
+        }
+
+    def recent(self, n: int = 5) -> List[Dict[str, Any]]:
+        """返回最近新建的 n 条连接（按首次出现时间倒序），已关闭的连接不返回"""
+        with self._lock:
+            now, result = time.time(), []
+            for first_seen, key in reversed(self._recent):
+                # 同一四元组可能关闭后重建，只认当前这一次出现的记录
+                if key not in self._conns or self._conns[key][1] != first_seen:
+                    continue
+                result.append(self._describe(key, now))
+                if len(result) >= n:
+                    break
+            return result
+
+    def states(self) -> Dict[str, int]:
+        """返回各 TCP 状态的连接数"""
+        with self._lock:
+            counts = {TCP_STATES.get(code, code): count for code, count in self._states.items()}
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def peers(self, n: int = 10) -> List[Dict[str, Any]]:
+        """返回连接数最多的 n 个对端地址及其连接状态分布"""
+        with self._lock:
+            items = [(peer, dict(states)) for peer, states in self._peers.items()]
+        return top_k(
+            items, n,
+            key=lambda item: sum(item[1].values()),
+            build=lambda item: {
+                "peer": decode_ip(item[0]),
+                "connections": sum(item[1].values()),
+                "states": {TCP_STATES.get(code, code): count for code, count in item[1].items()},
+            },
+        )
+
+
+# 模块级共享实例，由后台采样线程定期刷新
+tracker = ConnectionTracker()
+
+
+if __name__ == "__main__":
+    # 基准：合成 20 万条连接的 /proc/net/tcp，对比全量解析与每轮 1% 变化时的增量刷新耗时
+    import argparse
+    import os
+    import random
+    import tempfile
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--conns", type=int, default=200000)
+    args = parser.parse_args()
+
+    header = "  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode\n"
+    line = "{:4d}: 0100000A:{:04X} {:08X}:{:04X} {} 00000000:00000000 00:00000000 00000000     0        0 {} 1 0 20 4 30 10 -1\n"
+
+    def make_conns(count):
+        return [(random.randrange(1024, 65535), random.getrandbits(32), random.randrange(1, 65535),
+                 random.choice(["01", "01", "01", "06", "08"])) for _ in range(count)]
+
+    def write(root, conns):
+        with open(os.path.join(root, "net", "tcp"), "w") as f:
+            f.write(header)
+            f.writelines(line.format(i, lp, rip, rp, st, i + 1000) for i, (lp, rip, rp, st) in enumerate(conns))
+
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, "net"))
+        conns = make_conns(args.conns)
+        write(root, conns)
+        t = ConnectionTracker(min_interval=0, root=root)
+        start = time.perf_counter()
+        t.refresh()
+        print(f"baseline: {args.conns} conns in {time.perf_counter() - start:.3f}s")
+
+        churn = args.conns // 100
+        conns = conns[churn:] + make_conns(churn)
+        write(root, conns)
+        start = time.perf_counter()
+        t.refresh()
+        print(f"refresh with {churn} new/{churn} closed: {time.perf_counter() - start:.3f}s")
+        print("states:", t.states())
+        print("recent:", t.recent(3))
+        print("peers:", t.peers(3))
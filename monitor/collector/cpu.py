@@ -1,5 +1,6 @@
 import psutil
-from .base import Collector
+from .base import Collector, top_k
+from .proc_table import ProcessTable
 from typing import List, Dict, Any
 import time
 
@@ -7,6 +8,10 @@ import time
 class CPUCollector(Collector):
     """CPU 与内存使用情况采集器"""
 
+    def __init__(self):
+        # top() 与 recent() 共用同一张进程表
+        self.table = ProcessTable()
+
     def collect(self) -> dict:
         try:
             cpu_percent = psutil.cpu_percent(interval=0.5, percpu=False)
@@ -35,32 +40,23 @@ class CPUCollector(Collector):
         返回当前占用 CPU 百分比最高的 n 个进程。
         每项包含 pid、name、cpu_percent。
         """
-        procs = []
-        for p in psutil.process_iter(['pid', 'name']):
-            try:
-                cpu = p.cpu_percent(interval=0.1)
-                procs.append({'pid': p.pid, 'name': p.info['name'], 'cpu_percent': cpu})
-            except Exception:
-                continue
-        procs.sort(key=lambda x: x['cpu_percent'], reverse=True)
-        return procs[:n]
+        return top_k(
+            self.table.processes(), n,
+            key=lambda p: p['cpu_percent'],
+            build=lambda p: {'pid': p['pid'], 'name': p['name'], 'cpu_percent': p['cpu_percent']}
+        )
 
     def recent(self, n: int = 5) -> List[Dict[str, Any]]:
         """
         返回最近创建的 n 个进程。
         每项包含 pid、name、create_time。
         """
-        procs = []
-        for p in psutil.process_iter(['pid', 'name', 'create_time']):
-            try:
-                procs.append({
-                    'pid': p.pid,
-                    'name': p.info['name'],
-                    'create_time': time.strftime(
-                        "%Y-%m-%d %H:%M:%S", time.localtime(p.info['create_time'])
-                    )
-                })
-            except Exception:
-                continue
-        procs.sort(key=lambda x: x['create_time'], reverse=True)
-        return procs[:n]
+        return top_k(
+            self.table.processes(), n,
+            key=lambda p: p['create_time'],
+            build=lambda p: {
+                'pid': p['pid'],
+                'name': p['name'],
+                'create_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(p['create_time']))
+            }
+        )
@@ -1,30 +1,45 @@
 import psutil
-from .base import Collector
-from typing import List, Dict, Any
+from .base import Collector, top_k
+from .fs_index import FileIndex
+from .mounts import MountProber
+from .walker import iter_files
+from .rates import RateTracker
+from typing import List, Dict, Any, Iterator, Tuple
+import logging
+import threading
 import time
-import os
+
+logger = logging.getLogger("monitor.disk")
+
+# 索引未覆盖 path 时回退为实时遍历的上限：超时（秒）、最大深度、最多检查的文件数。
+# 达到任一上限即停止，结果只来自已遍历的部分
+FALLBACK_TIMEOUT = 10.0
+FALLBACK_MAX_DEPTH = 32
+FALLBACK_MAX_FILES = 1_000_000
 
 class DiskCollector(Collector):
     """磁盘使用情况采集器"""
 
+    def __init__(self):
+        # 文件索引，由后台爬虫维护；未覆盖的路径回退为实时遍历
+        self.index = FileIndex()
+        # I/O 计数转速率（读写次数即 IOPS）
+        self.io_rates = RateTracker({"read_count": "read_iops", "write_count": "write_iops"})
+        # 各挂载点的 statvfs 并发执行并设超时，失联的网络文件系统会被隔离
+        self.mounts = MountProber()
+
     def collect(self) -> dict:
         result = {}
         try:
-            # 遍历所有分区
-            for part in psutil.disk_partitions(all=False):
-                try:
-                    usage = psutil.disk_usage(part.mountpoint)
-                    result[part.device] = {
-                        "mountpoint": part.mountpoint,
-                        "fstype": part.fstype,
-                        "total": usage.total,
-                        "used": usage.used,
-                        "free": usage.free,
-                        "percent": usage.percent,
-                    }
-                except PermissionError:
-                    # 某些系统分区可能无法访问
-                    result[part.device] = {"error": "permission denied"}
+            # 遍历所有分区；容量探测超时或被隔离的挂载点只返回状态
+            partitions = psutil.disk_partitions(all=False)
+            usage = self.mounts.probe(part.mountpoint for part in partitions)
+            for part in partitions:
+                result[part.device] = {
+                    "mountpoint": part.mountpoint,
+                    "fstype": part.fstype,
+                    **usage[part.mountpoint],
+                }
             # 还可以采集总体 I/O 统计
             io_counters = psutil.disk_io_counters()
             result["io"] = {
@@ -33,43 +48,71 @@ class DiskCollector(Collector):
                 "read_bytes": io_counters.read_bytes,
                 "write_bytes": io_counters.write_bytes,
             }
+            # 与上一次采集的差值得到速率：总体及每块磁盘的 IOPS、字节/秒
+            samples = {
+                disk: {
+                    "read_count": c.read_count,
+                    "write_count": c.write_count,
+                    "read_bytes": c.read_bytes,
+                    "write_bytes": c.write_bytes,
+                }
+                for disk, c in psutil.disk_io_counters(perdisk=True).items()
+            }
+            samples["_total"] = result["io"]
+            rates = self.io_rates.update(samples)
+            result["io_rate"] = rates.pop("_total", {})
+            result["io_rate_per_disk"] = rates
             return result
         except Exception as e:
             return {"error": f"DiskCollector failed: {e}"}
 
+    @staticmethod
+    def _walk_files(path: str) -> Iterator[Tuple[str, int, float]]:
+        """有上限的实时遍历，超时由取消令牌结束遍历（包括正卡在慢目录上的情况）"""
+        cancel = threading.Event()
+        timer = threading.Timer(FALLBACK_TIMEOUT, cancel.set)
+        timer.daemon = True
+        timer.start()
+        try:
+            for i, item in enumerate(iter_files(path, max_depth=FALLBACK_MAX_DEPTH, cancel=cancel)):
+                if i >= FALLBACK_MAX_FILES:
+                    logger.warning(f"实时遍历 {path} 超过 {FALLBACK_MAX_FILES} 个文件，结果不完整")
+                    return
+                yield item
+            if cancel.is_set():
+                logger.warning(f"实时遍历 {path} 超过 {FALLBACK_TIMEOUT}s，结果不完整")
+        finally:
+            timer.cancel()
+            cancel.set()
+
     def top(self, n: int = 5, path: str = '/') -> List[Dict[str, Any]]:
         """
         返回指定目录下（默认为根）最大的 n 个文件。
-        每项包含 file_path、size。
+        每项包含 file_path、size。索引未覆盖时实时遍历（有时间与数量上限），会阻塞，需在线程中调用。
         """
-        files = []
-        for root, _, filenames in os.walk(path):
-            for fn in filenames:
-                full = os.path.join(root, fn)
-                try:
-                    size = os.path.getsize(full)
-                    files.append({'file_path': full, 'size': size})
-                except Exception:
-                    continue
-        files.sort(key=lambda x: x['size'], reverse=True)
-        return files[:n]
+        if self.index.covers(path):
+            return [{'file_path': p, 'size': size} for p, size in self.index.top(n, path)]
+        return top_k(
+            self._walk_files(path), n,
+            key=lambda x: x[1],
+            build=lambda x: {'file_path': x[0], 'size': x[1]}
+        )
 
     def recent(self, n: int = 5, path: str = '/') -> List[Dict[str, Any]]:
         """
         返回指定目录下最近创建的 n 个文件。
-        每项包含 file_path、create_time。
+        每项包含 file_path、create_time。索引未覆盖时实时遍历（有时间与数量上限），会阻塞，需在线程中调用。
         """
-        files = []
-        for root, _, filenames in os.walk(path):
-            for fn in filenames:
-                full = os.path.join(root, fn)
-                try:
-                    c = os.path.getctime(full)
-                    files.append({
-                        'file_path': full,
-                        'create_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(c))
-                    })
-                except Exception:
-                    continue
-        files.sort(key=lambda x: x['create_time'], reverse=True)
-        return files[:n]
\ No newline at end of file
+        if self.index.covers(path):
+            return [
+                {'file_path': p, 'create_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(c))}
+                for p, c in self.index.recent(n, path)
+            ]
+        return top_k(
+            self._walk_files(path), n,
+            key=lambda x: x[2],
+            build=lambda x: {
+                'file_path': x[0],
+                'create_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(x[2]))
+            }
+        )
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : fs_index.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 基于 SQLite 的文件索引，后台增量爬取目录，供 DiskCollector 查询最大/最近的文件。
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from .walker import parallel_walk, DirScan, DEFAULT_EXCLUDE, DEFAULT_WORKERS
+
+logger = logging.getLogger("monitor.fs_index")
+
+# 索引数据库位置
+INDEX_DB_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sys-monitor", "fs_index.db")
+# 需要建立索引的根目录
+INDEX_ROOTS = ["/"]
+# 不进入的伪文件系统目录
+EXCLUDE_DIRS = set(DEFAULT_EXCLUDE)
+# 是否只在根目录所在的文件系统内爬取（其他挂载点需单独加入 INDEX_ROOTS）
+ONE_FILESYSTEM = True
+# 爬取线程数
+CRAWL_WORKERS = DEFAULT_WORKERS
+# 两轮爬取之间的间隔（秒）
+CRAWL_INTERVAL = 600
+# 每隔多少轮做一次全量重扫（目录 mtime 不反映文件原地修改导致的大小变化）
+FULL_RESCAN_EVERY = 24
+# 每处理多少个目录提交一次事务
+COMMIT_EVERY = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime REAL);
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, dir TEXT, size INTEGER, ctime REAL);
+CREATE TABLE IF NOT EXISTS roots (path TEXT PRIMARY KEY, crawled REAL, dev INTEGER);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent);
+CREATE INDEX IF NOT EXISTS files_dir ON files(dir);
+CREATE INDEX IF NOT EXISTS files_size ON files(size);
+CREATE INDEX IF NOT EXISTS files_ctime ON files(ctime);
+"""
+
+
+def _prefix_range(path: str) -> Tuple[str, str]:
+    """返回匹配 path 子树的字符串区间 [lo, hi)，'0' 是 '/' 的下一个字符"""
+    prefix = path.rstrip("/") + "/"
+    return prefix, prefix[:-1] + "0"
+
+
+class FileIndex:
+    """
+    文件索引：
+    记录每个目录的 mtime 以及其中文件的 (path, size, ctime)。
+    增量刷新时只重新列出 mtime 变化的目录，未变化的目录直接沿用索引中的子目录继续向下。
+    """
+
+    def __init__(self, db_path: str = INDEX_DB_PATH, roots: Optional[List[str]] = None):
+        self.db_path = db_path
+        self.roots = [os.path.abspath(r) for r in (roots or INDEX_ROOTS)]
+        self._local = threading.local()
+        self._crawl_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rounds = 0
+
+    # -------- 数据库连接（每个线程一个） --------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            # 旧版本的 roots 表没有 dev 列；缺少 dev 的根目录在下一轮爬取完成前视为未覆盖
+            if "dev" not in {row[1] for row in conn.execute("PRAGMA table_info(roots)")}:
+                conn.execute("ALTER TABLE roots ADD COLUMN dev INTEGER")
+            self._local.conn = conn
+        return conn
+
+    # -------- 爬取 --------
+    @staticmethod
+    def _store(conn: sqlite3.Connection, scan: DirScan) -> None:
+        """写入单个目录重新列出的结果，替换其文件记录"""
+        conn.execute("DELETE FROM files WHERE dir = ?", (scan.path,))
+        conn.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            ((path, scan.path, size, ctime) for path, size, ctime in scan.files),
+        )
+
+        # 清理已消失的子目录及其整个子树
+        known = {row[0] for row in conn.execute("SELECT path FROM dirs WHERE parent = ?", (scan.path,))}
+        for gone in known.difference(scan.subdirs):
+            lo, hi = _prefix_range(gone)
+            conn.execute("DELETE FROM files WHERE path >= ? AND path < ?", (lo, hi))
+            conn.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (gone, lo, hi))
+        parent = os.path.dirname(scan.path)
+        conn.execute(
+            "INSERT OR REPLACE INTO dirs VALUES (?, ?, ?)",
+            (scan.path, parent if parent != scan.path else None, scan.mtime),
+        )
+
+    def _known_subdirs(self, path: str, mtime: float) -> Optional[List[str]]:
+        """增量钩子（在遍历线程中调用）：目录 mtime 未变化时返回索引中的子目录"""
+        conn = self._conn()
+        row = conn.execute("SELECT mtime FROM dirs WHERE path = ?", (path,)).fetchone()
+        if row is None or row[0] != mtime:
+            return None
+        return [r[0] for r in conn.execute("SELECT path FROM dirs WHERE parent = ?", (path,))]
+
+    def crawl(self, root: str, full: bool = False) -> int:
+        """
+        增量爬取 root，返回重新列出的目录数。
+        full=True 时忽略 mtime，全部重新列出。
+        """
+        root = os.path.abspath(root)
+        # ONE_FILESYSTEM 时只索引与根目录同一设备上的内容，查询时据此判断是否覆盖
+        dev = os.stat(root).st_dev
+        conn = self._conn()
+        rescanned = 0
+        visited = 0
+        with self._crawl_lock:
+            for scan in parallel_walk(
+                    root,
+                    max_workers=CRAWL_WORKERS,
+                    exclude=EXCLUDE_DIRS,
+                    one_filesystem=ONE_FILESYSTEM,
+                    cancel=self._stop,
+                    known_subdirs=None if full else self._known_subdirs,
+            ):
+                if scan.listed:
+                    self._store(conn, scan)
+                    rescanned += 1
+                visited += 1
+                if visited % COMMIT_EVERY == 0:
+                    conn.commit()
+            if not self._stop.is_set():
+                conn.execute("INSERT OR REPLACE INTO roots VALUES (?, ?, ?)", (root, time.time(), dev))
+            conn.commit()
+        return rescanned
+
+    def crawl_all(self) -> None:
+        full = self._rounds > 0 and self._rounds % FULL_RESCAN_EVERY == 0
+        for root in self.roots:
+            started = time.monotonic()
+            try:
+                rescanned = self.crawl(root, full=full)
+                logger.info(f"索引 {root} 完成：重新列出 {rescanned} 个目录，耗时 {time.monotonic() - started:.1f}s")
+            except Exception as e:
+                logger.error(f"索引 {root} 失败: {e}")
+        self._rounds += 1
+
+    # -------- 后台爬虫 --------
+    def _loop(self, interval: float):
+        while not self._stop.is_set():
+            self.crawl_all()
+            self._stop.wait(interval)
+
+    def start(self, interval: float = CRAWL_INTERVAL) -> None:
+        """启动后台爬取线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="fs-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # -------- 查询 --------
+    def covers(self, path: str) -> bool:
+        """
+        path 是否位于已完成至少一轮爬取的根目录下。
+        ONE_FILESYSTEM 时爬取不会进入其他挂载点，位于其他设备上的 path（如单独挂载的 /home）不算覆盖。
+        """
+        path = os.path.abspath(path)
+        if any(path == d or path.startswith(d + "/") for d in EXCLUDE_DIRS):
+            return False
+        try:
+            dev = os.stat(path).st_dev
+        except OSError:
+            return False
+        for root, root_dev in self._conn().execute("SELECT path, dev FROM roots"):
+            if path == root or path.startswith(root.rstrip("/") + "/"):
+                if root_dev is None or (ONE_FILESYSTEM and dev != root_dev):
+                    continue
+                return True
+        return False
+
+    def top(self, n: int, path: str = "/") -> List[Tuple[str, int]]:
+        """返回 path 下最大的 n 个文件 (path, size)"""
+        lo, hi = _prefix_range(os.path.abspath(path))
+        return self._conn().execute(
+            "SELECT path, size FROM files WHERE path >= ? AND path < ? ORDER BY size DESC LIMIT ?",
+            (lo, hi, n),
+        ).fetchall()
+
+    def recent(self, n: int, path: str = "/") -> List[Tuple[str, float]]:
+        """返回 path 下 ctime 最新的 n 个文件 (path, ctime)"""
+        lo, hi = _prefix_range(os.path.abspath(path))
+        return self._conn().execute(
+            "SELECT path, ctime FROM files WHERE path >= ? AND path < ? ORDER BY ctime DESC LIMIT ?",
+            (lo, hi, n),
+        ).fetchall()
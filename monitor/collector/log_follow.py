@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : log_follow.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 日志实时跟踪：inotify（不可用时退化为 stat 轮询）监听文件追加，处理轮转与截断；
+              同一文件或命令只保留一个读取者，按订阅者做正则过滤后分发。
+"""
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import re
+import signal
+import struct
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Optional, Set
+
+logger = logging.getLogger("monitor.log_follow")
+
+# 每个订阅者最多缓存的行数，消费过慢时丢弃并提示丢弃的行数
+SUBSCRIBER_QUEUE_SIZE = 1000
+# 每次检查最多读取的字节数，防止一次追加大量数据时长时间占用事件循环
+MAX_READ = 1024 * 1024
+# inotify 不可用时的轮询间隔（秒）
+POLL_INTERVAL = 0.5
+# 单行长度上限，超出部分直接作为一行输出
+MAX_LINE = 64 * 1024
+# 记录已读位置之前的若干字节，用于识别“截断后又写入了更多内容”的情况
+MARK_SIZE = 64
+
+# -------- inotify 常量 --------
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+# 监听文件所在目录：文件内容变化、被移走（轮转）、新建同名文件都会产生事件
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT = struct.Struct("iIII")
+
+
+class Subscription:
+    """单个订阅者：可选的正则过滤 + 有界队列"""
+
+    def __init__(self, pattern: Optional[str] = None):
+        self.regex = re.compile(pattern) if pattern else None
+        self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def offer(self, line: str) -> None:
+        if self.regex is not None and not self.regex.search(line):
+            return
+        try:
+            self.queue.put_nowait(line)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def end(self) -> None:
+        """放入结束标记（不经过过滤；队列已满时挤掉最旧的一行）"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[str]:
+        """返回下一行；日志源已结束时返回 None"""
+        line = await self.queue.get()
+        if line is None:
+            return None
+        if self.dropped and self.queue.empty():
+            dropped, self.dropped = self.dropped, 0
+            self.queue.put_nowait(f"... {dropped} lines dropped (client too slow)")
+        return line
+
+
+class _Source(ABC):
+    """一个日志源（文件或命令输出），把新行分发给所有订阅者"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.subscribers: Set[Subscription] = set()
+        self.finished = False
+        self._partial = b""
+
+    @abstractmethod
+    def start(self) -> None:
+        """开始读取，新数据通过 feed() 分发"""
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """停止读取并释放资源"""
+        pass
+
+    def feed(self, data: bytes) -> None:
+        """追加一段原始数据，按行切分后分发；不完整的末尾行留到下次"""
+        data = self._partial + data
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        if len(self._partial) > MAX_LINE:
+            lines.append(self._partial)
+            self._partial = b""
+        for raw in lines:
+            line = raw.decode("utf-8", errors="replace")
+            for sub in self.subscribers:
+                sub.offer(line)
+
+    def reset(self) -> None:
+        self._partial = b""
+
+    def finish(self) -> None:
+        """数据源已结束：输出残留的不完整行，并通知所有订阅者结束"""
+        if self._partial:
+            self.feed(b"\n")
+        self.finished = True
+        for sub in self.subscribers:
+            sub.end()
+
+
+class _Inotify:
+    """进程内共享的 inotify 实例：每个目录一个 watch，事件按文件名分发给对应的 FileSource"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.loop = loop
+        self._dirs: Dict[str, int] = {}  # 目录 -> wd
+        self._targets: Dict[int, Dict[str, Set["FileSource"]]] = {}  # wd -> {文件名: sources}
+        loop.add_reader(self.fd, self._on_readable)
+
+    def watch(self, source: "FileSource") -> None:
+        directory, name = os.path.split(source.path)
+        wd = self._dirs.get(directory)
+        if wd is None:
+            wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+            self._dirs[directory] = wd
+        self._targets.setdefault(wd, {}).setdefault(name, set()).add(source)
+
+    def unwatch(self, source: "FileSource") -> None:
+        directory, name = os.path.split(source.path)
+        wd = self._dirs.get(directory)
+        if wd is None:
+            return
+        names = self._targets.get(wd, {})
+        names.get(name, set()).discard(source)
+        if not names.get(name):
+            names.pop(name, None)
+        if not names:
+            self._targets.pop(wd, None)
+            del self._dirs[directory]
+            self._libc.inotify_rm_watch(self.fd, wd)
+
+    def _on_readable(self) -> None:
+        touched: Set[FileSource] = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT.size <= len(buf):
+                wd, mask, _, length = _EVENT.unpack_from(buf, offset)
+                name = buf[offset + _EVENT.size: offset + _EVENT.size + length].rstrip(b"\0")
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # 事件队列溢出，无法确定哪些文件变了，全部检查一遍
+                    for names in self._targets.values():
+                        for sources in names.values():
+                            touched |= sources
+                    continue
+                touched |= self._targets.get(wd, {}).get(os.fsdecode(name), set())
+        for source in touched:
+            source.check()
+
+
+_inotify: Optional[_Inotify] = None
+
+
+def _get_inotify() -> Optional[_Inotify]:
+    global _inotify
+    loop = asyncio.get_running_loop()
+    if _inotify is None or _inotify.loop is not loop:
+        try:
+            _inotify = _Inotify(loop)
+        except (OSError, AttributeError) as e:
+            logger.warning(f"inotify 不可用，改为轮询: {e}")
+            return None
+    return _inotify
+
+
+class FileSource(_Source):
+    """
+    跟踪单个文件的追加内容：
+    - 从订阅时的文件末尾开始；
+    - 截断（文件变小，或已读末尾的字节被改写）时从头重新读取；
+    - 轮转（路径指向了新的 inode）时先读完旧文件剩余内容，再从新文件开头读取。
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        self.path = path
+        self._file = None
+        self._ino = None
+        self._offset = 0
+        self._mark = b""
+        self._watcher: Optional[_Inotify] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._pending = False
+
+    def _open(self, from_start: bool) -> None:
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return
+        st = os.fstat(f.fileno())
+        self._file, self._ino = f, st.st_ino
+        self._offset = 0 if from_start else st.st_size
+        self._mark = os.pread(f.fileno(), min(MARK_SIZE, self._offset), self._offset - min(MARK_SIZE, self._offset))
+        self.reset()
+
+    def _drain(self) -> bool:
+        """读取当前打开文件中新追加的内容，返回是否还有未读完的数据"""
+        fd = self._file.fileno()
+        size = os.fstat(fd).st_size
+        if size < self._offset or os.pread(fd, len(self._mark), self._offset - len(self._mark)) != self._mark:
+            # 被截断（如 copytruncate 轮转）；截断后写入的内容可能已超过原位置，所以还要比对已读末尾的字节
+            self._offset = 0
+            self._mark = b""
+            self.reset()
+        if size == self._offset:
+            return False
+        data = os.pread(fd, min(size - self._offset, MAX_READ), self._offset)
+        self._offset += len(data)
+        self._mark = (self._mark + data)[-MARK_SIZE:]
+        self.feed(data)
+        return self._offset < size
+
+    def check(self) -> None:
+        if self._file is None:
+            self._open(from_start=True)
+            if self._file is None:
+                return
+        more = self._drain()
+        try:
+            current = os.stat(self.path).st_ino
+        except OSError:
+            current = None
+        if not more and current != self._ino:
+            # 旧文件已读完且路径已指向新文件：切换到新文件开头
+            self._file.close()
+            self._file = None
+            if current is not None:
+                self._open(from_start=True)
+                more = self._file is not None and self._drain()
+        if more and not self._pending:
+            # 单次读取量有上限，剩余部分让出事件循环后继续
+            self._pending = True
+            asyncio.get_running_loop().call_soon(self._continue)
+
+    def _continue(self) -> None:
+        self._pending = False
+        self.check()
+
+    async def _poll(self) -> None:
+        last = None
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            try:
+                st = os.stat(self.path)
+                state = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except OSError:
+                state = None
+            if state != last:
+                last = state
+                self.check()
+
+    def start(self) -> None:
+        self._open(from_start=False)
+        self._watcher = _get_inotify()
+        if self._watcher is not None:
+            try:
+                self._watcher.watch(self)
+                return
+            except OSError as e:
+                logger.warning(f"无法监听 {self.path}，改为轮询: {e}")
+                self._watcher = None
+        self._poller = asyncio.ensure_future(self._poll())
+
+    def close(self) -> None:
+        if self._watcher is not None:
+            self._watcher.unwatch(self)
+        if self._poller is not None:
+            self._poller.cancel()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CommandSource(_Source):
+    """跟踪持续输出的命令（如 journalctl -f），一个子进程服务所有订阅者"""
+
+    def __init__(self, args: tuple):
+        super().__init__(" ".join(args))
+        self.args = args
+        self._task: Optional[asyncio.Task] = None
+        self._proc: Optional[asyncio.subprocess.Process] = None
+
+    async def _run(self) -> None:
+        """读取命令输出直到其退出（或启动失败），结束后通知订阅者，下一个订阅者会重新启动命令"""
+        try:
+            try:
+                self._proc = await asyncio.create_subprocess_exec(
+                    *self.args,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    start_new_session=True,
+                )
+            except OSError as e:
+                self.feed(f"Failed to start {self.key}: {e}\n".encode())
+                return
+            while True:
+                data = await self._proc.stdout.read(65536)
+                if not data:
+                    break
+                self.feed(data)
+            code = await self._proc.wait()
+            logger.warning(f"{self.key} 已退出（返回码 {code}）")
+        finally:
+            self.finish()
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self._run())
+
+    def close(self) -> None:
+        if self._proc is not None and self._proc.returncode is None:
+            try:
+                os.killpg(self._proc.pid, signal.SIGTERM)
+            except (ProcessLookupError, PermissionError):
+                pass
+        if self._task is not None:
+            self._task.cancel()
+
+
+# 日志源 -> 共享的读取者，没有订阅者时关闭
+_sources: Dict[str, _Source] = {}
+
+
+async def _follow(key: str, factory, pattern: Optional[str]) -> AsyncIterator[str]:
+    sub = Subscription(pattern)
+    source = _sources.get(key)
+    if source is None or source.finished:
+        # 已结束的日志源（如退出的 journalctl）由仍在读取剩余行的旧订阅者负责关闭
+        source = _sources[key] = factory()
+        source.start()
+    source.subscribers.add(sub)
+    try:
+        while True:
+            line = await sub.get()
+            if line is None:
+                return
+            yield line
+    finally:
+        source.subscribers.discard(sub)
+        if not source.subscribers:
+            if _sources.get(key) is source:
+                del _sources[key]
+            source.close()
+
+
+def follow_file(path: str, pattern: Optional[str] = None) -> AsyncIterator[str]:
+    """异步迭代文件新追加的行（可按正则过滤），同一文件的多个订阅者共享一个监听"""
+    path = os.path.abspath(path)
+    return _follow(f"file:{path}", lambda: FileSource(path), pattern)
+
+
+def follow_command(args: tuple, pattern: Optional[str] = None) -> AsyncIterator[str]:
+    """异步迭代命令持续输出的行（可按正则过滤），同一命令的多个订阅者共享一个子进程"""
+    return _follow("cmd:" + " ".join(args), lambda: CommandSource(args), pattern)
@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : log_index.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 基于 SQLite 的日志索引：按块记录时间范围（稀疏的时间 -> 偏移索引）和块内出现的词（词 -> 块索引），
+              后台增量追加；按时间范围和关键字查询时只读取可能命中的块。
+"""
+import calendar
+import heapq
+import logging
+import os
+import re
+import sqlite3
+import stat
+import threading
+import time
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("monitor.log_index")
+
+# 索引数据库位置
+LOG_INDEX_DB_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sys-monitor", "log_index.db")
+# 建立索引的日志文件（不存在的自动跳过）；查询其他文件时直接扫描，不建索引
+LOG_SEARCH_FILES = ["/var/log/syslog", "/var/log/messages", "/var/log/kern.log", "/var/log/auth.log"]
+# 索引块大小（字节），块边界对齐到行尾；末尾不足一块的部分不建索引，查询时直接扫描
+BLOCK_SIZE = 256 * 1024
+# 后台增量索引的间隔（秒）
+INDEX_INTERVAL = 30
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (id INTEGER PRIMARY KEY, path TEXT UNIQUE, ino INTEGER, indexed INTEGER, mark BLOB);
+CREATE TABLE IF NOT EXISTS blocks (
+    log INTEGER, block INTEGER, start INTEGER, end INTEGER, min_ts REAL, max_ts REAL,
+    PRIMARY KEY (log, block)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tokens (token TEXT, log INTEGER, block INTEGER, PRIMARY KEY (token, log, block)) WITHOUT ROWID;
+"""
+
+# 已索引位置之前的若干字节，用于识别文件被截断后重写
+MARK_SIZE = 64
+
+# 行首时间戳：ISO 8601（可带方括号、毫秒和时区）或 syslog 格式（Oct 17 12:00:00，无年份）
+_TS = re.compile(
+    rb"^\[?(?:(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,]\d+)?(Z|[+-]\d{2}:?\d{2})?"
+    rb"|([A-Z][a-z]{2}) ([ \d]\d) (\d{2}):(\d{2}):(\d{2}))",
+    re.M,
+)
+# 建索引时在整块上查找所有时间戳：以换行符开头的字面量前缀比行首锚点快得多（块前补一个换行）
+_TS_BLOCK = re.compile(b"\n" + _TS.pattern[1:])
+_MONTHS = {m.encode(): i for i, m in enumerate(calendar.month_abbr) if m}
+# 建索引的词：字母或下划线开头，3~32 个字符，统一小写
+_TOKEN = re.compile(rb"[a-z_][a-z0-9_]{2,31}")
+
+
+@lru_cache(maxsize=65536)
+def _minute_epoch(key: tuple, ref_day: int) -> Optional[float]:
+    """精确到分钟的时间转换（带缓存）；ISO 的 key 为 (年, 月, 日, 时, 分, 时区)，syslog 的 key 为 (月名, 日, 时, 分)"""
+    try:
+        if len(key) == 6:
+            fields = tuple(int(v) for v in key[:5]) + (0,)
+            tz = key[5]
+            if not tz:
+                return time.mktime(fields + (0, 0, -1))
+            epoch = calendar.timegm(fields)
+            if tz != b"Z":
+                sign = -1 if tz[:1] == b"-" else 1
+                digits = tz[1:].replace(b":", b"")
+                epoch -= sign * (int(digits[:2]) * 3600 + int(digits[2:]) * 60)
+            return float(epoch)
+        month = _MONTHS.get(key[0])
+        if month is None:
+            return None
+        ref = ref_day * 86400
+        fields = (month, int(key[1]), int(key[2]), int(key[3]), 0, 0, 0, -1)
+        epoch = time.mktime((time.localtime(ref).tm_year,) + fields)
+        # 跨年：日志时间不应晚于文件修改时间，否则属于上一年
+        if epoch > ref + 2 * 86400:
+            epoch = time.mktime((time.localtime(ref).tm_year - 1,) + fields)
+        return epoch
+    except (ValueError, OverflowError):
+        return None
+
+
+def _to_epoch(groups: tuple, ref: float) -> Optional[float]:
+    """
+    把 _TS 的分组（未参与匹配的分组为 b""）转为 Unix 时间。
+    无时区的按本地时间；syslog 格式没有年份，参考文件修改时间 ref 推断。
+    """
+    if groups[0]:
+        base = _minute_epoch(groups[:5] + (groups[6],), 0)
+        return None if base is None else base + int(groups[5])
+    base = _minute_epoch(groups[7:11], int(ref // 86400))
+    return None if base is None else base + int(groups[11])
+
+
+def line_time(line: bytes, ref: Optional[float] = None) -> Optional[float]:
+    m = _TS.match(line)
+    return _to_epoch(m.groups(b""), time.time() if ref is None else ref) if m else None
+
+
+def query_tokens(terms: Sequence[str]) -> List[str]:
+    """关键字中可用于索引剪枝的词"""
+    tokens = set()
+    for term in terms:
+        tokens.update(t.decode() for t in _TOKEN.findall(term.lower().encode()))
+    return sorted(tokens)
+
+
+def line_matches(line: bytes, terms: Sequence[bytes], tokens: Sequence[bytes]) -> bool:
+    """行中需包含每个关键字（不区分大小写），且关键字中的词要作为完整的词出现，与索引剪枝的语义一致"""
+    if not terms:
+        return True
+    lower = line.lower()
+    if not all(term in lower for term in terms):
+        return False
+    if not tokens:
+        return True
+    words = set(_TOKEN.findall(lower))
+    return all(token in words for token in tokens)
+
+
+class LogIndex:
+    """
+    日志索引：
+    每个日志文件按约 BLOCK_SIZE 字节切块，记录块的偏移、块内最早/最晚时间，以及块内出现的所有词。
+    文件只追加时增量处理新的完整块；inode 变化（轮转）或内容被截断重写时丢弃旧索引重建。
+    """
+
+    def __init__(self, db_path: str = LOG_INDEX_DB_PATH, paths: Optional[List[str]] = None):
+        self.db_path = db_path
+        self.paths = [os.path.abspath(p) for p in (paths or LOG_SEARCH_FILES)]
+        self._local = threading.local()
+        self._index_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # -------- 数据库连接（每个线程一个） --------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    # -------- 建索引 --------
+    @staticmethod
+    def _reset(conn: sqlite3.Connection, log_id: int) -> None:
+        conn.execute("DELETE FROM blocks WHERE log = ?", (log_id,))
+        conn.execute("DELETE FROM tokens WHERE log = ?", (log_id,))
+
+    def update(self, path: str) -> int:
+        """增量索引单个文件，返回新建的块数；文件不存在时返回 0"""
+        path = os.path.abspath(path)
+        conn = self._conn()
+        with self._index_lock:
+            try:
+                f = open(path, "rb")
+            except OSError:
+                return 0
+            with f:
+                fd = f.fileno()
+                st = os.fstat(fd)
+                row = conn.execute("SELECT id, ino, indexed, mark FROM logs WHERE path = ?", (path,)).fetchone()
+                if row is None:
+                    log_id = conn.execute(
+                        "INSERT INTO logs (path, ino, indexed, mark) VALUES (?, ?, 0, ?)", (path, st.st_ino, b"")
+                    ).lastrowid
+                    pos, block = 0, 0
+                else:
+                    log_id, ino, pos, mark = row
+                    if ino != st.st_ino or st.st_size < pos or os.pread(fd, len(mark), pos - len(mark)) != mark:
+                        # 轮转或截断：旧索引作废
+                        self._reset(conn, log_id)
+                        pos = 0
+                    block = conn.execute(
+                        "SELECT COALESCE(MAX(block) + 1, 0) FROM blocks WHERE log = ?", (log_id,)
+                    ).fetchone()[0]
+
+                created = 0
+                while not self._stop.is_set() and st.st_size - pos >= BLOCK_SIZE:
+                    chunk = os.pread(fd, BLOCK_SIZE, pos)
+                    cut = chunk.rfind(b"\n") + 1
+                    # 整块没有换行（超长行）时按块大小硬切
+                    chunk = chunk[:cut] if cut else chunk
+                    # 同一秒的时间戳只转换一次
+                    groups = set(_TS_BLOCK.findall(b"\n" + chunk))
+                    stamps = [t for t in (_to_epoch(g, st.st_mtime) for g in groups) if t is not None]
+                    conn.execute(
+                        "INSERT OR REPLACE INTO blocks VALUES (?, ?, ?, ?, ?, ?)",
+                        (log_id, block, pos, pos + len(chunk),
+                         min(stamps) if stamps else None, max(stamps) if stamps else None),
+                    )
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO tokens VALUES (?, ?, ?)",
+                        ((token.decode(), log_id, block) for token in set(_TOKEN.findall(chunk.lower()))),
+                    )
+                    pos += len(chunk)
+                    block += 1
+                    created += 1
+                mark = os.pread(fd, min(MARK_SIZE, pos), pos - min(MARK_SIZE, pos))
+                conn.execute(
+                    "UPDATE logs SET ino = ?, indexed = ?, mark = ? WHERE id = ?", (st.st_ino, pos, mark, log_id)
+                )
+                conn.commit()
+        return created
+
+    def _prune(self) -> None:
+        """删除不在 paths 中的文件的索引（如配置变更后移除的文件）"""
+        conn = self._conn()
+        with self._index_lock:
+            stale = [(log_id, path) for log_id, path in conn.execute("SELECT id, path FROM logs")
+                     if path not in self.paths]
+            for log_id, path in stale:
+                self._reset(conn, log_id)
+                conn.execute("DELETE FROM logs WHERE id = ?", (log_id,))
+                logger.info(f"日志索引 {path} 已不在索引列表中，删除其索引")
+            conn.commit()
+
+    def update_all(self) -> None:
+        self._prune()
+        for path in self.paths:
+            if self._stop.is_set():
+                break
+            if not os.path.isfile(path):
+                continue
+            try:
+                created = self.update(path)
+                if created:
+                    logger.info(f"日志索引 {path}：新增 {created} 个块")
+            except Exception as e:
+                logger.error(f"日志索引 {path} 失败: {e}")
+
+    # -------- 后台索引 --------
+    def _loop(self, interval: float):
+        while not self._stop.is_set():
+            self.update_all()
+            self._stop.wait(interval)
+
+    def start(self, interval: float = INDEX_INTERVAL) -> None:
+        """启动后台索引线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name="log-index", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # -------- 查询 --------
+    def _regions(self, path: str, tokens: List[str], start: Optional[float], end: Optional[float]
+                 ) -> List[Tuple[int, int, Optional[float]]]:
+        """返回需要扫描的 (起始偏移, 结束偏移, 块内最早时间)，包括末尾未建索引的部分；未建索引的文件整体扫描"""
+        conn = self._conn()
+        row = conn.execute("SELECT id, indexed FROM logs WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return [(0, None, None)]
+        log_id, indexed = row
+        sql = "SELECT start, end, min_ts FROM blocks WHERE log = ?"
+        args: list = [log_id]
+        if start is not None:
+            sql += " AND (max_ts IS NULL OR max_ts >= ?)"
+            args.append(start)
+        if end is not None:
+            sql += " AND (min_ts IS NULL OR min_ts <= ?)"
+            args.append(end)
+        for token in tokens:
+            sql += " AND block IN (SELECT block FROM tokens WHERE token = ? AND log = ?)"
+            args += [token, log_id]
+        regions = conn.execute(sql + " ORDER BY block", args).fetchall()
+        return regions + [(indexed, None, None)]
+
+    @staticmethod
+    def _candidates(data: bytes, first: Optional[bytes]) -> Iterator[Tuple[int, bytes]]:
+        """产出 (行起始位置, 行)；有关键字时直接定位包含第一个关键字的行，跳过其余行"""
+        if first is None:
+            pos = 0
+            for line in data.split(b"\n"):
+                yield pos, line
+                pos += len(line) + 1
+            return
+        lower = data.lower()
+        pos = 0
+        while True:
+            i = lower.find(first, pos)
+            if i < 0:
+                return
+            line_start = data.rfind(b"\n", 0, i) + 1
+            line_end = data.find(b"\n", i)
+            if line_end < 0:
+                line_end = len(data)
+            yield line_start, data[line_start:line_end]
+            pos = line_end + 1
+
+    @staticmethod
+    def _carry(data: bytes, line_start: int, ref: float, default: Optional[float]) -> Optional[float]:
+        """续行的时间：向前找最近一条带时间戳的行"""
+        end = line_start - 1
+        while end > 0:
+            start = data.rfind(b"\n", 0, end) + 1
+            ts = line_time(data[start:end], ref)
+            if ts is not None:
+                return ts
+            end = start - 1
+        return default
+
+    def _scan(self, path: str, terms: List[str], start: Optional[float], end: Optional[float]
+              ) -> Iterator[Tuple[float, str, int, str]]:
+        """按偏移顺序产出命中的行 (时间, 路径, 偏移, 内容)"""
+        tokens = query_tokens(terms)
+        raw_terms = [t.lower().encode() for t in terms]
+        raw_tokens = [t.encode() for t in tokens]
+        first = raw_terms[0] if raw_terms else None
+        # 非阻塞打开：path 若是 FIFO 等特殊文件，open 不会卡住，随后按非普通文件跳过
+        try:
+            f = os.fdopen(os.open(path, os.O_RDONLY | os.O_NONBLOCK), "rb")
+        except OSError:
+            return
+        with f:
+            fd = f.fileno()
+            st = os.fstat(fd)
+            if not stat.S_ISREG(st.st_mode):
+                return
+            for lo, hi, first_ts in self._regions(path, tokens, start, end):
+                hi = st.st_size if hi is None else min(hi, st.st_size)
+                # 没有时间戳的续行（如堆栈）沿用前一行的时间
+                current = first_ts
+                offset = lo
+                while offset < hi:
+                    data = os.pread(fd, min(BLOCK_SIZE, hi - offset), offset)
+                    if not data:
+                        break
+                    cut = data.rfind(b"\n") + 1 if offset + len(data) < hi else len(data)
+                    data = data[:cut] or data
+                    for line_start, line in self._candidates(data, first):
+                        if not line:
+                            continue
+                        ts = line_time(line, st.st_mtime)
+                        if ts is None:
+                            ts = current if first is None else self._carry(data, line_start, st.st_mtime, first_ts)
+                        current = ts
+                        in_range = (start is None and end is None) or (
+                            ts is not None and (start is None or ts >= start) and (end is None or ts <= end))
+                        if in_range and line_matches(line, raw_terms, raw_tokens):
+                            yield ts or 0.0, path, offset + line_start, line.decode("utf-8", errors="replace")
+                    offset += len(data)
+
+    def search(self, paths: List[str], terms: List[str], start: Optional[float] = None, end: Optional[float] = None,
+               extra: Sequence[Iterator[Tuple[float, str, int, str]]] = (), offset: int = 0, limit: int = 100
+               ) -> Dict[str, Any]:
+        """
+        在多个日志中按时间范围和关键字查询，多个来源按时间归并排序，返回第 offset 条开始的 limit 条。
+        查询前先增量索引 paths 中属于索引列表的文件新追加的部分，其余文件直接扫描；
+        extra 为额外的已排序来源（journal、内核日志）。
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        for path in paths:
+            if path in self.paths:
+                self.update(path)
+        streams = [self._scan(path, terms, start, end) for path in paths] + list(extra)
+        merged = heapq.merge(*streams, key=lambda r: r[0])
+        page = list(islice(merged, offset, offset + limit + 1))
+        return {
+            "results": [
+                {"source": source, "time": ts or None, "offset": pos, "line": line}
+                for ts, source, pos, line in page[:limit]
+            ],
+            "offset": offset,
+            "limit": limit,
+            "has_more": len(page) > limit,
+        }
+
+
+if __name__ == "__main__":
+    # 基准：合成日志上对比索引查询与全文件扫描
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.log")
+        base = time.mktime((2026, 10, 17, 0, 0, 0, 0, 0, -1))
+        levels = ["INFO"] * 98 + ["WARN", "ERROR"]
+        line_count = 0
+        with open(path, "w") as f:
+            while f.tell() < args.size_mb * 1024 * 1024:
+                ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(base + line_count * 0.01))
+                level = levels[line_count % len(levels)]
+                f.write(f"{ts},000 {level} worker-{line_count % 8} request {line_count} handled path=/api/items\n")
+                line_count += 1
+
+        index = LogIndex(db_path=os.path.join(tmp, "index.db"), paths=[path])
+        started = time.perf_counter()
+        index.update(path)
+        print(f"index {args.size_mb} MiB ({line_count} lines): {time.perf_counter() - started:.2f}s")
+
+        start, end = base + 3600, base + 3600 + 900
+        started = time.perf_counter()
+        result = index.search([path], ["ERROR"], start, end, limit=1000)
+        print(f"indexed query: {len(result['results'])} lines in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        started = time.perf_counter()
+        hits = 0
+        with open(path, "rb") as f:
+            for line in f:
+                ts = line_time(line)
+                if ts is not None and start <= ts <= end and b"ERROR" in line:
+                    hits += 1
+        print(f"full scan:     {hits} lines in {(time.perf_counter() - started) * 1000:.1f} ms")
@@ -6,26 +6,277 @@ Author      : wzw
 Date Created: 2025/7/3
 Description : Add your script's purpose here.
 """
-import subprocess
+import asyncio
+import gzip
 import os
+import re
+import shlex
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-def run_shell(command: str) -> str:
+from .log_follow import follow_command, follow_file
+from .log_index import LogIndex, line_matches, line_time, query_tokens
+from .shell import run_shell
+
+# 反向读取的块大小
+TAIL_BLOCK_SIZE = 64 * 1024
+# 单次 tail 最多读取的字节数，防止没有换行的超长文件把整个文件读入内存
+TAIL_MAX_BYTES = 16 * 1024 * 1024
+# 行数不足时最多向前查找的轮转文件个数（app.log.1、app.log.2.gz ...）
+MAX_ROTATED = 5
+KMSG_PATH = "/dev/kmsg"
+# 搜索时 journalctl 输出的大小上限（字节）
+JOURNAL_SEARCH_MAX_OUTPUT = 8 * 1024 * 1024
+# 搜索时最多读取的内核日志条数
+KMSG_SEARCH_LIMIT = 100000
+
+# 日志索引，由 FastAPI lifespan 启动后台增量索引
+index = LogIndex()
+
+
+# -------- 原生 tail --------
+def tail_file(path: str, lines: int, block_size: int = TAIL_BLOCK_SIZE, max_bytes: int = TAIL_MAX_BYTES) -> List[bytes]:
+    """从文件末尾按块向前读取，返回最后 lines 行（不含换行符），内存占用只与返回的行数有关"""
+    if lines <= 0:
+        return []
+    with open(path, "rb") as f:
+        fd = f.fileno()
+        pos = os.fstat(fd).st_size
+        if not pos:
+            return []
+        # 末尾的换行符不算作一个空行
+        if os.pread(fd, 1, pos - 1) == b"\n":
+            pos -= 1
+        chunks, newlines, read = [], 0, 0
+        while pos > 0 and newlines < lines and read < max_bytes:
+            size = min(block_size, pos)
+            pos -= size
+            chunk = os.pread(fd, size, pos)
+            newlines += chunk.count(b"\n")
+            read += size
+            chunks.append(chunk)
+    segments = b"".join(reversed(chunks)).split(b"\n")
+    # 没读到文件开头时第一段是不完整的行
+    if pos > 0:
+        segments = segments[1:]
+    return segments[-lines:]
+
+
+def tail_gzip(path: str, lines: int) -> List[bytes]:
+    """gzip 无法反向定位，只能流式解压，用定长 deque 保留最后 lines 行"""
+    if lines <= 0:
+        return []
+    with gzip.open(path, "rb") as f:
+        return [line.rstrip(b"\n") for line in deque(f, maxlen=lines)]
+
+
+def rotated_files(path: str) -> Iterator[str]:
+    """依次返回日志文件及其轮转文件：path、path.1（或 path.1.gz）、path.2.gz ..."""
+    yield path
+    for i in range(1, MAX_ROTATED + 1):
+        for candidate in (f"{path}.{i}", f"{path}.{i}.gz"):
+            if os.path.isfile(candidate):
+                yield candidate
+                break
+        else:
+            return
+
+
+def tail_with_rotation(path: str, lines: int) -> List[bytes]:
+    """读取最后 lines 行，当前文件不够时继续从轮转文件中补齐"""
+    result: List[bytes] = []
+    for name in rotated_files(path):
+        need = lines - len(result)
+        if need <= 0:
+            break
+        try:
+            chunk = tail_gzip(name, need) if name.endswith(".gz") else tail_file(name, need)
+        except (OSError, EOFError):
+            # 轮转文件读取失败（被删除、gzip 损坏等）时只返回已读到的部分
+            if name == path:
+                raise
+            break
+        result = chunk + result
+    return result
+
+
+def read_kmsg(lines: int) -> Optional[List[str]]:
+    """
+    非阻塞读取 /dev/kmsg 中的内核日志，按 dmesg 的格式返回最后 lines 条；无权限或不存在时返回 None。
+    内核环形缓冲区大小固定，用定长 deque 保留末尾记录即可。
+    """
+    try:
+        fd = os.open(KMSG_PATH, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        return None
+    records: deque = deque(maxlen=max(lines, 0))
     try:
-        return subprocess.check_output(command, shell=True, text=True, stderr=subprocess.DEVNULL)
-    except subprocess.CalledProcessError:
-        return ""
+        while True:
+            try:
+                record = os.read(fd, 8192)
+            except BlockingIOError:
+                break
+            except BrokenPipeError:
+                # 记录在读取前已被覆盖，继续读取下一条
+                continue
+            except OSError:
+                return None if not records else list(records)
+            if not record:
+                break
+            header, _, message = record.partition(b";")
+            fields = header.split(b",")
+            if len(fields) < 3:
+                continue
+            usec = int(fields[2])
+            # 以空格开头的续行是结构化字段（SUBSYSTEM=... 等），dmesg 默认不显示
+            text = message.split(b"\n", 1)[0].decode("utf-8", errors="replace")
+            records.append(f"[{usec // 1000000:5d}.{usec % 1000000:06d}] {text}")
+    finally:
+        os.close(fd)
+    return list(records)
+
+
+def _join(lines: List[bytes]) -> str:
+    return (b"\n".join(lines) + b"\n").decode("utf-8", errors="replace") if lines else ""
 
-def collect_system_log(lines: int = 100) -> str:
+
+async def collect_system_log(lines: int = 100) -> str:
     """收集系统日志（journalctl）"""
-    return run_shell(f"journalctl -n {lines}")
+    return await run_shell(f"journalctl -n {int(lines)}", timeout=10)
 
-def collect_kernel_log(lines: int = 100) -> str:
-    """收集内核日志（dmesg）"""
-    return run_shell(f"dmesg | tail -n {lines}")
+async def collect_kernel_log(lines: int = 100) -> str:
+    """收集内核日志：优先直接读取 /dev/kmsg，不可用时回退到 dmesg"""
+    records = await asyncio.to_thread(read_kmsg, int(lines))
+    if records is None:
+        return await run_shell(f"dmesg | tail -n {int(lines)}", timeout=10)
+    return "\n".join(records) + "\n" if records else ""
 
-def collect_app_log(path: str, lines: int = 100) -> str:
-    """收集指定路径的应用日志"""
+async def collect_app_log(path: str, lines: int = 100) -> str:
+    """收集指定路径的应用日志（从文件末尾反向读取，行数不足时继续读取轮转文件）"""
     if not os.path.isfile(path):
         return f"Log file not found: {path}"
-    return run_shell(f"tail -n {lines} {path}")
+    try:
+        return _join(await asyncio.to_thread(tail_with_rotation, path, int(lines)))
+    except OSError as e:
+        return f"Failed to read log file: {e}"
+
+
+# -------- 日志搜索 --------
+Record = Tuple[float, str, Optional[int], str]  # (时间, 来源, 偏移, 内容)
+
+
+def _filter(lines: List[str], source: str, terms: List[str], start: Optional[float], end: Optional[float],
+            stamp) -> List[Record]:
+    """按关键字和时间范围过滤已按时间排序的行，stamp(line) 返回行的时间（没有时间的续行沿用前一行）"""
+    raw_terms = [t.lower().encode() for t in terms]
+    raw_tokens = [t.encode() for t in query_tokens(terms)]
+    result, current = [], None
+    for i, line in enumerate(lines):
+        ts = stamp(line)
+        current = current if ts is None else ts
+        if start is not None and (current is None or current < start):
+            continue
+        if end is not None and (current is None or current > end):
+            continue
+        if line and line_matches(line.encode(), raw_terms, raw_tokens):
+            result.append((current or 0.0, source, i, line))
+    return result
+
+
+async def _search_journal(terms: List[str], start: Optional[float], end: Optional[float]) -> List[Record]:
+    """journal 自带时间索引，直接交给 journalctl --since/--until/--grep 过滤"""
+    command = "journalctl --no-pager -q -o short-iso"
+    if start is not None:
+        command += f" --since @{int(start)}"
+    if end is not None:
+        command += f" --until @{int(end) + 1}"
+    if terms:
+        command += f" --case-sensitive=false --grep {shlex.quote(re.escape(terms[0]))}"
+    output = await run_shell(command, timeout=30, max_output=JOURNAL_SEARCH_MAX_OUTPUT)
+    return _filter(output.splitlines(), "journal", terms, start, end, lambda line: line_time(line.encode()))
+
+
+_KMSG_TIME = re.compile(r"^\[\s*(\d+)\.(\d+)\]")
+
+
+def _search_kernel(terms: List[str], start: Optional[float], end: Optional[float]) -> List[Record]:
+    """内核日志的时间是开机后的秒数，按开机时刻换算为 Unix 时间"""
+    records = read_kmsg(KMSG_SEARCH_LIMIT) or []
+    try:
+        with open("/proc/uptime") as f:
+            boot = time.time() - float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        boot = 0.0
+
+    def stamp(line: str) -> Optional[float]:
+        m = _KMSG_TIME.match(line)
+        return boot + int(m.group(1)) + int(m.group(2)) / 1e6 if m else None
+
+    return _filter(records, "kernel", terms, start, end, stamp)
+
+
+async def search_logs(terms: List[str], start: Optional[float] = None, end: Optional[float] = None,
+                      paths: Optional[List[str]] = None, journal: bool = False, kernel: bool = False,
+                      offset: int = 0, limit: int = 100) -> Dict[str, Any]:
+    """
+    在应用日志文件、journal 和内核日志中按时间范围与关键字（全部出现、按词匹配、不区分大小写）搜索，
+    结果按时间归并排序后分页。未指定任何来源时搜索 LOG_SEARCH_FILES 中存在的文件。
+    """
+    if paths is None and not journal and not kernel:
+        paths = [p for p in index.paths if os.path.isfile(p)]
+    paths = paths or []
+    missing = [p for p in paths if not os.path.isfile(p)]
+    if missing:
+        return {"error": f"Log file not found: {', '.join(missing)}"}
+    extra = []
+    if journal:
+        extra.append(iter(await _search_journal(terms, start, end)))
+    if kernel:
+        extra.append(iter(await asyncio.to_thread(_search_kernel, terms, start, end)))
+    return await asyncio.to_thread(index.search, paths, terms, start, end, extra, offset, limit)
+
+
+def follow_system_log(pattern: Optional[str] = None) -> AsyncIterator[str]:
+    """实时跟踪系统日志（journalctl -f），可按正则过滤"""
+    return follow_command(("journalctl", "-f", "-n", "0", "-o", "short"), pattern)
+
+def follow_app_log(path: str, pattern: Optional[str] = None) -> AsyncIterator[str]:
+    """实时跟踪应用日志新追加的行，处理轮转与截断，可按正则过滤"""
+    return follow_file(path, pattern)
+
+
+if __name__ == "__main__":
+    # 基准：在大文件上对比原生反向读取与 tail 子进程
+    import argparse
+    import subprocess
+    import tempfile
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--lines", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "app.log")
+        line = b"2026-10-17 12:00:00,000 INFO worker-3 request handled in 12ms path=/api/v1/items\n"
+        block = line * (1024 * 1024 // len(line))
+        with open(path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(block)
+        with gzip.open(path + ".1.gz", "wb") as f:
+            f.write(block)
+
+        start = time.perf_counter()
+        native = tail_file(path, args.lines)
+        print(f"tail_file      {args.size_mb} MiB, {args.lines} lines: {(time.perf_counter() - start) * 1000:.2f} ms")
+        start = time.perf_counter()
+        out = subprocess.check_output(["tail", "-n", str(args.lines), path])
+        print(f"tail (process) {args.size_mb} MiB, {args.lines} lines: {(time.perf_counter() - start) * 1000:.2f} ms")
+        assert _join(native).encode() == out
 
+        with open(path, "wb") as f:
+            f.write(line * 10)
+        merged = tail_with_rotation(path, 30)
+        print(f"rotation: {len(merged)} lines from {list(rotated_files(path))}")
+        print(asyncio.run(collect_kernel_log(3)))
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : mounts.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 挂载点容量探测：每个挂载点的 statvfs 在独立的守护线程中执行并设超时，
+              反复超时的挂载点（如失联的 NFS/CIFS）进入隔离期，按指数退避重新探测。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import psutil
+
+logger = logging.getLogger("monitor.mounts")
+
+# 一轮探测的总等待时间（秒），所有挂载点并发探测
+STATVFS_TIMEOUT = 1.0
+# 连续超时多少次后进入隔离
+QUARANTINE_AFTER = 2
+# 隔离时长：从 BACKOFF_INITIAL 开始每次翻倍，不超过 BACKOFF_MAX（秒）
+BACKOFF_INITIAL = 30.0
+BACKOFF_MAX = 1800.0
+
+
+def _spawn(func: Callable[[], Any], name: str) -> Future:
+    """在新的守护线程中执行 func：陷入不可中断睡眠的 statvfs 无法取消，只能让它留在后台"""
+    future: Future = Future()
+
+    def run():
+        try:
+            future.set_result(func())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+
+class _Mount:
+    def __init__(self):
+        self.future: Optional[Future] = None
+        self.failures = 0  # 连续超时次数
+        self.backoff = BACKOFF_INITIAL
+        self.quarantined_until = 0.0  # time.monotonic()
+
+
+class MountProber:
+    """
+    并发探测各挂载点的容量：
+    - 每个挂载点的探测独立执行，一个挂起的挂载点不影响其他挂载点；
+    - 上一次探测仍未返回时不再重复发起，每个挂载点最多滞留一个线程；
+    - 连续超时 QUARANTINE_AFTER 次后隔离，隔离期间直接返回状态，到期后探测一次，
+      仍失败则隔离时长翻倍，成功则恢复正常。
+    """
+
+    def __init__(self, timeout: float = STATVFS_TIMEOUT, usage: Optional[Callable[[str], Any]] = None):
+        self.timeout = timeout
+        self._usage = usage or psutil.disk_usage
+        self._mounts: Dict[str, _Mount] = {}
+        self._lock = threading.Lock()
+
+    def _on_timeout(self, mountpoint: str, mount: _Mount, now: float) -> Dict[str, Any]:
+        mount.failures += 1
+        if mount.failures >= QUARANTINE_AFTER:
+            if mount.quarantined_until:
+                # 隔离到期后的重新探测仍然失败
+                mount.backoff = min(mount.backoff * 2, BACKOFF_MAX)
+            mount.quarantined_until = now + mount.backoff
+            logger.warning(f"挂载点 {mountpoint} 连续 {mount.failures} 次 statvfs 超时，隔离 {mount.backoff:.0f}s")
+            return self._quarantined(mount, now)
+        return {"status": "timeout", "error": f"statvfs timed out after {self.timeout}s", "failures": mount.failures}
+
+    @staticmethod
+    def _quarantined(mount: _Mount, now: float) -> Dict[str, Any]:
+        return {
+            "status": "quarantined",
+            "error": "mount not responding",
+            "failures": mount.failures,
+            "retry_in": round(mount.quarantined_until - now, 1),
+        }
+
+    def probe(self, mountpoints: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        探测一组挂载点，最多等待 timeout 秒。
+        返回 {挂载点: {'total', 'used', 'free', 'percent'}}；异常的挂载点返回 {'status', 'error', ...}
+        """
+        mountpoints = list(dict.fromkeys(mountpoints))
+        now = time.monotonic()
+        results: Dict[str, Dict[str, Any]] = {}
+        probing: Dict[str, Tuple[_Mount, bool]] = {}
+        with self._lock:
+            for mp in [m for m in self._mounts if m not in mountpoints]:
+                del self._mounts[mp]
+            for mp in mountpoints:
+                mount = self._mounts.setdefault(mp, _Mount())
+                if mount.quarantined_until > now:
+                    results[mp] = self._quarantined(mount, now)
+                    continue
+                spawned = mount.future is None or mount.future.done()
+                if spawned:
+                    mount.future = _spawn(lambda mp=mp: self._usage(mp), f"statvfs:{mp}")
+                probing[mp] = (mount, spawned)
+
+            deadline = now + self.timeout
+            for mp, (mount, spawned) in probing.items():
+                # 上一轮遗留、仍未返回的探测不再等待
+                timeout = max(0.0, deadline - time.monotonic()) if spawned else 0.0
+                try:
+                    usage = mount.future.result(timeout=timeout)
+                except FutureTimeout:
+                    results[mp] = self._on_timeout(mp, mount, time.monotonic())
+                    continue
+                except PermissionError:
+                    # 某些系统分区可能无法访问
+                    results[mp] = {"error": "permission denied"}
+                except OSError as e:
+                    results[mp] = {"error": e.strerror or str(e)}
+                else:
+                    results[mp] = {
+                        "total": usage.total,
+                        "used": usage.used,
+                        "free": usage.free,
+                        "percent": usage.percent,
+                    }
+                if mount.quarantined_until:
+                    logger.info(f"挂载点 {mp} 已恢复响应")
+                mount.failures = 0
+                mount.backoff = BACKOFF_INITIAL
+                mount.quarantined_until = 0.0
+        return results
+
+
+if __name__ == "__main__":
+    # 示例：模拟一个永远挂起的挂载点，观察超时、隔离与其余挂载点不受影响
+    import os
+    from collections import namedtuple
+
+    Usage = namedtuple("Usage", "total used free percent")
+
+    def fake_usage(path):
+        if path == "/mnt/dead-nfs":
+            threading.Event().wait()
+        st = os.statvfs("/")
+        return Usage(st.f_blocks * st.f_frsize, 0, st.f_bavail * st.f_frsize, 0.0)
+
+    prober = MountProber(timeout=0.3, usage=fake_usage)
+    for _ in range(4):
+        start = time.perf_counter()
+        out = prober.probe(["/", "/mnt/dead-nfs"])
+        print(f"{time.perf_counter() - start:.3f}s", out["/mnt/dead-nfs"], "threads:", threading.active_count())
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : net_accounting.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 进程级网络流量统计：socket inode 到 PID 的增量索引，结合 sock_diag 的每连接字节计数按采样差值归属到进程。
+"""
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from .base import top_k
+
+PROC_NET_FILES = ("tcp", "tcp6", "udp", "udp6")
+
+# /proc/net/tcp 中的状态码
+TCP_STATES = {
+    "01": "ESTABLISHED", "02": "SYN_SENT", "03": "SYN_RECV", "04": "FIN_WAIT1", "05": "FIN_WAIT2",
+    "06": "TIME_WAIT", "07": "CLOSE", "08": "CLOSE_WAIT", "09": "LAST_ACK", "0A": "LISTEN", "0B": "CLOSING",
+}
+
+# -------- netlink sock_diag 常量 --------
+NETLINK_SOCK_DIAG = 4
+SOCK_DIAG_BY_FAMILY = 20
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+INET_DIAG_INFO = 2
+_NLMSG_HDR = struct.Struct("=IHHII")
+_DIAG_REQ = struct.Struct("=BBBxI48x")
+_DIAG_MSG_INODE_OFFSET = 68  # inet_diag_msg 中 idiag_inode 的偏移
+_DIAG_MSG_SIZE = 72
+_RTATTR = struct.Struct("=HH")
+# struct tcp_info 中 tcpi_bytes_acked / tcpi_bytes_received 的偏移（内核 4.1+）
+_TCPI_BYTES_OFFSET = 120
+_TCPI_BYTES = struct.Struct("=QQ")
+
+
+def _align4(n: int) -> int:
+    return (n + 3) & ~3
+
+
+def parse_proc_net(proto: str, root: str = "/proc") -> Dict[int, Tuple[str, int, int]]:
+    """
+    批量解析 /proc/net/<proto>，返回 {inode: (状态码, tx_queue, rx_queue)}。
+    inode 为 0 的条目（如 TIME_WAIT）不属于任何进程，直接跳过。
+    """
+    result = {}
+    try:
+        with open(os.path.join(root, "net", proto)) as f:
+            next(f, None)
+            for line in f:
+                parts = line.split()
+                if len(parts) < 10:
+                    continue
+                inode = int(parts[9])
+                if not inode:
+                    continue
+                tx, _, rx = parts[4].partition(":")
+                result[inode] = (parts[3], int(tx, 16), int(rx, 16))
+    except OSError:
+        pass
+    return result
+
+
+def tcp_byte_counters() -> Optional[Dict[int, Tuple[int, int]]]:
+    """
+    通过 netlink sock_diag 一次性导出所有 TCP 连接的 tcp_info，
+    返回 {inode: (bytes_acked, bytes_received)}；内核或权限不支持时返回 None。
+    """
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_SOCK_DIAG)
+    except (OSError, AttributeError):
+        return None
+    result = {}
+    try:
+        for seq, family in enumerate((socket.AF_INET, socket.AF_INET6), 1):
+            payload = _DIAG_REQ.pack(family, socket.IPPROTO_TCP, 1 << (INET_DIAG_INFO - 1), 0xFFFFFFFF)
+            sock.send(_NLMSG_HDR.pack(_NLMSG_HDR.size + len(payload), SOCK_DIAG_BY_FAMILY,
+                                      NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + payload)
+            done = False
+            while not done:
+                data = sock.recv(1 << 20)
+                if not data:
+                    break
+                offset = 0
+                while offset + _NLMSG_HDR.size <= len(data):
+                    length, msg_type = _NLMSG_HDR.unpack_from(data, offset)[:2]
+                    if msg_type == NLMSG_DONE:
+                        done = True
+                        break
+                    if msg_type == NLMSG_ERROR or length < _NLMSG_HDR.size:
+                        return None
+                    msg = offset + _NLMSG_HDR.size
+                    inode = struct.unpack_from("=I", data, msg + _DIAG_MSG_INODE_OFFSET)[0]
+                    attr, end = msg + _DIAG_MSG_SIZE, offset + length
+                    while attr + _RTATTR.size <= end:
+                        attr_len, attr_type = _RTATTR.unpack_from(data, attr)
+                        if attr_len < _RTATTR.size:
+                            break
+                        if attr_type == INET_DIAG_INFO and attr_len - 4 >= _TCPI_BYTES_OFFSET + 16 and inode:
+                            result[inode] = _TCPI_BYTES.unpack_from(data, attr + 4 + _TCPI_BYTES_OFFSET)
+                        attr += _align4(attr_len)
+                    offset += _align4(length)
+    except OSError:
+        return None
+    finally:
+        sock.close()
+    return result
+
+
+class SocketOwnerIndex:
+    """
+    socket inode -> PID 索引，增量维护：
+    只有出现未知 inode 时才去读 /proc/<pid>/fd，且按“新进程、已持有 socket 的进程、其余进程”的顺序扫描，
+    全部找到即停止；一轮全量扫描后仍找不到的 inode（其他网络命名空间、内核 socket 等）记为无主，不再反复查找。
+    """
+
+    def __init__(self, root: str = "/proc"):
+        self.root = root
+        self.owner: Dict[int, int] = {}  # inode -> pid
+        self.pid_sockets: Dict[int, Set[int]] = {}  # pid -> inodes
+        self.pid_start: Dict[int, str] = {}  # pid -> starttime，用于识别 PID 复用
+        self.orphans: Set[int] = set()
+
+    def _starttime(self, pid: int) -> Optional[str]:
+        try:
+            with open(f"{self.root}/{pid}/stat", "rb") as f:
+                stat = f.read()
+            # comm 中可能含空格，从最后一个 ')' 之后开始分割；starttime 为第 22 个字段
+            return stat[stat.rindex(b")") + 2:].split()[19].decode()
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def _scan_pid(self, pid: int) -> Set[int]:
+        inodes = set()
+        base = f"{self.root}/{pid}/fd"
+        try:
+            for fd in os.listdir(base):
+                try:
+                    target = os.readlink(f"{base}/{fd}")
+                except OSError:
+                    continue
+                if target.startswith("socket:["):
+                    inodes.add(int(target[8:-1]))
+        except OSError:
+            pass
+        return inodes
+
+    def _assign(self, pid: int, inodes: Set[int]) -> None:
+        for inode in self.pid_sockets.pop(pid, ()):
+            if self.owner.get(inode) == pid:
+                del self.owner[inode]
+        if inodes:
+            self.pid_sockets[pid] = inodes
+            for inode in inodes:
+                self.owner[inode] = pid
+
+    def _drop(self, pid: int) -> None:
+        self._assign(pid, set())
+        self.pid_start.pop(pid, None)
+
+    def refresh(self, live: Set[int]) -> None:
+        """live 为当前存在的 socket inode 集合"""
+        # 清理已关闭的 socket
+        for inode in [i for i in self.owner if i not in live]:
+            pid = self.owner.pop(inode)
+            self.pid_sockets.get(pid, set()).discard(inode)
+        self.orphans &= live
+        unknown = live - self.owner.keys() - self.orphans
+        if not unknown:
+            return
+
+        pids = [int(p) for p in os.listdir(self.root) if p.isdigit()]
+        alive = set(pids)
+        for pid in [p for p in self.pid_sockets if p not in alive]:
+            self._drop(pid)
+        new = [p for p in pids if p not in self.pid_start]
+        owners = sorted(self.pid_sockets, key=lambda p: len(self.pid_sockets[p]), reverse=True)
+        others = [p for p in pids if p in self.pid_start and p not in self.pid_sockets]
+        for pid in new + owners + others:
+            start = self._starttime(pid)
+            if start is None:
+                self._drop(pid)
+                continue
+            if self.pid_start.get(pid, start) != start:
+                # PID 被复用，旧进程的 socket 归属作废
+                self._drop(pid)
+            self.pid_start[pid] = start
+            inodes = self._scan_pid(pid) & live
+            self._assign(pid, inodes)
+            unknown -= inodes
+            if not unknown:
+                return
+        self.orphans |= unknown
+
+
+class NetAccounting:
+    """
+    进程级网络流量统计：
+    每次刷新导出所有 TCP 连接的累计收发字节，与上一次采样按 inode 做差值，再按 socket 归属累加到进程，得到每秒速率。
+    sock_diag 不可用时退化为采样各 socket 的收发队列长度，作为活跃度的近似。
+    """
+
+    def __init__(self, min_interval: float = 1.0, warmup: float = 0.5, root: str = "/proc"):
+        self.min_interval = min_interval
+        self.warmup = warmup
+        self.root = root
+        self.owners = SocketOwnerIndex(root)
+        # 上一次采样的累计字节（sock_diag 不可用时为 None）与 socket 集合
+        self._counters: Optional[Dict[int, Tuple[int, int]]] = None
+        self._sockets: Set[int] = set()
+        self._stats: Dict[int, Dict[str, Any]] = {}
+        self._timestamp = 0.0
+        self._lock = threading.Lock()
+
+    def _sample(self) -> None:
+        now = time.monotonic()
+        sockets = {}
+        for proto in PROC_NET_FILES:
+            sockets.update(parse_proc_net(proto, self.root))
+        counters = tcp_byte_counters()
+        self.owners.refresh(set(sockets))
+
+        # 上一次没有字节计数时无法求差值，本次只记录基准
+        elapsed = now - self._timestamp if self._timestamp and self._counters is not None else 0.0
+        stats: Dict[int, Dict[str, Any]] = {}
+        for inode, (_, tx_queue, rx_queue) in sockets.items():
+            pid = self.owners.owner.get(inode)
+            if pid is None:
+                continue
+            entry = stats.get(pid)
+            if entry is None:
+                entry = stats[pid] = {
+                    "pid": pid, "connections": 0, "bytes_sent": 0, "bytes_recv": 0,
+                    "bytes_sent_per_sec": 0.0, "bytes_recv_per_sec": 0.0, "queued_bytes": 0,
+                }
+            entry["connections"] += 1
+            entry["queued_bytes"] += tx_queue + rx_queue
+            if counters is None or inode not in counters:
+                continue
+            sent, recv = counters[inode]
+            entry["bytes_sent"] += sent
+            entry["bytes_recv"] += recv
+            if elapsed:
+                old = self._counters.get(inode)
+                if old is None:
+                    if inode in self._sockets:
+                        # 上一次已存在但没有计数（如当时尚未建立连接），没有基准
+                        continue
+                    # 两次采样之间新建的连接，其累计值全部发生在本区间内
+                    old = (0, 0)
+                old_sent, old_recv = old
+                entry["bytes_sent_per_sec"] += max(sent - old_sent, 0) / elapsed
+                entry["bytes_recv_per_sec"] += max(recv - old_recv, 0) / elapsed
+
+        for entry in stats.values():
+            entry["bytes_sent_per_sec"] = round(entry["bytes_sent_per_sec"], 1)
+            entry["bytes_recv_per_sec"] = round(entry["bytes_recv_per_sec"], 1)
+            entry["total_per_sec"] = round(entry["bytes_sent_per_sec"] + entry["bytes_recv_per_sec"], 1)
+        self._counters = counters
+        self._sockets = set(sockets)
+        self._stats = stats
+        self._timestamp = now
+
+    def refresh(self, force: bool = False) -> None:
+        """刷新统计，距上次刷新不足 min_interval 时跳过；首次刷新先取基准再等待 warmup 秒"""
+        with self._lock:
+            if not self._timestamp:
+                self._sample()
+                time.sleep(self.warmup)
+                self._sample()
+            elif force or time.monotonic() - self._timestamp >= self.min_interval:
+                self._sample()
+
+    def _name(self, pid: int) -> str:
+        try:
+            with open(f"{self.root}/{pid}/comm") as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def top(self, n: int = 5) -> List[Dict[str, Any]]:
+        """
+        返回网络速率最高的 n 个进程（速率相同时按排队字节数）。
+        只读取后台采样线程最近一次 refresh() 的结果，不在调用方（接口的事件循环）中重新采集。
+        """
+        return top_k(
+            self._stats.values(), n,
+            key=lambda e: (e["total_per_sec"], e["queued_bytes"]),
+            build=lambda e: {"name": self._name(e["pid"]), **e},
+        )
+
+
+# 模块级共享实例，由后台采样线程定期刷新
+accounting = NetAccounting()
@@ -1,5 +1,8 @@
 import psutil
 from .base import Collector
+from .conntrack import tracker
+from .net_accounting import accounting
+from .rates import RateTracker
 from typing import List, Dict, Any
 import time
 
@@ -7,6 +10,10 @@ import time
 class NetworkCollector(Collector):
     """网络 I/O 情况采集器"""
 
+    def __init__(self):
+        # 累计计数转速率（字节/秒、包/秒、错误与丢包/秒）
+        self.nic_rates = RateTracker()
+
     def collect(self) -> dict:
         try:
             # 每个网卡的累计统计
@@ -26,13 +33,21 @@ class NetworkCollector(Collector):
 
             # 全局统计
             total = psutil.net_io_counters(pernic=False)
+            total_stats = {
+                "bytes_sent": total.bytes_sent,
+                "bytes_recv": total.bytes_recv,
+                "packets_sent": total.packets_sent,
+                "packets_recv": total.packets_recv,
+            }
+
+            # 速率：网卡消失时丢弃其历史，新网卡下一次采集开始给出速率
+            rates = self.nic_rates.update({**nic_stats, "_total": total_stats})
             return {
                 "per_nic": nic_stats,
-                "total": {
-                    "bytes_sent": total.bytes_sent,
-                    "bytes_recv": total.bytes_recv,
-                    "packets_sent": total.packets_sent,
-                    "packets_recv": total.packets_recv,
+                "total": total_stats,
+                "rates": {
+                    "per_nic": {nic: r for nic, r in rates.items() if nic != "_total"},
+                    "total": rates.get("_total", {}),
                 },
             }
         except Exception as e:
@@ -40,41 +55,26 @@ class NetworkCollector(Collector):
 
     def top(self, n: int = 5) -> List[Dict[str, Any]]:
         """
-        返回当前网络 I/O 最多的 n 个进程（通过进程 io_counters 中的 bytes_sent+bytes_recv）。
-        每项包含 pid、name、bytes_sent、bytes_recv。
+        返回当前网络流量最大的 n 个进程。
+        通过 socket inode 把每条 TCP 连接的收发字节归属到进程，按相邻两次采样的差值计算速率；
+        结果由后台采样线程定期刷新，这里只做 top-N 选择。
+        每项包含 pid、name、connections、bytes_sent、bytes_recv、bytes_sent_per_sec、bytes_recv_per_sec、
+        queued_bytes、total_per_sec。
         """
-        procs = []
-        for p in psutil.process_iter(['pid', 'name']):
-            try:
-                io = p.io_counters()
-                sent, recv = io.bytes_sent, io.bytes_recv
-                procs.append({
-                    'pid': p.pid,
-                    'name': p.info['name'],
-                    'bytes_sent': sent,
-                    'bytes_recv': recv,
-                    'total': sent + recv
-                })
-            except Exception:
-                continue
-        procs.sort(key=lambda x: x['total'], reverse=True)
-        return procs[:n]
+        return accounting.top(n)
 
     def recent(self, n: int = 5) -> List[Dict[str, Any]]:
         """
-        返回最近建立的 n 条 TCP 连接。
-        每项包含 laddr、raddr、status。
-        注意：psutil.net_connections 不包含创建时间，这里按遍历顺序近似。
+        返回最近新建的 n 条 TCP 连接（按首次出现时间倒序）。
+        连接表由后台定期差分，首次出现时间精确到采样间隔；服务启动前已存在的连接不计入。
+        每项包含 laddr、raddr、status、first_seen、age。
         """
-        conns = []
-        for c in psutil.net_connections(kind='tcp'):
-            try:
-                conns.append({
-                    'laddr': f"{c.laddr.ip}:{c.laddr.port}" if c.laddr else None,
-                    'raddr': f"{c.raddr.ip}:{c.raddr.port}" if c.raddr else None,
-                    'status': c.status
-                })
-            except Exception:
-                continue
-        # 直接取列表末尾 n 条，近似“最近”——可根据实际需求改为 pcap 方案
-        return conns[-n:]
+        return tracker.recent(n)
+
+    def states(self) -> Dict[str, int]:
+        """返回各 TCP 状态（ESTABLISHED、TIME_WAIT 等）的连接数及总数"""
+        return tracker.states()
+
+    def peers(self, n: int = 10) -> List[Dict[str, Any]]:
+        """返回连接数最多的 n 个对端地址，每项包含 peer、connections、states"""
+        return tracker.peers(n)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : packages.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 软件包清单缓存：一次性读取 dpkg 状态文件（或一次 rpm -qa）和当前解释器的 Python 包，
+              包数据库的 mtime 变化时重新加载。
+"""
+import importlib.metadata
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger("monitor.packages")
+
+DPKG_STATUS = "/var/lib/dpkg/status"
+# 不同发行版/版本的 rpm 数据库位置，任一文件变化都说明有包被安装或卸载
+RPM_DB_PATHS = [
+    "/var/lib/rpm/rpmdb.sqlite",
+    "/var/lib/rpm/Packages",
+    "/usr/lib/sysimage/rpm/rpmdb.sqlite",
+    "/usr/lib/sysimage/rpm/Packages",
+]
+RPM_QUERY_TIMEOUT = 60
+
+
+def normalize_pip_name(name: str) -> str:
+    """PEP 503 名称归一化：不区分大小写，'-'、'_'、'.' 视为相同"""
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def parse_dpkg_status(text: str) -> Dict[str, str]:
+    """解析 dpkg 状态文件，返回已安装包 {包名: 版本}；多架构包同时以 包名:架构 为键"""
+    packages: Dict[str, str] = {}
+    for stanza in text.split("\n\n"):
+        fields = {}
+        for line in stanza.splitlines():
+            # 以空格开头的是多行字段（如 Description）的续行
+            if not line or line[0] in " \t":
+                continue
+            key, _, value = line.partition(":")
+            if key in ("Package", "Status", "Version", "Architecture"):
+                fields[key] = value.strip()
+        if "Package" not in fields or not fields.get("Status", "").endswith(" installed"):
+            continue
+        name, version = fields["Package"], fields.get("Version", "")
+        packages.setdefault(name, version)
+        if fields.get("Architecture"):
+            packages[f"{name}:{fields['Architecture']}"] = version
+    return packages
+
+
+class PackageInventory:
+    """
+    软件包清单：
+    系统包来自 dpkg 状态文件或一次 rpm -qa，Python 包来自 importlib.metadata（与 pip show 使用同一解释器环境）。
+    每次查询只 stat 包数据库文件和 sys.path 目录，mtime 未变化时直接使用缓存。
+    """
+
+    def __init__(self, dpkg_status: str = DPKG_STATUS, rpm_db_paths=None):
+        self.dpkg_status = dpkg_status
+        self.rpm_db_paths = rpm_db_paths or RPM_DB_PATHS
+        self._system: Dict[str, str] = {}
+        self._python: Dict[str, str] = {}
+        self._manager = ""
+        self._signature: Optional[Tuple] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _mtime(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _current_signature(self) -> Tuple:
+        # 安装/卸载 Python 包会在 site-packages 中增删 *.dist-info 目录，从而改变目录 mtime
+        system = tuple(self._mtime(p) for p in [self.dpkg_status] + list(self.rpm_db_paths))
+        python = tuple(self._mtime(p) for p in sys.path if p and os.path.isdir(p))
+        return system, python
+
+    def _load_system(self) -> None:
+        if os.path.isfile(self.dpkg_status):
+            with open(self.dpkg_status, encoding="utf-8", errors="replace") as f:
+                self._system = parse_dpkg_status(f.read())
+            self._manager = "dpkg"
+            return
+        self._manager = "rpm"
+        try:
+            out = subprocess.run(
+                ["rpm", "-qa", "--qf", "%{NAME}\t%{VERSION}-%{RELEASE}\t%{ARCH}\n"],
+                capture_output=True, text=True, timeout=RPM_QUERY_TIMEOUT,
+            ).stdout
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"读取 rpm 包列表失败: {e}")
+            self._system = {}
+            return
+        packages: Dict[str, str] = {}
+        for line in out.splitlines():
+            parts = line.split("\t")
+            if len(parts) != 3:
+                continue
+            name, version, arch = parts
+            packages.setdefault(name, version)
+            packages[f"{name}.{arch}"] = version
+        self._system = packages
+
+    def _load_python(self) -> None:
+        packages: Dict[str, str] = {}
+        for dist in importlib.metadata.distributions():
+            name = dist.metadata["Name"]
+            if name:
+                # sys.path 中靠前的优先，与 import 的解析顺序一致
+                packages.setdefault(normalize_pip_name(name), dist.version)
+        self._python = packages
+
+    def refresh(self) -> None:
+        """包数据库有变化时重新加载对应部分"""
+        signature = self._current_signature()
+        with self._lock:
+            if signature == self._signature:
+                return
+            old = self._signature or (None, None)
+            if signature[0] != old[0]:
+                self._load_system()
+            if signature[1] != old[1]:
+                self._load_python()
+            self._signature = signature
+
+    @property
+    def manager(self) -> str:
+        self.refresh()
+        return self._manager
+
+    def system_version(self, name: str) -> Optional[str]:
+        self.refresh()
+        return self._system.get(name)
+
+    def python_version(self, name: str) -> Optional[str]:
+        self.refresh()
+        return self._python.get(normalize_pip_name(name))
+
+    def lookup(self, names: List[str]) -> Tuple[str, List[Tuple[Optional[str], Optional[str]]]]:
+        """批量查询，返回 (包管理器, [(系统包版本, Python 包版本)])；整批只检查一次包数据库是否变化"""
+        self.refresh()
+        with self._lock:
+            return self._manager, [(self._system.get(n), self._python.get(normalize_pip_name(n))) for n in names]
+
+
+# 模块级共享实例
+inventory = PackageInventory()
+
+
+if __name__ == "__main__":
+    # 基准：冷加载与缓存命中的查询耗时
+    import time
+
+    start = time.perf_counter()
+    inventory.refresh()
+    print(f"load: {(time.perf_counter() - start) * 1000:.1f} ms, "
+          f"{len(inventory._system)} system / {len(inventory._python)} python packages ({inventory.manager})")
+    start = time.perf_counter()
+    for _ in range(40):
+        inventory.system_version("bash")
+        inventory.python_version("pip")
+    print(f"40 cached lookups: {(time.perf_counter() - start) * 1000:.2f} ms")
+    print("bash:", inventory.system_version("bash"), "pip:", inventory.python_version("pip"))
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : proc_table.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 进程表，缓存每个 PID 的 CPU 时间计数，单次遍历 /proc 通过差值计算 CPU 占用率。
+"""
+import threading
+import time
+from typing import Dict, Any, List
+
+import psutil
+
+
+class ProcessTable:
+    """
+    进程表：
+    每次刷新只遍历一遍进程，记录累计 CPU 时间（user + system），
+    与上一次刷新的计数做差值得到 CPU 百分比（与 psutil.Process.cpu_percent 口径一致，多核可超过 100）。
+    通过 create_time 识别 PID 复用，复用的 PID 视为新进程重新计数。
+    """
+
+    def __init__(self, min_interval: float = 1.0, warmup: float = 0.1):
+        self.min_interval = min_interval  # 两次刷新的最小间隔（秒），间隔内直接返回缓存
+        self.warmup = warmup  # 首次刷新时两次采样的间隔（秒）
+        self._entries: Dict[int, Dict[str, Any]] = {}
+        self._timestamp = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._timestamp if self._timestamp else 0.0
+        entries = {}
+        for p in psutil.process_iter(['pid', 'name', 'create_time', 'cpu_times']):
+            info = p.info
+            times = info['cpu_times']
+            if times is None or info['create_time'] is None:
+                continue
+            cpu_time = times.user + times.system
+            cpu_percent = 0.0
+            prev = self._entries.get(info['pid'])
+            # 同一 PID 且创建时间一致才认为是同一进程
+            if prev is not None and prev['create_time'] == info['create_time'] and elapsed > 0:
+                cpu_percent = round(max(cpu_time - prev['cpu_time'], 0.0) / elapsed * 100, 1)
+            entries[info['pid']] = {
+                'pid': info['pid'],
+                'name': info['name'],
+                'create_time': info['create_time'],
+                'cpu_time': cpu_time,
+                'cpu_percent': cpu_percent,
+            }
+        self._entries = entries
+        self._timestamp = now
+
+    def refresh(self, force: bool = False) -> None:
+        """刷新进程表，距上次刷新不足 min_interval 时跳过"""
+        with self._lock:
+            if not self._timestamp:
+                # 首次刷新没有基准，先取一次计数
+                self._scan()
+                time.sleep(self.warmup)
+                self._scan()
+            elif force or time.monotonic() - self._timestamp >= self.min_interval:
+                self._scan()
+
+    def processes(self) -> List[Dict[str, Any]]:
+        """刷新并返回当前进程表（列表本身为快照，不随后续刷新改变）"""
+        self.refresh()
+        return list(self._entries.values())
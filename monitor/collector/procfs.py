@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : procfs.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 纯 Python 的 /proc 解析器，复用打开的文件描述符并用 pread 读取，替代 top/vmstat/free/df/iostat 等命令。
+"""
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .mounts import MountProber
+
+# /proc/stat 中 cpu 行的字段（单位：USER_HZ）
+CPU_FIELDS = ("user", "nice", "system", "idle", "iowait", "irq", "softirq", "steal", "guest", "guest_nice")
+# /proc/diskstats 中设备名之后的字段
+DISK_FIELDS = (
+    "reads", "reads_merged", "sectors_read", "read_ms",
+    "writes", "writes_merged", "sectors_written", "write_ms",
+    "in_flight", "io_ms", "weighted_io_ms",
+)
+# /proc/net/dev 中网卡名之后的字段
+NET_FIELDS = (
+    "rx_bytes", "rx_packets", "rx_errs", "rx_drop", "rx_fifo", "rx_frame", "rx_compressed", "rx_multicast",
+    "tx_bytes", "tx_packets", "tx_errs", "tx_drop", "tx_fifo", "tx_colls", "tx_carrier", "tx_compressed",
+)
+SECTOR_SIZE = 512
+# 伪文件系统，df 默认不展示
+PSEUDO_FS = {
+    "proc", "sysfs", "devtmpfs", "devpts", "cgroup", "cgroup2", "securityfs", "pstore", "bpf", "debugfs",
+    "tracefs", "configfs", "fusectl", "mqueue", "hugetlbfs", "autofs", "binfmt_misc", "rpc_pipefs", "nsfs",
+}
+
+
+class ProcFile:
+    """保持 /proc 文件描述符打开，每次从偏移 0 用 pread 读取最新内容"""
+
+    def __init__(self, path: str, bufsize: int = 65536):
+        self.path = path
+        self.bufsize = bufsize
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self) -> str:
+        # seq_file 实现的文件（/proc/net/tcp、/proc/self/maps 等）每次 read 只返回约一页，
+        # 短读不代表结束，须一直读到返回空为止
+        chunks, offset = [], 0
+        while True:
+            chunk = os.pread(self.fd, self.bufsize, offset)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            offset += len(chunk)
+        return b"".join(chunks).decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+# -------- 单文件解析 --------
+def parse_stat(text: str) -> Dict[str, Any]:
+    """解析 /proc/stat"""
+    result: Dict[str, Any] = {"cpus": []}
+    for line in text.splitlines():
+        parts = line.split()
+        if not parts:
+            continue
+        key = parts[0]
+        if key.startswith("cpu"):
+            times = dict(zip(CPU_FIELDS, map(int, parts[1:])))
+            if key == "cpu":
+                result["cpu"] = times
+            else:
+                result["cpus"].append(times)
+        elif key == "intr":
+            result["intr"] = int(parts[1])
+        elif key in ("ctxt", "btime", "processes", "procs_running", "procs_blocked"):
+            result[key] = int(parts[1])
+    return result
+
+
+def parse_meminfo(text: str) -> Dict[str, int]:
+    """解析 /proc/meminfo，数值统一换算为字节（HugePages_* 等无单位的保持原值）"""
+    result = {}
+    for line in text.splitlines():
+        key, _, rest = line.partition(":")
+        parts = rest.split()
+        if not parts:
+            continue
+        value = int(parts[0])
+        result[key] = value * 1024 if len(parts) > 1 and parts[1] == "kB" else value
+    return result
+
+
+def parse_vmstat(text: str) -> Dict[str, int]:
+    """解析 /proc/vmstat"""
+    result = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+        if value:
+            result[key] = int(value)
+    return result
+
+
+def parse_diskstats(text: str) -> Dict[str, Dict[str, int]]:
+    """解析 /proc/diskstats（跳过从未有过 I/O 的设备）"""
+    result = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) < 14:
+            continue
+        stats = dict(zip(DISK_FIELDS, map(int, parts[3:14])))
+        if stats["reads"] or stats["writes"]:
+            result[parts[2]] = stats
+    return result
+
+
+def parse_net_dev(text: str) -> Dict[str, Dict[str, int]]:
+    """解析 /proc/net/dev"""
+    result = {}
+    for line in text.splitlines()[2:]:
+        name, _, rest = line.partition(":")
+        parts = rest.split()
+        if len(parts) >= 16:
+            result[name.strip()] = dict(zip(NET_FIELDS, map(int, parts[:16])))
+    return result
+
+
+def parse_loadavg(text: str) -> Dict[str, Any]:
+    """解析 /proc/loadavg"""
+    parts = text.split()
+    running, _, total = parts[3].partition("/")
+    return {
+        "load1": float(parts[0]),
+        "load5": float(parts[1]),
+        "load15": float(parts[2]),
+        "tasks_running": int(running),
+        "tasks_total": int(total),
+        "last_pid": int(parts[4]),
+    }
+
+
+def cpu_percent(prev: Dict[str, int], cur: Dict[str, int]) -> Dict[str, float]:
+    """根据两次 /proc/stat cpu 计数计算各状态占比（%）"""
+    # guest 已计入 user，避免重复
+    keys = [k for k in CPU_FIELDS if k not in ("guest", "guest_nice")]
+    deltas = {k: max(cur.get(k, 0) - prev.get(k, 0), 0) for k in keys}
+    total = sum(deltas.values()) or 1
+    return {k: round(v * 100 / total, 1) for k, v in deltas.items()}
+
+
+class ProcReader:
+    """
+    /proc 读取器：
+    每个文件只打开一次，之后用 pread 重读；需要速率的视图（vmstat、iostat）
+    与上一次调用的样本做差值，首次调用返回 None 表示尚无基准。
+    """
+
+    def __init__(self, root: str = "/proc"):
+        self.root = root
+        self._files: Dict[str, ProcFile] = {}
+        self._prev: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        # df 的 statvfs 经由带超时与隔离的探测器执行，失联的网络文件系统不会阻塞调用方
+        self.mounts = MountProber()
+
+    def read(self, name: str) -> str:
+        with self._lock:
+            f = self._files.get(name)
+            if f is None:
+                f = self._files[name] = ProcFile(os.path.join(self.root, name))
+            return f.read()
+
+    # -------- 原始结构 --------
+    def stat(self) -> Dict[str, Any]:
+        return parse_stat(self.read("stat"))
+
+    def meminfo(self) -> Dict[str, int]:
+        return parse_meminfo(self.read("meminfo"))
+
+    def vmstat_counters(self) -> Dict[str, int]:
+        return parse_vmstat(self.read("vmstat"))
+
+    def diskstats(self) -> Dict[str, Dict[str, int]]:
+        return parse_diskstats(self.read("diskstats"))
+
+    def net_dev(self) -> Dict[str, Dict[str, int]]:
+        return parse_net_dev(self.read("net/dev"))
+
+    def loadavg(self) -> Dict[str, Any]:
+        return parse_loadavg(self.read("loadavg"))
+
+    def uptime(self) -> float:
+        return float(self.read("uptime").split()[0])
+
+    def _delta(self, key: str, sample: Any) -> Optional[Tuple[float, Any]]:
+        """保存本次样本，返回 (间隔秒数, 上一次样本)；无基准时返回 None"""
+        now = time.monotonic()
+        prev = self._prev.get(key)
+        self._prev[key] = (now, sample)
+        if prev is None or now - prev[0] <= 0:
+            return None
+        return now - prev[0], prev[1]
+
+    # -------- 命令等价视图 --------
+    def free(self) -> Dict[str, Dict[str, int]]:
+        """等价于 free（字节）"""
+        m = self.meminfo()
+        buff_cache = m.get("Buffers", 0) + m.get("Cached", 0) + m.get("SReclaimable", 0)
+        return {
+            "mem": {
+                "total": m["MemTotal"],
+                "used": m["MemTotal"] - m["MemFree"] - buff_cache,
+                "free": m["MemFree"],
+                "shared": m.get("Shmem", 0),
+                "buff_cache": buff_cache,
+                "available": m.get("MemAvailable", m["MemFree"]),
+            },
+            "swap": {
+                "total": m.get("SwapTotal", 0),
+                "used": m.get("SwapTotal", 0) - m.get("SwapFree", 0),
+                "free": m.get("SwapFree", 0),
+            },
+        }
+
+    def vmstat(self) -> Optional[Dict[str, Any]]:
+        """等价于 vmstat 的一行输出（速率为距上次调用的平均值），首次调用返回 None"""
+        stat, vm, mem = self.stat(), self.vmstat_counters(), self.meminfo()
+        delta = self._delta("vmstat", (stat, vm))
+        if delta is None:
+            return None
+        elapsed, (pstat, pvm) = delta
+        cpu = cpu_percent(pstat["cpu"], stat["cpu"])
+
+        def rate(d_cur, d_prev, key, scale=1.0):
+            return round((d_cur.get(key, 0) - d_prev.get(key, 0)) * scale / elapsed)
+
+        return {
+            "procs": {"r": stat.get("procs_running", 0), "b": stat.get("procs_blocked", 0)},
+            "memory": {
+                "swpd": mem.get("SwapTotal", 0) - mem.get("SwapFree", 0),
+                "free": mem["MemFree"],
+                "buff": mem.get("Buffers", 0),
+                "cache": mem.get("Cached", 0) + mem.get("SReclaimable", 0),
+            },
+            # 页换入换出换算为 KiB/s，与 vmstat 默认单位一致
+            "swap": {"si": rate(vm, pvm, "pswpin", 4), "so": rate(vm, pvm, "pswpout", 4)},
+            "io": {"bi": rate(vm, pvm, "pgpgin"), "bo": rate(vm, pvm, "pgpgout")},
+            "system": {"in": rate(stat, pstat, "intr"), "cs": rate(stat, pstat, "ctxt")},
+            "cpu": {
+                "us": round(cpu["user"] + cpu["nice"], 1),
+                "sy": round(cpu["system"] + cpu["irq"] + cpu["softirq"], 1),
+                "id": cpu["idle"],
+                "wa": cpu["iowait"],
+                "st": cpu["steal"],
+            },
+            "interval": round(elapsed, 3),
+        }
+
+    def iostat(self) -> Optional[Dict[str, Dict[str, float]]]:
+        """等价于 iostat -x 的设备统计（距上次调用的平均值），首次调用返回 None"""
+        disks = self.diskstats()
+        delta = self._delta("iostat", disks)
+        if delta is None:
+            return None
+        elapsed, prev = delta
+        result = {}
+        for dev, cur in disks.items():
+            old = prev.get(dev)
+            if old is None:
+                continue
+            d = {k: max(cur[k] - old[k], 0) for k in DISK_FIELDS if k != "in_flight"}
+            result[dev] = {
+                "r/s": round(d["reads"] / elapsed, 2),
+                "w/s": round(d["writes"] / elapsed, 2),
+                "rkB/s": round(d["sectors_read"] * SECTOR_SIZE / 1024 / elapsed, 2),
+                "wkB/s": round(d["sectors_written"] * SECTOR_SIZE / 1024 / elapsed, 2),
+                "r_await": round(d["read_ms"] / d["reads"], 2) if d["reads"] else 0.0,
+                "w_await": round(d["write_ms"] / d["writes"], 2) if d["writes"] else 0.0,
+                "aqu-sz": round(d["weighted_io_ms"] / 1000 / elapsed, 2),
+                "%util": round(min(d["io_ms"] / 10 / elapsed, 100.0), 2),
+            }
+        return result
+
+    def top_summary(self) -> Dict[str, Any]:
+        """等价于 top 头部的汇总信息（CPU 占比为距上次调用的平均值，首次调用为自开机以来）"""
+        stat, load, mem = self.stat(), self.loadavg(), self.free()
+        delta = self._delta("top", stat["cpu"])
+        base = delta[1] if delta else {k: 0 for k in CPU_FIELDS}
+        return {
+            "uptime": self.uptime(),
+            "load_average": [load["load1"], load["load5"], load["load15"]],
+            "tasks": {"total": load["tasks_total"], "running": load["tasks_running"],
+                      "blocked": stat.get("procs_blocked", 0)},
+            "cpu": cpu_percent(base, stat["cpu"]),
+            "mem": mem["mem"],
+            "swap": mem["swap"],
+        }
+
+    def df(self) -> List[Dict[str, Any]]:
+        """
+        等价于 df（字节），跳过伪文件系统。
+        探测超时或被隔离的挂载点只返回 status/error，无法访问的挂载点与 df 一样跳过。
+        """
+        mounts, seen = [], set()
+        for line in self.read("self/mounts").splitlines():
+            parts = line.split()
+            if len(parts) < 3 or parts[2] in PSEUDO_FS or parts[1] in seen:
+                continue
+            # /proc/mounts 中空格等字符以八进制转义
+            mountpoint = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), parts[1])
+            seen.add(parts[1])
+            mounts.append((parts[0], parts[2], mountpoint))
+
+        usage = self.mounts.probe(m[2] for m in mounts)
+        result = []
+        for filesystem, fstype, mountpoint in mounts:
+            entry = {"filesystem": filesystem, "type": fstype}
+            u = usage[mountpoint]
+            if "status" in u:
+                result.append({**entry, **u, "mounted_on": mountpoint})
+                continue
+            if "error" in u or not u["total"]:
+                continue
+            # disk_usage 的 free 即 f_bavail（非特权用户可用），与 df 的 Avail 一致
+            result.append({
+                **entry,
+                "size": u["total"],
+                "used": u["used"],
+                "avail": u["free"],
+                "use%": u["percent"],
+                "mounted_on": mountpoint,
+            })
+        return result
+
+    @staticmethod
+    def ethtool(interface: str) -> Dict[str, Any]:
+        """等价于 ethtool 的基础链路信息（读取 /sys/class/net）"""
+        base = os.path.join("/sys/class/net", os.path.basename(interface))
+        if not os.path.isdir(base):
+            return {"error": f"interface not found: {interface}"}
+        result: Dict[str, Any] = {"interface": interface}
+        for key in ("speed", "duplex", "operstate", "carrier", "mtu", "address"):
+            try:
+                with open(os.path.join(base, key)) as f:
+                    value = f.read().strip()
+            except OSError:
+                continue
+            result[key] = int(value) if value.lstrip("-").isdigit() else value
+        return result
+
+
+# 模块级共享读取器
+reader = ProcReader()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : python_stack.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 进程外 Python 栈采样：通过 process_vm_readv（不可用时 /proc/<pid>/mem）读取目标 CPython
+              解释器的线程状态与帧链，不注入代码、不暂停目标进程，汇总为折叠栈。
+              支持 64 位 CPython 3.11 ~ 3.13（非 free-threaded 构建）。
+"""
+import ctypes
+import errno
+import mmap
+import os
+import re
+import struct
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from .stack_sampler import StackSampler
+
+# 单个线程最多回溯的帧数；目标进程在读取过程中改写了帧链时也靠它兜底
+MAX_DEPTH = 256
+# 最多遍历的解释器/线程数，防止读到被改写的链表时死循环
+MAX_THREADS = 4096
+# 函数名、文件名的长度上限
+MAX_STR = 4096
+# 已解析的代码对象缓存上限（按地址），超出后整体清空
+CODE_CACHE_SIZE = 8192
+
+# 各版本结构体字段偏移（x86_64/aarch64），取自对应版本 Include/internal 头文件的 offsetof：
+# cframe 不为 None 时，当前帧为 tstate->cframe->current_frame，否则为 tstate->current_frame
+LAYOUTS = {
+    (3, 11): {
+        "interpreters_head": 40, "interp_next": 0, "threads_head": 16,
+        "thread_next": 8, "cframe": 56, "current_frame": 8, "thread_id": 152, "native_thread_id": 160,
+        "frame_code": 32, "frame_previous": 48, "frame_instr": 56, "frame_owner": 69,
+        "code_filename": 112, "code_name": 120, "code_qualname": 128, "code_linetable": 136,
+        "code_firstlineno": 72, "code_adaptive": 184,
+        "ascii_size": 48, "compact_size": 72,
+    },
+    (3, 12): {
+        "interpreters_head": 40, "interp_next": 0, "threads_head": 72,
+        "thread_next": 8, "cframe": 56, "current_frame": 0, "thread_id": 136, "native_thread_id": 144,
+        "frame_code": 0, "frame_previous": 8, "frame_instr": 56, "frame_owner": 70,
+        "code_filename": 112, "code_name": 120, "code_qualname": 128, "code_linetable": 136,
+        "code_firstlineno": 68, "code_adaptive": 192,
+        "ascii_size": 40, "compact_size": 56,
+    },
+}
+# 3.13 起 _PyRuntime 开头是 _Py_DebugOffsets（供进程外调试器使用），以下为其中各字段的 uint64 下标
+DEBUG_COOKIE = b"xdebugpy"
+DEBUG_OFFSET_FIELDS = {
+    (3, 13): {
+        "free_threaded": 2, "interpreters_head": 5, "interp_next": 8, "threads_head": 9,
+        "thread_next": 21, "current_frame": 23, "thread_id": 24, "native_thread_id": 25,
+        "frame_previous": 29, "frame_code": 30, "frame_instr": 31, "frame_owner": 33,
+        "code_filename": 35, "code_name": 36, "code_qualname": 37, "code_linetable": 38,
+        "code_firstlineno": 39, "code_adaptive": 43, "ascii_size": 70,
+    },
+}
+DEBUG_OFFSETS_WORDS = 73
+# 由 C 代码压入的垫片帧（3.12+），不对应 Python 函数
+FRAME_OWNED_BY_CSTACK = 3
+
+# PyBytesObject：ob_size / ob_sval 在各版本中位置相同
+_BYTES_SIZE = 16
+_BYTES_DATA = 32
+# PyASCIIObject：length / state
+_STR_LENGTH = 16
+_STR_STATE = 32
+
+_U64 = struct.Struct("<Q")
+_I32 = struct.Struct("<i")
+
+
+# -------- 读取目标进程内存 --------
+class _IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+def _load_process_vm_readv():
+    try:
+        func = ctypes.CDLL(None, use_errno=True).process_vm_readv
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.POINTER(_IOVec), ctypes.c_ulong,
+                     ctypes.POINTER(_IOVec), ctypes.c_ulong, ctypes.c_ulong]
+    func.restype = ctypes.c_ssize_t
+    return func
+
+
+_process_vm_readv = _load_process_vm_readv()
+
+
+class ProcessMemory:
+    """
+    读取其他进程的内存：优先用 process_vm_readv（一次系统调用、无需打开文件），
+    系统调用不可用时改用 /proc/<pid>/mem。两者都要求对目标进程有 ptrace 权限。
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self._fd: Optional[int] = None
+        if _process_vm_readv is None:
+            self._open_mem()
+
+    def _open_mem(self) -> None:
+        self._fd = os.open(f"/proc/{self.pid}/mem", os.O_RDONLY | os.O_CLOEXEC)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def read(self, addr: int, size: int) -> bytes:
+        if self._fd is None:
+            buf = ctypes.create_string_buffer(size)
+            local = _IOVec(ctypes.addressof(buf), size)
+            remote = _IOVec(addr, size)
+            n = _process_vm_readv(self.pid, ctypes.byref(local), 1, ctypes.byref(remote), 1, 0)
+            if n == size:
+                return buf.raw
+            err = ctypes.get_errno() if n < 0 else errno.EFAULT
+            if err not in (errno.ENOSYS, errno.EPERM):
+                raise OSError(err, f"process_vm_readv({self.pid}, {addr:#x}, {size}): {os.strerror(err)}")
+            # 被 seccomp 禁用等情况：改用 /proc/<pid>/mem（权限不足时这里同样会失败）
+            self._open_mem()
+        data = os.pread(self._fd, size, addr)
+        if len(data) != size:
+            raise OSError(errno.EFAULT, f"short read at {addr:#x}")
+        return data
+
+    def pointer(self, addr: int) -> int:
+        return _U64.unpack(self.read(addr, 8))[0]
+
+
+# -------- 在 ELF 中查找解释器符号 --------
+_ELF_HEADER = struct.Struct("<16sHHIQQQIHHHHHH")
+_SECTION = struct.Struct("<IIQQQQIIQQ")
+_PROGRAM = struct.Struct("<IIQQQQQQ")
+_SYMBOL = struct.Struct("<IBBHQQ")
+SHT_SYMTAB = 2
+SHT_DYNSYM = 11
+PT_LOAD = 1
+
+
+def elf_symbols(path: str, names: Tuple[str, ...]) -> Tuple[Dict[str, int], int]:
+    """
+    从 64 位小端 ELF 的 .dynsym（找不到时再查 .symtab）中查找符号地址，
+    返回 ({符号名: st_value}, 第一个 PT_LOAD 段的页对齐虚拟地址)
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        header = _ELF_HEADER.unpack_from(data, 0)
+        ident = header[0]
+        if ident[:4] != b"\x7fELF" or ident[4] != 2 or ident[5] != 1:
+            raise ValueError(f"{path}: not a 64-bit little-endian ELF file")
+        phoff, shoff = header[5], header[6]
+        phentsize, phnum, shentsize, shnum = header[9], header[10], header[11], header[12]
+
+        load_vaddr = None
+        for i in range(phnum):
+            p_type, _, _, p_vaddr = _PROGRAM.unpack_from(data, phoff + i * phentsize)[:4]
+            if p_type == PT_LOAD:
+                load_vaddr = p_vaddr & ~0xfff
+                break
+
+        sections = [_SECTION.unpack_from(data, shoff + i * shentsize) for i in range(shnum)]
+        wanted = {name.encode(): name for name in names}
+        found: Dict[str, int] = {}
+        for kind in (SHT_DYNSYM, SHT_SYMTAB):
+            for sh in sections:
+                if sh[1] != kind:
+                    continue
+                offset, size, link = sh[4], sh[5], sh[6]
+                str_offset = sections[link][4]
+                for i in range(offset, offset + size - _SYMBOL.size + 1, _SYMBOL.size):
+                    st_name, _, _, st_shndx, st_value, _ = _SYMBOL.unpack_from(data, i)
+                    if not st_name or not st_shndx:
+                        continue
+                    start = str_offset + st_name
+                    name = wanted.get(data[start:data.find(b"\0", start)])
+                    if name is not None and name not in found:
+                        found[name] = st_value
+            if len(found) == len(wanted):
+                break
+    return found, load_vaddr or 0
+
+
+def _mapped_files(pid: int) -> Dict[str, int]:
+    """/proc/<pid>/maps 中各文件从偏移 0 开始映射的最低地址"""
+    bases: Dict[str, int] = {}
+    with open(f"/proc/{pid}/maps") as f:
+        for line in f:
+            parts = line.split(None, 5)
+            if len(parts) < 6 or not parts[5].startswith("/") or int(parts[2], 16) != 0:
+                continue
+            path = parts[5].rstrip("\n")
+            start = int(parts[0].split("-", 1)[0], 16)
+            if path not in bases or start < bases[path]:
+                bases[path] = start
+    return bases
+
+
+# -------- 行号表 --------
+def _varint(table: bytes, i: int) -> Tuple[int, int]:
+    b = table[i]
+    value, shift = b & 63, 6
+    while b & 64:
+        i += 1
+        b = table[i]
+        value |= (b & 63) << shift
+        shift += 6
+    return value, i + 1
+
+
+def _svarint(table: bytes, i: int) -> Tuple[int, int]:
+    value, i = _varint(table, i)
+    return (-(value >> 1) if value & 1 else value >> 1), i
+
+
+def parse_linetable(table: bytes, firstlineno: int) -> Tuple[List[int], List[int]]:
+    """
+    解析 3.11+ 的 co_linetable（位置表），返回 (各区间的结束指令下标, 各区间行号)，
+    行号为 -1 表示没有位置信息。下标以 2 字节的代码单元计。
+    """
+    ends: List[int] = []
+    lines: List[int] = []
+    line, addr, i = firstlineno, 0, 0
+    while i < len(table):
+        first = table[i]
+        code, length = (first >> 3) & 15, (first & 7) + 1
+        i += 1
+        if code == 15:
+            current = -1
+        elif code == 14:
+            delta, i = _svarint(table, i)
+            line += delta
+            current = line
+            for _ in range(3):
+                _, i = _varint(table, i)
+        elif code == 13:
+            delta, i = _svarint(table, i)
+            line += delta
+            current = line
+        elif code >= 10:
+            line += code - 10
+            current = line
+            i += 2
+        else:
+            current = line
+            i += 1
+        addr += length
+        ends.append(addr)
+        lines.append(current)
+    return ends, lines
+
+
+# -------- 解析目标解释器 --------
+class PythonProcess:
+    """
+    附着到一个 CPython 进程（只读内存，不暂停）：定位 _PyRuntime，按版本确定结构体偏移，
+    每次调用 sample() 遍历所有线程的帧链。
+    """
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        with open(f"/proc/{pid}/comm") as f:
+            self.process = f"{f.read().strip()}-{pid}".replace(";", "_")
+        self.mem = ProcessMemory(pid)
+        try:
+            self._attach()
+        except Exception:
+            self.mem.close()
+            raise
+        self._codes: Dict[int, Optional[Tuple[str, str, int, List[int], List[int]]]] = {}
+
+    def close(self) -> None:
+        self.mem.close()
+
+    def _symbols(self) -> Dict[str, int]:
+        """在 libpython（优先）或可执行文件中查找 _PyRuntime 等符号，返回其在目标进程中的地址"""
+        bases = _mapped_files(self.pid)
+        exe = os.readlink(f"/proc/{self.pid}/exe")
+        candidates = [p for p in bases if re.match(r"libpython3\.\d+", os.path.basename(p))]
+        if exe in bases:
+            candidates.append(exe)
+        for path in candidates:
+            # 目标可能在另一个 mount namespace（容器）中，经 /proc/<pid>/root 访问同一文件
+            for real in (f"/proc/{self.pid}/root{path}", path):
+                try:
+                    symbols, load_vaddr = elf_symbols(real, ("_PyRuntime", "Py_Version", "PyCode_Type"))
+                except (OSError, ValueError):
+                    continue
+                if "_PyRuntime" in symbols:
+                    bias = bases[path] - load_vaddr
+                    return {name: value + bias for name, value in symbols.items()}
+                break
+        raise ValueError("not a CPython process (_PyRuntime not found)")
+
+    def _attach(self) -> None:
+        symbols = self._symbols()
+        if "Py_Version" not in symbols or "PyCode_Type" not in symbols:
+            # Py_Version 自 3.11 起导出
+            raise ValueError("unsupported CPython version (3.11 ~ 3.13 required)")
+        self.runtime = symbols["_PyRuntime"]
+        self.code_type = symbols["PyCode_Type"]
+        hexversion = self.mem.pointer(symbols["Py_Version"])
+        self.version = (hexversion >> 24, (hexversion >> 16) & 0xff)
+
+        if self.version in LAYOUTS:
+            layout = dict(LAYOUTS[self.version])
+        elif self.version in DEBUG_OFFSET_FIELDS:
+            raw = self.mem.read(self.runtime, DEBUG_OFFSETS_WORDS * 8)
+            if raw[:8] != DEBUG_COOKIE:
+                raise ValueError("_Py_DebugOffsets cookie mismatch")
+            words = struct.unpack_from(f"<{DEBUG_OFFSETS_WORDS}Q", raw)
+            layout = {name: words[index] for name, index in DEBUG_OFFSET_FIELDS[self.version].items()}
+            if layout.pop("free_threaded"):
+                raise ValueError("free-threaded CPython builds are not supported")
+            layout["cframe"] = None
+            layout["compact_size"] = layout["ascii_size"] + 16
+        else:
+            raise ValueError(f"unsupported CPython version {self.version[0]}.{self.version[1]}")
+        self.layout = layout
+        self._thread_size = max(layout["thread_next"], layout["cframe"] or layout["current_frame"],
+                                layout["thread_id"], layout["native_thread_id"]) + 8
+        self._frame_size = max(layout["frame_code"], layout["frame_previous"],
+                               layout["frame_instr"], layout["frame_owner"]) + 8
+        self._code_size = max(layout["code_filename"], layout["code_name"], layout["code_qualname"],
+                              layout["code_linetable"], layout["code_firstlineno"]) + 8
+
+    def _string(self, addr: int) -> str:
+        head = self.mem.read(addr, _STR_STATE + 4)
+        length = _U64.unpack_from(head, _STR_LENGTH)[0]
+        state = struct.unpack_from("<I", head, _STR_STATE)[0]
+        kind, compact, ascii_ = (state >> 2) & 7, (state >> 5) & 1, (state >> 6) & 1
+        if not compact or kind not in (1, 2, 4) or length > MAX_STR:
+            return "?"
+        offset = self.layout["ascii_size"] if ascii_ else self.layout["compact_size"]
+        raw = self.mem.read(addr + offset, length * kind)
+        return raw.decode({1: "latin-1", 2: "utf-16-le", 4: "utf-32-le"}[kind], errors="replace")
+
+    def _code(self, addr: int) -> Optional[Tuple[str, str, int, List[int], List[int]]]:
+        """读取代码对象的 (qualname, filename, firstlineno, 行号表)，非代码对象返回 None；按地址缓存"""
+        if addr in self._codes:
+            return self._codes[addr]
+        layout = self.layout
+        head = self.mem.read(addr, self._code_size)
+        info = None
+        if _U64.unpack_from(head, 8)[0] == self.code_type:
+            ptr = lambda key: _U64.unpack_from(head, layout[key])[0]
+            firstlineno = _I32.unpack_from(head, layout["code_firstlineno"])[0]
+            table = ptr("code_linetable")
+            size = _U64.unpack(self.mem.read(table + _BYTES_SIZE, 8))[0]
+            linetable = self.mem.read(table + _BYTES_DATA, size) if 0 < size <= 1 << 20 else b""
+            info = (self._string(ptr("code_qualname")).replace(";", "_"),
+                    self._string(ptr("code_filename")).replace(";", "_"),
+                    firstlineno, *parse_linetable(linetable, firstlineno))
+        if len(self._codes) >= CODE_CACHE_SIZE:
+            self._codes.clear()
+        self._codes[addr] = info
+        return info
+
+    def _frames(self, frame: int) -> List[str]:
+        """从当前帧沿 previous 回溯，返回 'qualname (file:line)' 列表（根在前）"""
+        layout = self.layout
+        frames: List[str] = []
+        while frame and len(frames) < MAX_DEPTH:
+            raw = self.mem.read(frame, self._frame_size)
+            code = _U64.unpack_from(raw, layout["frame_code"])[0]
+            owner = raw[layout["frame_owner"]]
+            frame = _U64.unpack_from(raw, layout["frame_previous"])[0]
+            if owner == FRAME_OWNED_BY_CSTACK or not code:
+                continue
+            info = self._code(code)
+            if info is None:
+                continue
+            qualname, filename, firstlineno, ends, lines = info
+            instr = _U64.unpack_from(raw, layout["frame_instr"])[0]
+            index = (instr - code - layout["code_adaptive"]) // 2
+            line = lines[bisect_right(ends, index)] if 0 <= index < (ends[-1] if ends else 0) else firstlineno
+            frames.append(f"{qualname} ({filename}:{line if line >= 0 else firstlineno})")
+        frames.reverse()
+        return frames
+
+    def sample(self) -> List[Tuple[int, List[str]]]:
+        """读取一次所有线程的 Python 栈，返回 [(native_thread_id, 帧列表)]；没有 Python 帧的线程不返回"""
+        layout = self.layout
+        stacks = []
+        seen = 0
+        interp = self.mem.pointer(self.runtime + layout["interpreters_head"])
+        while interp and seen < MAX_THREADS:
+            tstate = self.mem.pointer(interp + layout["threads_head"])
+            while tstate and seen < MAX_THREADS:
+                seen += 1
+                raw = self.mem.read(tstate, self._thread_size)
+                if layout["cframe"] is None:
+                    frame = _U64.unpack_from(raw, layout["current_frame"])[0]
+                else:
+                    cframe = _U64.unpack_from(raw, layout["cframe"])[0]
+                    frame = self.mem.pointer(cframe + layout["current_frame"]) if cframe else 0
+                frames = self._frames(frame)
+                if frames:
+                    stacks.append((_U64.unpack_from(raw, layout["native_thread_id"])[0], frames))
+                tstate = _U64.unpack_from(raw, layout["thread_next"])[0]
+            interp = self.mem.pointer(interp + layout["interp_next"])
+        return stacks
+
+
+class PythonStackSampler(StackSampler):
+    """
+    按 hz 频率对一个或多个 CPython 进程采样 duration 秒，输出格式与 StackSampler 相同。
+    目标进程不暂停，读到正在变化的帧链时本次采样作废（计入 torn），不影响其他采样。
+    """
+
+    def __init__(self, pids: List[int], hz: int = 100, duration: float = 5.0):
+        super().__init__(pids, hz, duration)
+        self._procs: Dict[int, PythonProcess] = {}
+        self.torn = 0
+
+    def _refresh_tasks(self) -> None:
+        for pid in self.pids:
+            if pid in self._procs or pid in self.errors:
+                continue
+            try:
+                self._procs[pid] = PythonProcess(pid)
+            except FileNotFoundError:
+                self.errors[pid] = "process not found"
+            except PermissionError:
+                self.errors[pid] = "permission denied (ptrace access to the target is required)"
+            except (OSError, ValueError) as e:
+                self.errors[pid] = str(e)
+
+    def _sample(self, counts: Counter) -> None:
+        for pid, proc in list(self._procs.items()):
+            try:
+                stacks = proc.sample()
+            except (OSError, ValueError, IndexError, struct.error):
+                if not os.path.exists(f"/proc/{pid}"):
+                    self.errors[pid] = "process exited"
+                    self._procs.pop(pid).close()
+                else:
+                    self.torn += 1
+                continue
+            for tid, frames in stacks:
+                counts[f"{proc.process};thread-{tid};" + ";".join(frames)] += 1
+
+    def _close(self) -> None:
+        for proc in self._procs.values():
+            proc.close()
+        self._procs.clear()
+
+    def run(self) -> Dict[str, Any]:
+        result = super().run()
+        result["torn"] = self.torn
+        return result
+
+
+if __name__ == "__main__":
+    # 示例：启动一个 Python 子进程（主线程忙循环、另一个线程 sleep），采样 2 秒
+    import subprocess
+    import sys
+    import time
+
+    child_code = """
+import threading, time
+def sleeper():
+    while True:
+        time.sleep(0.1)
+def work(n):
+    return sum(i * i for i in range(n))
+def main():
+    threading.Thread(target=sleeper, daemon=True).start()
+    while True:
+        work(10000)
+main()
+"""
+    python = sys.argv[1] if len(sys.argv) > 1 else sys.executable
+    child = subprocess.Popen([python, "-c", child_code])
+    try:
+        time.sleep(0.5)
+        result = PythonStackSampler([child.pid], hz=100, duration=2).run()
+    finally:
+        child.kill()
+    print(f"samples={result['samples']} missed={result['missed']} torn={result['torn']} errors={result['errors']}")
+    for item in result["top"][:5]:
+        print(item["count"], item["stack"])
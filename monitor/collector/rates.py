@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : rates.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 累计计数器转速率：按设备/网卡保存上一次样本，处理计数回绕以及设备的增减。
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+_WRAP_32 = 2 ** 32
+
+
+def counter_delta(prev: int, cur: int) -> int:
+    """
+    计算两次计数之差。
+    cur < prev 时：旧值在 32 位范围内且回绕后差值合理，按 32 位回绕处理；否则视为计数器被重置，从 0 开始计。
+    """
+    if cur >= prev:
+        return cur - prev
+    if prev < _WRAP_32:
+        wrapped = cur + _WRAP_32 - prev
+        if wrapped < _WRAP_32 // 2:
+            return wrapped
+    return cur
+
+
+class RateTracker:
+    """
+    速率计算器：
+    update() 传入 {设备: {字段: 累计值}}，返回 {设备: {新字段名: 每秒速率}}。
+    新出现的设备本次没有基准，不返回速率；消失的设备直接丢弃其历史样本。
+    """
+
+    def __init__(self, names: Optional[Dict[str, str]] = None):
+        # 字段名到输出名的映射，未映射的字段输出为 <字段>_per_sec
+        self.names = names or {}
+        self._prev: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _name(self, field: str) -> str:
+        return self.names.get(field) or f"{field}_per_sec"
+
+    def update(self, samples: Dict[str, Dict[str, int]], now: Optional[float] = None) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic() if now is None else now
+        rates = {}
+        with self._lock:
+            for key, counters in samples.items():
+                prev = self._prev.get(key)
+                if prev is None or now <= prev[0]:
+                    continue
+                elapsed = now - prev[0]
+                rates[key] = {
+                    self._name(field): round(counter_delta(prev[1][field], value) / elapsed, 2)
+                    for field, value in counters.items()
+                    if field in prev[1]
+                }
+            self._prev = {key: (now, counters) for key, counters in samples.items()}
+        return rates
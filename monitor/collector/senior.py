@@ -10,7 +10,6 @@ import os
 import platform
 import subprocess
 import json
-import sys
 
 import psutil
 import inspect
@@ -18,6 +17,10 @@ import traceback
 import faulthandler
 from typing import Dict, Any, List, Optional
 
+from .packages import inventory
+from .python_stack import PythonStackSampler
+from .stack_sampler import StackSampler
+
 
 class SeniorCollector:
     """
@@ -33,7 +36,7 @@ class SeniorCollector:
     def get_package_status(self, pkg_name: str) -> Dict[str, str]:
         """
         返回包是否安装及其版本。
-        支持 Debian(dpkti)/RPM 系统及 Python pip 包。
+        支持 Debian(dpkg)/RPM 系统及 Python pip 包。
         返回格式：{
             'pkg_name': pkg_name,
             'manager': 'dpkg'|'rpm'|'pip',
@@ -41,45 +44,22 @@ class SeniorCollector:
             'version': version or ''
         }
         """
-        # 先检测系统包
-        if self._is_debian_like():
-            cmd = ["dpkg-query", "-W", "-f=${Version}", pkg_name]
-            mgr = 'dpkg'
-        else:
-            cmd = ["rpm", "-q", pkg_name]
-            mgr = 'rpm'
-        try:
-            out = subprocess.check_output(cmd, text=True, stderr=subprocess.DEVNULL).strip()
-            version = out if mgr == 'dpkg' else out.split('-')[-1]
-            status = 'installed'
-        except subprocess.CalledProcessError:
-            version = ''
-            status = 'not installed'
-
-        # 同名 pip 包检测
-        pip_version = ''
-        try:
-            pip_list = subprocess.check_output(
-                [sys.executable, '-m', 'pip', 'show', pkg_name], text=True, stderr=subprocess.DEVNULL
-            )
-            for line in pip_list.splitlines():
-                if line.startswith('Version:'):
-                    pip_version = line.split(':', 1)[1].strip()
-                    break
-        except Exception:
-            pass
-
-        return {
-            'pkg_name': pkg_name,
-            'manager': mgr,
-            'status': status,
-            'version': version,
-            'pip_version': pip_version
-        }
+        return self.get_packages_status([pkg_name])[0]
 
-    # 内部判断
-    def _is_debian_like(self) -> bool:
-        return any(x in platform.platform().lower() for x in ['ubuntu', 'debian', 'mint'])
+    def get_packages_status(self, pkg_names: List[str]) -> List[Dict[str, str]]:
+        """批量查询多个包的安装状态，每项格式同 get_package_status"""
+        # 系统包与 pip 包均来自缓存的包清单，整个请求只检查一次包数据库，未变化时不产生子进程
+        manager, versions = inventory.lookup(pkg_names)
+        return [
+            {
+                'pkg_name': name,
+                'manager': manager,
+                'status': 'installed' if version is not None else 'not installed',
+                'version': version or '',
+                'pip_version': pip_version or ''
+            }
+            for name, (version, pip_version) in zip(pkg_names, versions)
+        ]
 
     # -------- 调用栈信息采集 --------
     def get_native_stack(self, pid: int) -> str:
@@ -112,12 +92,27 @@ class SeniorCollector:
                 stacks[int(tid)] = ["cannot read stack"]
         return stacks
 
+    def profile_stacks(self, pids: List[int], hz: int = 49, duration: float = 5.0) -> Dict[str, Any]:
+        """
+        以 hz 频率对一个或多个进程的所有线程采样 duration 秒（内核栈、wchan、系统调用），不暂停目标进程。
+        返回格式：{'samples', 'missed', 'folded': 折叠栈文本, 'top': [{'stack', 'count'}], 'errors': {pid: 原因}}
+        """
+        return StackSampler(pids, hz, duration).run()
+
+    def profile_python_stacks(self, pids: List[int], hz: int = 100, duration: float = 5.0) -> Dict[str, Any]:
+        """
+        以 hz 频率从进程外读取 CPython（3.11 ~ 3.13）进程各线程的 Python 调用栈，采样 duration 秒，需要 ptrace 权限。
+        返回格式同 profile_stacks，另有 'torn'：因目标进程正在改写帧链而作废的采样数
+        """
+        return PythonStackSampler(pids, hz, duration).run()
+
 
 # -------- 使用示例 --------
 if __name__ == '__main__':
     collector = SeniorCollector()
     # 软件包检测
     print(collector.get_package_status('nginx'))
+    print(collector.get_packages_status(['bash', 'coreutils', 'pip']))
 
     # 原生栈
     pid = os.getpid()
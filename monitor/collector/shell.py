@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : shell.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 异步子进程执行层：超时、并发上限、输出大小上限，相同命令的并发调用合并为一次执行。
+"""
+import asyncio
+import logging
+import os
+import signal
+import time
+from typing import Dict
+
+logger = logging.getLogger("monitor.shell")
+
+# 同时运行的子进程数上限
+MAX_CONCURRENCY = 4
+# 默认超时（秒）
+DEFAULT_TIMEOUT = 10.0
+# 输出大小上限（字节），超出部分丢弃
+MAX_OUTPUT = 1024 * 1024
+
+_semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+# 正在执行的命令 -> 任务，相同命令的并发请求共享同一个任务
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def _kill(proc: asyncio.subprocess.Process) -> None:
+    """结束整个进程组（shell 及其管道中的子进程）"""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _read_capped(stream: asyncio.StreamReader, max_output: int):
+    """读取输出直到 EOF 或达到上限，返回 (数据, 是否被截断)"""
+    chunks, size = [], 0
+    while size < max_output:
+        chunk = await stream.read(min(65536, max_output - size))
+        if not chunk:
+            return b"".join(chunks), False
+        chunks.append(chunk)
+        size += len(chunk)
+    # 达到上限后再探测一个字节，判断是否还有剩余输出
+    return b"".join(chunks), bool(await stream.read(1))
+
+
+async def _execute(command: str, timeout: float, max_output: int) -> str:
+    async with _semaphore:
+        proc = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        # 读取输出与等待退出共用一个截止时间，整条命令最多执行 timeout 秒
+        deadline = time.monotonic() + timeout
+        try:
+            out, truncated = await asyncio.wait_for(_read_capped(proc.stdout, max_output), timeout)
+            if truncated:
+                _kill(proc)
+            returncode = await asyncio.wait_for(proc.wait(), max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            _kill(proc)
+            await proc.wait()
+            logger.warning(f"命令执行超时（{timeout}s）: {command}")
+            return ""
+        except BaseException:
+            _kill(proc)
+            raise
+    text = out.decode("utf-8", errors="replace")
+    if truncated:
+        return text + f"\n... output truncated at {max_output} bytes"
+    # 与 subprocess.check_output 一致：非零退出码视为失败
+    return text if returncode == 0 else ""
+
+
+async def run_shell(command: str, timeout: float = DEFAULT_TIMEOUT, max_output: int = MAX_OUTPUT) -> str:
+    """
+    异步执行 shell 命令并返回标准输出，失败或超时返回空字符串。
+    同一命令正在执行时直接等待已有结果，不再重复创建子进程。
+    """
+    task = _inflight.get(command)
+    if task is None:
+        task = asyncio.ensure_future(_execute(command, timeout, max_output))
+        _inflight[command] = task
+        task.add_done_callback(lambda _: _inflight.pop(command, None))
+    # shield：单个请求被取消时不影响共享同一任务的其他请求
+    return await asyncio.shield(task)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : stack_sampler.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 多进程内核栈采样：按固定频率读取各线程的 /proc/<pid>/task/<tid>/{stack,wchan,syscall,stat}，
+              汇总为折叠栈（folded stacks）计数，可直接用于生成火焰图。
+"""
+import errno
+import os
+import platform
+import time
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from .base import top_k
+from .procfs import ProcFile
+
+# 单次采样的时长与频率上限
+MAX_DURATION = 60.0
+MAX_HZ = 1000
+# 线程列表的刷新间隔（秒），期间新建的线程在下次刷新时加入
+TASK_REFRESH_INTERVAL = 1.0
+# 每个线程常驻打开的 /proc 文件数，以及同时跟踪的线程数上限；
+# 实际上限还不超过 RLIMIT_NOFILE 的 1/4 所能容纳的线程数，其余描述符留给服务本身
+FILES_PER_TASK = 4
+MAX_TASKS = 2048
+# 描述符耗尽：不是文件无法读取，之后可以重试
+_FD_EXHAUSTED = (errno.EMFILE, errno.ENFILE)
+
+STATE_NAMES = {
+    "R": "running", "S": "sleeping", "D": "disk-sleep", "T": "stopped", "t": "tracing-stop",
+    "Z": "zombie", "X": "dead", "I": "idle", "W": "paging", "P": "parked",
+}
+
+# x86_64 上常见的会阻塞的系统调用号，其余以编号显示
+_X86_64_SYSCALLS = {
+    0: "read", 1: "write", 7: "poll", 17: "pread64", 18: "pwrite64", 19: "readv", 20: "writev", 23: "select",
+    34: "pause", 35: "nanosleep", 43: "accept", 44: "sendto", 45: "recvfrom", 46: "sendmsg", 47: "recvmsg",
+    61: "wait4", 72: "fcntl", 74: "fsync", 75: "fdatasync", 202: "futex", 230: "clock_nanosleep",
+    232: "epoll_wait", 270: "pselect6", 271: "ppoll", 281: "epoll_pwait", 288: "accept4", 299: "recvmmsg",
+    307: "sendmmsg", 441: "epoll_pwait2",
+}
+SYSCALL_NAMES = _X86_64_SYSCALLS if platform.machine() == "x86_64" else {}
+
+
+def _task_budget() -> int:
+    """可同时跟踪的线程数"""
+    limit = MAX_TASKS
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY:
+            limit = min(limit, soft // 4 // FILES_PER_TASK)
+    except (ImportError, OSError, ValueError):
+        limit = min(limit, 64)
+    return max(1, limit)
+
+
+def _open(path: str) -> Optional[ProcFile]:
+    """打开可选的 /proc 文件，无权限读取时返回 None；描述符耗尽时抛出，由调用方稍后重试"""
+    try:
+        return ProcFile(path, bufsize=4096)
+    except OSError as e:
+        if e.errno in _FD_EXHAUSTED:
+            raise
+        return None
+
+
+def _read(f: Optional[ProcFile]) -> Optional[str]:
+    if f is None:
+        return None
+    try:
+        return f.read()
+    except OSError:
+        return None
+
+
+class _Task:
+    """单个线程打开的 /proc 文件；无权限读取的文件记为 None，之后不再尝试"""
+
+    def __init__(self, process: str, pid: int, tid: int):
+        base = f"/proc/{pid}/task/{tid}"
+        self.process = process
+        self.tid = tid
+        self.stat = ProcFile(f"{base}/stat", bufsize=4096)
+        self.stack = self.wchan = self.syscall = None
+        try:
+            self.stack = _open(f"{base}/stack")
+            self.wchan = _open(f"{base}/wchan")
+            self.syscall = _open(f"{base}/syscall")
+        except OSError:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        for f in (self.stat, self.stack, self.wchan, self.syscall):
+            if f is not None:
+                f.close()
+
+    def sample(self) -> Optional[str]:
+        """采一次样，返回折叠栈（根在前，以 ';' 分隔）；线程已退出时返回 None"""
+        stat = _read(self.stat)
+        if not stat:
+            return None
+        # comm 中可能含空格或括号，以最后一个 ')' 为界
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        state = stat[stat.rindex(")") + 2:stat.rindex(")") + 3]
+        frames = [self.process, name.replace(";", "_"), f"[{STATE_NAMES.get(state, state)}]"]
+
+        syscall = _read(self.syscall)
+        if syscall is None and self.syscall is not None:
+            self.syscall = None
+        if syscall and syscall.startswith("running"):
+            # 正在用户态运行，内核栈是上一次陷入内核时残留的，没有意义
+            frames.append("[user]")
+            return ";".join(frames)
+        if syscall:
+            nr = syscall.split(None, 1)[0]
+            if nr.isdigit():
+                frames.append("syscall:" + SYSCALL_NAMES.get(int(nr), nr))
+
+        stack = _read(self.stack)
+        if stack is None and self.stack is not None:
+            self.stack = None
+        kernel = []
+        for line in (stack or "").splitlines():
+            # "[<0>] do_sys_poll+0x3d2/0x590" -> "do_sys_poll"
+            symbol = line.split("] ", 1)[-1].split("+", 1)[0].strip()
+            if symbol:
+                kernel.append(symbol)
+        if kernel:
+            frames.extend(reversed(kernel))
+        else:
+            # 读不到内核栈时退化为 wchan（内核隐藏符号时为 "0"）
+            wchan = _read(self.wchan)
+            if wchan and wchan.strip() not in ("", "0"):
+                frames.append("wchan:" + wchan.strip())
+        return ";".join(frames)
+
+
+class StackSampler:
+    """
+    按 hz 频率对一个或多个进程的所有线程采样 duration 秒：
+    每次采样只 pread 已打开的 /proc 文件，不暂停目标进程；错过的采样点直接跳过并计数。
+    同时跟踪的线程数受 _task_budget() 限制，超出的线程不采样，并在 errors 中说明。
+    """
+
+    def __init__(self, pids: List[int], hz: int = 49, duration: float = 5.0):
+        self.pids = list(dict.fromkeys(pids))
+        self.hz = max(1, min(int(hz), MAX_HZ))
+        self.duration = max(0.0, min(float(duration), MAX_DURATION))
+        self._tasks: Dict[int, _Task] = {}
+        self._budget = _task_budget()
+        self.errors: Dict[int, str] = {}
+
+    def _refresh_tasks(self) -> None:
+        alive = set()
+        for pid in self.pids:
+            try:
+                with open(f"/proc/{pid}/comm") as f:
+                    process = f"{f.read().strip()}-{pid}".replace(";", "_")
+                tids = [int(t) for t in os.listdir(f"/proc/{pid}/task")]
+            except OSError as e:
+                self.errors.setdefault(pid, f"cannot read /proc/{pid}: {e.strerror}")
+                continue
+            for tid in tids:
+                alive.add(tid)
+                if tid in self._tasks:
+                    continue
+                if len(self._tasks) >= self._budget:
+                    self.errors[pid] = f"thread limit reached: sampling at most {self._budget} threads"
+                    continue
+                try:
+                    self._tasks[tid] = _Task(process, pid, tid)
+                except OSError as e:
+                    if e.errno in _FD_EXHAUSTED:
+                        # 不记为不可读，下次刷新线程列表时重试
+                        self.errors[pid] = f"cannot open /proc/{pid}/task/{tid}: {e.strerror}"
+        for tid in [t for t in self._tasks if t not in alive]:
+            self._tasks.pop(tid).close()
+
+    def _sample(self, counts: Counter) -> None:
+        """对当前跟踪的所有线程采一次样，计入 counts"""
+        for tid, task in list(self._tasks.items()):
+            folded = task.sample()
+            if folded is None:
+                self._tasks.pop(tid).close()
+            else:
+                counts[folded] += 1
+
+    def _close(self) -> None:
+        for task in self._tasks.values():
+            task.close()
+        self._tasks.clear()
+
+    def run(self) -> Dict[str, Any]:
+        counts: Counter = Counter()
+        interval = 1.0 / self.hz
+        ticks = missed = 0
+        start = time.monotonic()
+        deadline = start + self.duration
+        next_tick = start
+        next_refresh = start
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                if now >= next_refresh:
+                    self._refresh_tasks()
+                    next_refresh = now + TASK_REFRESH_INTERVAL
+                self._sample(counts)
+                ticks += 1
+                next_tick += interval
+                now = time.monotonic()
+                if now > next_tick:
+                    # 采样本身耗时超过间隔：跳过错过的采样点，保持采样时刻对齐
+                    skipped = int((now - next_tick) / interval) + 1
+                    missed += skipped
+                    next_tick += skipped * interval
+                time.sleep(max(0.0, min(next_tick, deadline) - time.monotonic()))
+        finally:
+            self._close()
+
+        return {
+            "pids": self.pids,
+            "hz": self.hz,
+            "duration": round(time.monotonic() - start, 3),
+            "samples": ticks,
+            "missed": missed,
+            # 折叠栈格式：每行 "帧1;帧2;...;叶子 次数"，可直接交给 flamegraph.pl / speedscope
+            "folded": "\n".join(f"{stack} {count}" for stack, count in sorted(counts.items())),
+            "top": top_k(
+                counts.items(), 20,
+                key=lambda item: item[1],
+                build=lambda item: {"stack": item[0], "count": item[1]},
+            ),
+            "errors": self.errors,
+        }
+
+
+if __name__ == "__main__":
+    # 示例：对自身进程中一个阻塞在 select 的线程和一个忙循环线程采样 2 秒
+    import select
+    import threading
+
+    def busy():
+        end = time.time() + 3
+        while time.time() < end:
+            pass
+
+    threading.Thread(target=lambda: select.select([], [], [], 3), name="sleeper", daemon=True).start()
+    threading.Thread(target=busy, name="busy", daemon=True).start()
+    result = StackSampler([os.getpid()], hz=99, duration=2).run()
+    print(f"samples={result['samples']} missed={result['missed']} duration={result['duration']}s")
+    print(result["folded"])
@@ -6,32 +6,77 @@ Author      : wzw
 Date Created: 2025/7/2
 Description : Add your script's purpose here.
 """
-import subprocess
+import asyncio
+import shlex
+from typing import Any, Dict, List
 
-def run_shell(command: str) -> str:
-    """执行 shell 命令并返回输出"""
-    try:
-        return subprocess.check_output(command, shell=True, text=True, stderr=subprocess.DEVNULL)
-    except subprocess.CalledProcessError:
-        return ""
+from .base import top_k
+from .proc_table import ProcessTable
+from .procfs import reader
+from .shell import run_shell
 
-def collect_top() -> str:
-    return run_shell("top -b -n 1")
+# format=json 时的进程视图（top/pidstat 共用）
+_table = ProcessTable()
 
-def collect_vmstat() -> str:
-    return run_shell("vmstat 1 2 | tail -1")
 
-def collect_pidstat() -> str:
-    return run_shell("pidstat 1 1")
+async def collect_top() -> str:
+    return await run_shell("top -b -n 1", timeout=5)
 
-def collect_free() -> str:
-    return run_shell("free -m")
+async def collect_vmstat() -> str:
+    return await run_shell("vmstat 1 2 | tail -1", timeout=5)
 
-def collect_df() -> str:
-    return run_shell("df -h")
+async def collect_pidstat() -> str:
+    return await run_shell("pidstat 1 1", timeout=5)
 
-def collect_iostat() -> str:
-    return run_shell("iostat -x 1 1")
+async def collect_free() -> str:
+    return await run_shell("free -m", timeout=3)
 
-def collect_ethtool(interface: str = "eth0") -> str:
-    return run_shell(f"ethtool {interface}")
+async def collect_df() -> str:
+    # 挂载点无响应时 df 可能长时间阻塞，超时较短
+    return await run_shell("df -h", timeout=5)
+
+async def collect_iostat() -> str:
+    return await run_shell("iostat -x 1 1", timeout=5)
+
+async def collect_ethtool(interface: str = "eth0") -> str:
+    return await run_shell(f"ethtool {shlex.quote(interface)}", timeout=3)
+
+
+# -------- 基于 /proc 的结构化输出（format=json） --------
+def _busy_processes(n: int) -> List[Dict[str, Any]]:
+    return top_k(
+        (p for p in _table.processes() if p['cpu_percent'] > 0), n,
+        key=lambda p: p['cpu_percent'],
+        build=lambda p: {'pid': p['pid'], 'name': p['name'], 'cpu_percent': p['cpu_percent']}
+    )
+
+async def _sampled(func):
+    """速率类视图首次调用没有基准，等待 1 秒后再取一次（与 vmstat 1 2 一致）"""
+    data = func()
+    if data is None:
+        await asyncio.sleep(1)
+        data = func()
+    return data
+
+async def collect_top_json() -> Dict[str, Any]:
+    summary = reader.top_summary()
+    summary["processes"] = await asyncio.to_thread(_busy_processes, 20)
+    return summary
+
+async def collect_vmstat_json() -> Dict[str, Any]:
+    return await _sampled(reader.vmstat)
+
+async def collect_pidstat_json() -> List[Dict[str, Any]]:
+    return await asyncio.to_thread(_busy_processes, 100)
+
+async def collect_free_json() -> Dict[str, Any]:
+    return reader.free()
+
+async def collect_df_json() -> List[Dict[str, Any]]:
+    return await asyncio.to_thread(reader.df)
+
+async def collect_iostat_json() -> Dict[str, Any]:
+    return await _sampled(reader.iostat)
+
+async def collect_ethtool_json(interface: str = "eth0") -> Dict[str, Any]:
+    return reader.ethtool(interface)
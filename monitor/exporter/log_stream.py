@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : log_stream.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 日志实时跟踪接口（Server-Sent Events），支持服务端正则过滤。
+"""
+import asyncio
+import os
+import re
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Query, HTTPException
+from fastapi.responses import StreamingResponse
+
+from monitor.collector import log_reader
+
+# 无新日志时发送心跳注释的间隔（秒），避免代理因空闲断开连接
+KEEPALIVE_INTERVAL = 15.0
+
+router = APIRouter()
+
+
+def _compile(grep: Optional[str]) -> Optional[str]:
+    if not grep:
+        return None
+    try:
+        re.compile(grep)
+    except re.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid grep pattern: {e}")
+    return grep
+
+
+async def _events(lines: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    """把日志行编码为 SSE 事件；日志源结束时结束响应，客户端断开时关闭迭代器，释放共享的监听"""
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(lines.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=KEEPALIVE_INTERVAL)
+            if not done:
+                yield b": keepalive\n\n"
+                continue
+            task, pending = pending, None
+            try:
+                line = task.result()
+            except StopAsyncIteration:
+                # 日志源已结束（如 journalctl 退出），结束响应，客户端重连时会重新启动
+                return
+            yield f"data: {line}\n\n".encode("utf-8")
+    finally:
+        if pending is not None:
+            # 先等待被取消的读取结束，迭代器空闲后才能关闭
+            pending.cancel()
+            await asyncio.wait({pending})
+        await lines.aclose()
+
+
+def _stream(lines: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        _events(lines),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/metrics/logs/system/follow")
+async def follow_system_log(grep: Optional[str] = Query(None)):
+    """实时跟踪系统日志（SSE），grep 为可选的正则过滤条件"""
+    return _stream(log_reader.follow_system_log(_compile(grep)))
+
+
+@router.get("/metrics/logs/app/follow")
+async def follow_app_log(path: str = Query(..., min_length=1), grep: Optional[str] = Query(None)):
+    """实时跟踪指定应用日志新追加的行（SSE），处理日志轮转与截断，grep 为可选的正则过滤条件"""
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Log file not found: {path}")
+    return _stream(log_reader.follow_app_log(path, _compile(grep)))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : prometheus.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : Prometheus/OpenMetrics 文本导出，按采样代数缓存编码后的结果。
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Response
+
+from monitor.utils.os_info import sampler
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "sysmon"
+
+router = APIRouter()
+
+# (采样代数, 编码后的文本)，同一代快照只渲染一次
+_cache: Optional[Tuple[int, bytes]] = None
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class _Writer:
+    """按指标族组织输出，同名指标族只写一次 HELP/TYPE"""
+
+    def __init__(self):
+        self.families: Dict[str, Tuple[str, str, List[str]]] = {}
+
+    def add(self, name: str, mtype: str, help_text: str, value: Any, labels: Optional[Dict[str, Any]] = None):
+        if value is None or isinstance(value, bool):
+            return
+        family = self.families.setdefault(name, (mtype, help_text, []))
+        sample = f"{PREFIX}_{name}_total" if mtype == "counter" else f"{PREFIX}_{name}"
+        if labels:
+            sample += "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+        family[2].append(f"{sample} {value}")
+
+    def render(self) -> bytes:
+        lines = []
+        for name, (mtype, help_text, samples) in self.families.items():
+            lines.append(f"# TYPE {PREFIX}_{name} {mtype}")
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.extend(samples)
+        lines.append("# EOF")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def render_metrics(data: Dict[str, Any], timestamp: float) -> bytes:
+    """把 get_os_info() 结构的快照渲染为 OpenMetrics 文本"""
+    w = _Writer()
+    w.add("snapshot_timestamp_seconds", "gauge", "Time the snapshot was sampled.", timestamp)
+
+    # -------- CPU / 内存 --------
+    cpu = data.get("cpu", {})
+    w.add("cpu_usage_percent", "gauge", "Overall CPU usage.", cpu.get("cpu_percent_overall"))
+    for core, pct in enumerate(cpu.get("cpu_percent_per_core", [])):
+        w.add("cpu_core_usage_percent", "gauge", "Per-core CPU usage.", pct, {"core": core})
+    w.add("cpu_count", "gauge", "Number of CPUs.", cpu.get("cpu_count_logical"), {"type": "logical"})
+    w.add("cpu_count", "gauge", "Number of CPUs.", cpu.get("cpu_count_physical"), {"type": "physical"})
+    w.add("memory_total_bytes", "gauge", "Total physical memory.", cpu.get("memory_total"))
+    w.add("memory_available_bytes", "gauge", "Available memory.", cpu.get("memory_available"))
+    w.add("memory_used_bytes", "gauge", "Used memory.", cpu.get("memory_used"))
+    w.add("memory_usage_percent", "gauge", "Memory usage.", cpu.get("memory_percent"))
+    w.add("swap_total_bytes", "gauge", "Total swap.", cpu.get("swap_total"))
+    w.add("swap_used_bytes", "gauge", "Used swap.", cpu.get("swap_used"))
+    w.add("swap_usage_percent", "gauge", "Swap usage.", cpu.get("swap_percent"))
+
+    # -------- 磁盘 --------
+    disk = data.get("disk", {})
+    for device, info in disk.items():
+        if device == "io" or not isinstance(info, dict) or "mountpoint" not in info:
+            continue
+        labels = {"device": device, "mountpoint": info.get("mountpoint", ""), "fstype": info.get("fstype", "")}
+        # 探测超时、被隔离或无权限的挂载点没有容量数据
+        w.add("disk_unavailable", "gauge", "Whether the partition could not be probed.",
+              int("percent" not in info), labels)
+        if "percent" not in info:
+            continue
+        w.add("disk_total_bytes", "gauge", "Partition size.", info.get("total"), labels)
+        w.add("disk_used_bytes", "gauge", "Partition used bytes.", info.get("used"), labels)
+        w.add("disk_free_bytes", "gauge", "Partition free bytes.", info.get("free"), labels)
+        w.add("disk_usage_percent", "gauge", "Partition usage.", info.get("percent"), labels)
+    io = disk.get("io", {})
+    if isinstance(io, dict):
+        w.add("disk_reads", "counter", "Completed disk reads.", io.get("read_count"))
+        w.add("disk_writes", "counter", "Completed disk writes.", io.get("write_count"))
+        w.add("disk_read_bytes", "counter", "Bytes read from disk.", io.get("read_bytes"))
+        w.add("disk_written_bytes", "counter", "Bytes written to disk.", io.get("write_bytes"))
+
+    # -------- 网络 --------
+    for nic, stats in data.get("network", {}).get("per_nic", {}).items():
+        labels = {"nic": nic}
+        w.add("network_transmit_bytes", "counter", "Bytes sent.", stats.get("bytes_sent"), labels)
+        w.add("network_receive_bytes", "counter", "Bytes received.", stats.get("bytes_recv"), labels)
+        w.add("network_transmit_packets", "counter", "Packets sent.", stats.get("packets_sent"), labels)
+        w.add("network_receive_packets", "counter", "Packets received.", stats.get("packets_recv"), labels)
+        w.add("network_receive_errors", "counter", "Receive errors.", stats.get("errin"), labels)
+        w.add("network_transmit_errors", "counter", "Transmit errors.", stats.get("errout"), labels)
+        w.add("network_receive_drops", "counter", "Dropped incoming packets.", stats.get("dropin"), labels)
+        w.add("network_transmit_drops", "counter", "Dropped outgoing packets.", stats.get("dropout"), labels)
+
+    # -------- 异常检测 --------
+    for metric, result in data.get("anomaly", {}).items():
+        w.add("anomaly_score", "gauge", "Signed z-score of the metric against its learned baseline.",
+              result.get("score"), {"metric": metric})
+
+    # -------- 采集器自身状态 --------
+    for name, meta in data.get("collectors", {}).items():
+        labels = {"collector": name}
+        w.add("collector_duration_seconds", "gauge", "Time the collector took.", meta.get("latency"), labels)
+        w.add("collector_stale", "gauge", "Whether the collector returned a previous result.",
+              int(bool(meta.get("stale"))), labels)
+
+    return w.render()
+
+
+@router.get("/metrics/prometheus")
+async def prometheus_metrics():
+    """Prometheus/OpenMetrics 抓取接口（同一采样快照只渲染一次，并发抓取共享同一份字节）"""
+    global _cache
+    snapshot = await sampler.snapshot()
+    generation = sampler.generation
+    if _cache is None or _cache[0] != generation:
+        _cache = (generation, render_metrics(snapshot, snapshot["timestamp"]))
+    return Response(content=_cache[1], media_type=CONTENT_TYPE)
@@ -2,7 +2,8 @@ import asyncio
 import os, sys
 import time
 from contextlib import asynccontextmanager
-from typing import Any, Dict, List
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
 
 import uvicorn
 from fastapi import FastAPI, Query, HTTPException, APIRouter
@@ -10,7 +11,6 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 import pytz
 
@@ -25,8 +25,12 @@ from monitor.collector.network import NetworkCollector
 from monitor.collector import system_command, log_reader
 from monitor.collector.senior import SeniorCollector
 from monitor.config import USE_THRESHOLD, EMAIL_REPORT_TIME, RECIPIENTS
-from monitor.utils.send_mail import send_alert_email, send_info_email, verify_signature
-from monitor.utils.os_info import get_os_info
+from monitor.utils.send_mail import mailer, templates, send_alert_email, send_info_email, verify_signature
+from monitor.utils.os_info import sampler, history, windows
+from monitor.utils.alerting import engine as alert_engine, rules_from_thresholds, anomaly_rules
+from monitor.utils.window import parse_window
+from monitor.exporter.prometheus import router as prometheus_router
+from monitor.exporter.log_stream import router as log_stream_router
 
 # —— 初始化监控收集器 —— #
 cpu = CPUCollector()
@@ -37,44 +41,7 @@ senior = SeniorCollector()
 # —— CORS 设置 —— #
 origins = ["*"]
 
-# ================= 邮件警告 =================
-# 全局变量，记录上次发送的时间戳
-_last_alert_time: float = 0.0
-
-
 # —— 定时任务函数 —— #
-async def check_and_alert():
-    global _last_alert_time
-    now = time.time()
-    # 如果上一次发送时间距今不到 30 分钟，跳过
-    if now - _last_alert_time < 30 * 60:
-        return
-
-    data = get_os_info()
-    cpu_data = data['cpu']["cpu_percent_overall"]
-    cpu_flag = cpu_data > USE_THRESHOLD["cpu"]
-
-    memory_data = data['cpu']["memory_percent"]
-    memory_flag = memory_data > USE_THRESHOLD["memory"]
-
-    disk_data = data['disk']
-    disk_flag = False
-    for item in disk_data.values():
-        if item.get("percent", 0) > USE_THRESHOLD["disk"]:
-            disk_flag = True
-            break
-
-    if cpu_flag or memory_flag or disk_flag:
-        # 更新上次发送时间
-        await send_alert_email(recipients=RECIPIENTS)
-        _last_alert_time = now
-        # 发送警告邮件
-        await send_alert_email(
-            recipients=RECIPIENTS,
-        )
-        print(f"[!] 发送邮件警告: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}", flush=True)
-
-
 async def daily_info_report():
     # 获取全量监控
     await send_info_email(
@@ -89,19 +56,6 @@ async def lifespan(app: FastAPI):
     # 在创建调度器时显式设置时区
     scheduler = AsyncIOScheduler(timezone=pytz.timezone('Asia/Shanghai'))  # 使用上海时区（UTC+8）
 
-    # 告警，每分钟跑一次，若错过可容忍 30 分钟误差
-    scheduler.add_job(
-        check_and_alert,
-        trigger=IntervalTrigger(
-            seconds=60,
-            timezone=pytz.timezone('Asia/Shanghai')  # 显式设置时区
-        ),
-        id="check_alert_job",
-        replace_existing=True,
-        coalesce=True,
-        max_instances=1,
-        misfire_grace_time=60
-    )
     # 日报，每天固定时刻
     hour, minute = map(int, EMAIL_REPORT_TIME.split(":"))
     scheduler.add_job(
@@ -115,7 +69,26 @@ async def lifespan(app: FastAPI):
         replace_existing=True
     )
     scheduler.start()
+    # 告警规则（固定阈值 + 按本机历史基线的异常检测）随每次采样增量评估，告警邮件内容取自触发告警的那次采样
+    alert_engine.set_rules(rules_from_thresholds(USE_THRESHOLD) + anomaly_rules())
+    alert_engine.on_alert(lambda alerts: send_alert_email(recipients=RECIPIENTS, alerts=alerts))
+    # 后台采样任务，/metrics 与告警均读取其快照
+    sampler.start()
+    # 后台文件索引爬虫，/metrics/disk/top|recent 优先查询索引
+    disk.index.start()
+    # 后台日志索引，/metrics/logs/search 按索引定位
+    log_reader.index.start()
+    # 预编译邮件模板，告警时直接从内存渲染
+    templates.precompile()
+    # 后台邮件发送线程，继续发送上次未发完的邮件
+    mailer.start()
     yield
+    # 等待发送线程退出（最多数秒），放到线程中执行，不阻塞事件循环
+    await asyncio.to_thread(mailer.stop)
+    log_reader.index.stop()
+    disk.index.stop()
+    await sampler.stop()
+    history.close()
     scheduler.shutdown()
 
 
@@ -157,14 +130,43 @@ async def send_email(req: EmailRequest):
 
 
 app.include_router(router, prefix="/api")
+# Prometheus/OpenMetrics 抓取接口：GET /metrics/prometheus
+app.include_router(prometheus_router)
+app.include_router(log_stream_router)
 
 
 # =============== 基础监控接口 ===============
 
 @app.post("/metrics")
 async def metrics():
-    """综合 CPU、磁盘、网络监控数据"""
-    return get_os_info()
+    """综合 CPU、磁盘、网络监控数据（后台采样快照，snapshot_age 为快照年龄，单位秒）"""
+    return await sampler.snapshot()
+
+
+@app.post("/metrics/alerts")
+async def alerts() -> Dict[str, Any]:
+    """返回告警规则、当前处于告警状态的 (规则, 指标) 以及最近的告警/恢复事件"""
+    return alert_engine.status()
+
+
+@app.post("/metrics/window")
+async def metrics_window(
+        field: str = Query(..., min_length=1),
+        window: str = Query("5m")
+) -> Dict[str, Any]:
+    """
+    返回指标在滑动窗口内的聚合（count/mean/min/max/p50/p90/p95/p99）。
+    field 为完整指标名（如 cpu.cpu_percent_overall）或末尾字段名（如 percent，匹配所有分区）；
+    window 如 60、30s、5m、1h
+    """
+    try:
+        span = parse_window(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result = windows.summary(field, span)
+    if not result:
+        raise HTTPException(status_code=404, detail=f"Unknown metric field: {field}")
+    return {"field": field, "window": span, "metrics": result}
 
 
 # =============== CPU 监控接口 ===============
@@ -172,13 +174,14 @@ async def metrics():
 @app.post("/metrics/cpu/top")
 async def cpu_top(n: int = Query(5, ge=1, le=100)) -> List[Dict[str, Any]]:
     """返回占用 CPU 最高的 n 个进程"""
-    return cpu.top(n)
+    # 遍历全部进程较慢，放到线程中执行，不阻塞事件循环
+    return await asyncio.to_thread(cpu.top, n)
 
 
 @app.post("/metrics/cpu/recent")
 async def cpu_recent(n: int = Query(5, ge=1, le=100)) -> List[Dict[str, Any]]:
     """返回最近创建的 n 个进程"""
-    return cpu.recent(n)
+    return await asyncio.to_thread(cpu.recent, n)
 
 
 # =============== 磁盘监控接口 ===============
@@ -189,7 +192,7 @@ async def disk_top(
         path: str = Query('/', min_length=1)
 ) -> List[Dict[str, Any]]:
     """返回指定路径下最大的 n 个文件"""
-    return disk.top(n, path)
+    return await asyncio.to_thread(disk.top, n, path)
 
 
 @app.post("/metrics/disk/recent")
@@ -198,7 +201,18 @@ async def disk_recent(
         path: str = Query('/', min_length=1)
 ) -> List[Dict[str, Any]]:
     """返回指定路径下最近创建的 n 个文件"""
-    return disk.recent(n, path)
+    return await asyncio.to_thread(disk.recent, n, path)
+
+
+@app.post("/metrics/disk/rates")
+async def disk_rates() -> Dict[str, Any]:
+    """返回磁盘总体及每块磁盘的 IOPS 与读写字节/秒，来自后台采样快照"""
+    snapshot = await sampler.snapshot()
+    return {
+        "io_rate": snapshot["disk"].get("io_rate", {}),
+        "io_rate_per_disk": snapshot["disk"].get("io_rate_per_disk", {}),
+        "snapshot_age": snapshot["snapshot_age"],
+    }
 
 
 # =============== 网络监控接口 ===============
@@ -215,48 +229,84 @@ async def network_recent(n: int = Query(5, ge=1, le=100)) -> List[Dict[str, Any]
     return net.recent(n)
 
 
+@app.post("/metrics/network/states")
+async def network_states() -> Dict[str, int]:
+    """返回各 TCP 状态的连接数"""
+    return net.states()
+
+
+@app.post("/metrics/network/peers")
+async def network_peers(n: int = Query(10, ge=1, le=100)) -> List[Dict[str, Any]]:
+    """返回连接数最多的 n 个对端地址及其连接状态分布"""
+    return net.peers(n)
+
+
+@app.post("/metrics/network/rates")
+async def network_rates() -> Dict[str, Any]:
+    """返回各网卡及总体的速率（字节/秒、包/秒、错误与丢包/秒），来自后台采样快照"""
+    snapshot = await sampler.snapshot()
+    return {"rates": snapshot["network"].get("rates", {}), "snapshot_age": snapshot["snapshot_age"]}
+
+
 # =============== 系统命令执行接口 ===============
 
 @app.post("/metrics/command/top")
-async def get_top():
-    """获取 top 命令输出"""
-    return {"output": system_command.collect_top()}
+async def get_top(format: Literal["text", "json"] = Query("text")):
+    """获取 top 命令输出（format=json 时返回基于 /proc 的结构化数据）"""
+    if format == "json":
+        return {"output": await system_command.collect_top_json()}
+    return {"output": await system_command.collect_top()}
 
 
 @app.post("/metrics/command/vmstat")
-async def get_vmstat():
-    """获取 vmstat 命令输出"""
-    return {"output": system_command.collect_vmstat()}
+async def get_vmstat(format: Literal["text", "json"] = Query("text")):
+    """获取 vmstat 命令输出（format=json 时返回基于 /proc 的结构化数据）"""
+    if format == "json":
+        return {"output": await system_command.collect_vmstat_json()}
+    return {"output": await system_command.collect_vmstat()}
 
 
 @app.post("/metrics/command/pidstat")
-async def get_pidstat():
-    """获取 pidstat 命令输出"""
-    return {"output": system_command.collect_pidstat()}
+async def get_pidstat(format: Literal["text", "json"] = Query("text")):
+    """获取 pidstat 命令输出（format=json 时返回基于 /proc 的结构化数据）"""
+    if format == "json":
+        return {"output": await system_command.collect_pidstat_json()}
+    return {"output": await system_command.collect_pidstat()}
 
 
 @app.post("/metrics/command/free")
-async def get_free():
-    """获取 free 命令输出"""
-    return {"output": system_command.collect_free()}
+async def get_free(format: Literal["text", "json"] = Query("text")):
+    """获取 free 命令输出（format=json 时返回基于 /proc 的结构化数据）"""
+    if format == "json":
+        return {"output": await system_command.collect_free_json()}
+    return {"output": await system_command.collect_free()}
 
 
 @app.post("/metrics/command/df")
-async def get_df():
-    """获取 df 命令输出"""
-    return {"output": system_command.collect_df()}
+async def get_df(format: Literal["text", "json"] = Query("text")):
+    """获取 df 命令输出（format=json 时返回基于 /proc 的结构化数据）"""
+    if format == "json":
+        return {"output": await system_command.collect_df_json()}
+    return {"output": await system_command.collect_df()}
 
 
 @app.post("/metrics/command/iostat")
-async def get_iostat():
-    """获取 iostat 命令输出"""
-    return {"output": system_command.collect_iostat()}
+async def get_iostat(format: Literal["text", "json"] = Query("text")):
+    """获取 iostat 命令输出（format=json 时返回基于 /proc 的结构化数据）"""
+    if format == "json":
+        return {"output": await system_command.collect_iostat_json()}
+    return {"output": await system_command.collect_iostat()}
 
 
 @app.post("/metrics/command/ethtool")
-async def get_ethtool(interface: str = Query("eth0")):
-    """获取指定网卡的 ethtool 信息"""
-    return {"output": system_command.collect_ethtool(interface)}
+async def get_ethtool(
+        interface: str = Query("eth0"),
+        format: Literal["text", "json"] = Query("text")
+):
+    """获取指定网卡的 ethtool 信息（format=json 时读取 /sys/class/net）"""
+    if format == "json":
+        return {"output": await system_command.collect_ethtool_json(interface)}
+    return {"output": await system_command.collect_ethtool(interface)}
 
 
 # =============== 日志读取接口 ===============
@@ -264,13 +314,13 @@ async def get_ethtool(interface: str = Query("eth0")):
 @app.post("/metrics/logs/system")
 async def get_system_log(lines: int = Query(100, ge=1, le=1000)):
     """获取最近 lines 条系统日志（journalctl）"""
-    return {"output": log_reader.collect_system_log(lines)}
+    return {"output": await log_reader.collect_system_log(lines)}
 
 
 @app.post("/metrics/logs/kernel")
 async def get_kernel_log(lines: int = Query(100, ge=1, le=1000)):
     """获取最近 lines 条内核日志（dmesg）"""
-    return {"output": log_reader.collect_kernel_log(lines)}
+    return {"output": await log_reader.collect_kernel_log(lines)}
 
 
 @app.post("/metrics/logs/app")
@@ -279,15 +329,44 @@ async def get_app_log(
         lines: int = Query(100, ge=1, le=1000)
 ):
     """获取指定应用日志最后 lines 行"""
-    return {"output": log_reader.collect_app_log(path, lines)}
+    return {"output": await log_reader.collect_app_log(path, lines)}
+
+
 
+@app.post("/metrics/logs/search")
+async def search_logs(
+        q: str = Query(""),
+        start: Optional[datetime] = Query(None),
+        end: Optional[datetime] = Query(None),
+        path: Optional[List[str]] = Query(None),
+        journal: bool = Query(False),
+        kernel: bool = Query(False),
+        offset: int = Query(0, ge=0),
+        limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    按时间范围和关键字搜索日志（q 为空格分隔的关键字，需全部出现），结果按时间排序并分页。
+    path 可重复指定多个应用日志；journal、kernel 为 true 时同时搜索 journal 与内核日志。
+    """
+    return await log_reader.search_logs(
+        q.split(),
+        start.timestamp() if start else None,
+        end.timestamp() if end else None,
+        path, journal, kernel, offset, limit,
+    )
 
 # =============== 高级监控接口 ===============
 
 @app.post("/metrics/senior/package")
 async def package_status(pkg: str = Query(..., min_length=1)) -> Dict[str, Any]:
     """查询软件包安装状态及版本信息"""
-    return senior.get_package_status(pkg)
+    return await asyncio.to_thread(senior.get_package_status, pkg)
+
+
+@app.post("/metrics/senior/packages")
+async def packages_status(pkg: List[str] = Query(...)) -> List[Dict[str, Any]]:
+    """批量查询多个软件包的安装状态及版本（pkg 可重复指定）"""
+    return await asyncio.to_thread(senior.get_packages_status, pkg)
 
 
 @app.post("/metrics/senior/stack/native")
@@ -308,6 +387,26 @@ async def kernel_stack(pid: int = Query(..., ge=1)) -> Dict[int, List[str]]:
     return stacks
 
 
+@app.post("/metrics/senior/stack/profile")
+async def stack_profile(
+        pid: List[int] = Query(...),
+        hz: int = Query(49, ge=1, le=1000),
+        duration: float = Query(5.0, gt=0, le=60)
+) -> Dict[str, Any]:
+    """对一个或多个进程的所有线程做内核栈采样，返回折叠栈计数（可直接生成火焰图）"""
+    return await asyncio.to_thread(senior.profile_stacks, pid, hz, duration)
+
+
+@app.post("/metrics/senior/stack/python")
+async def python_stack_profile(
+        pid: List[int] = Query(...),
+        hz: int = Query(100, ge=1, le=1000),
+        duration: float = Query(5.0, gt=0, le=60)
+) -> Dict[str, Any]:
+    """从进程外对一个或多个 CPython 进程做 Python 调用栈采样，返回折叠栈计数（可直接生成火焰图）"""
+    return await asyncio.to_thread(senior.profile_python_stacks, pid, hz, duration)
+
+
 @app.post("/")
 async def root():
     """根路径：运行状态提示"""
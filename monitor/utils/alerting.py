@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : alerting.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 流式告警规则引擎：订阅采样器的快照流，按声明式规则（阈值、持续时间、变化率、窗口聚合/分位数）增量评估，
+              同一规则的同一资源只在状态变化或到达重复间隔时通知，恢复使用独立的回差阈值，
+              告警携带触发它的那次采样。
+"""
+import asyncio
+import fnmatch
+import logging
+import operator
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from monitor.utils.sampler import SAMPLE_INTERVAL
+from monitor.utils.window import MIN_CAPACITY, SlidingWindow
+
+logger = logging.getLogger("monitor.alerting")
+
+# 同一规则、同一资源持续告警时重复通知的间隔（秒）
+REPEAT_INTERVAL = 30 * 60
+# 窗口类规则（变化率、分位数、均值等）的默认窗口（秒）
+DEFAULT_WINDOW = 300.0
+# 资源（如被卸载的分区）超过该时间没有新数据时丢弃其状态（秒）
+STALE_AFTER = 600.0
+# 保留的最近告警事件数
+MAX_EVENTS = 200
+
+RULE_TYPES = ("threshold", "rate", "percentile", "mean", "max", "min", "anomaly")
+_OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+# USE_THRESHOLD 中的键 -> 指标名（flatten_metrics 展开后的点分路径，可用通配符）
+THRESHOLD_METRICS = {
+    "cpu": "cpu.cpu_percent_overall",
+    "memory": "cpu.memory_percent",
+    "disk": "disk.*.percent",
+}
+# anomaly_rules() 默认告警的指标
+ANOMALY_METRICS = ("cpu.cpu_percent_overall", "cpu.memory_percent")
+
+
+class Rule:
+    """
+    一条声明式规则，由 dict 构造：
+    {
+        'name': 规则名,
+        'metric': 指标名，可含通配符（如 'disk.*.percent'，每个匹配的指标单独评估）,
+        'type': 'threshold' | 'rate'（每秒变化量） | 'percentile'（窗口内分位数） | 'mean' | 'max' | 'min'（窗口内聚合）
+                | 'anomaly'（异常检测的 z 分数，正数高于基线、负数低于基线）,
+        'op': '>' | '>=' | '<' | '<=',  'threshold': 告警阈值,
+        'clear': 恢复阈值（回差，默认等于 threshold）,
+        'for': 条件需持续的秒数,  'window': 窗口秒数,  'q': 分位数（0~1）,
+        'repeat': 持续告警时重复通知的间隔秒数,  'severity': 'warning' | 'critical'
+    }
+    """
+
+    def __init__(self, spec: Dict[str, Any]):
+        try:
+            self.name = str(spec["name"])
+            self.metric = str(spec["metric"])
+            self.threshold = float(spec["threshold"])
+        except KeyError as e:
+            raise ValueError(f"rule is missing field {e}")
+        self.type = spec.get("type", "threshold")
+        if self.type not in RULE_TYPES:
+            raise ValueError(f"rule {self.name}: unknown type {self.type!r}")
+        self.op = spec.get("op", ">")
+        if self.op not in _OPS:
+            raise ValueError(f"rule {self.name}: unknown op {self.op!r}")
+        self.clear = float(spec.get("clear", self.threshold))
+        self.duration = float(spec.get("for", 0))
+        self.window = float(spec.get("window", DEFAULT_WINDOW))
+        self.q = float(spec.get("q", 0.95))
+        if not 0 <= self.q <= 1:
+            raise ValueError(f"rule {self.name}: q must be within [0, 1]")
+        self.repeat = float(spec.get("repeat", REPEAT_INTERVAL))
+        self.severity = spec.get("severity", "warning")
+        self.spec = dict(spec)
+        self._breach = _OPS[self.op]
+        # 恢复条件与告警方向相反：'>' 的规则在值回落到 clear 以下（含）时恢复
+        self._recovered = operator.le if self.op in (">", ">=") else operator.ge
+
+    def matches(self, metric: str) -> bool:
+        return fnmatch.fnmatchcase(metric, self.metric)
+
+    def breached(self, value: float) -> bool:
+        return self._breach(value, self.threshold)
+
+    def recovered(self, value: float) -> bool:
+        return self._recovered(value, self.clear)
+
+
+class _Series:
+    """单条规则在单个指标上的状态：滑动窗口 + 告警状态机"""
+
+    def __init__(self, rule: Rule, interval: float):
+        self.rule = rule
+        # 窗口类规则共用 window 模块的环形缓冲区实现，容量按规则窗口与采样周期确定（按实际点数增长）；
+        # 分位数规则增量维护窗口内的有序列表，每次采样不必重新排序
+        windowed = rule.type not in ("threshold", "anomaly")
+        self.window = None
+        if windowed:
+            capacity = int(rule.window / interval) + MIN_CAPACITY
+            self.window = SlidingWindow([rule.window], capacity, ordered=rule.type == "percentile")
+        self.value: Optional[float] = None  # 最近一次计算出的规则值
+        self.pending_since: Optional[float] = None
+        self.firing_since: Optional[float] = None
+        self.notified = 0.0
+        self.seen = 0.0
+
+    def update(self, ts: float, value: float) -> Optional[float]:
+        """加入一个采样点，返回规则值（窗口数据不足时为 None）"""
+        rule = self.rule
+        self.seen = ts
+        if self.window is None:
+            return value
+        self.window.update(ts, value)
+        if rule.type == "rate":
+            return self.window.rate(rule.window)
+        if rule.type == "percentile":
+            return self.window.quantile(rule.window, rule.q)
+        return getattr(self.window, rule.type)(rule.window)
+
+
+class AlertEngine:
+    """
+    告警规则引擎：feed() 每收到一次采样就增量更新所有匹配的 (规则, 指标) 状态。
+    状态机：正常 --条件成立--> 待定（pending）--持续 for 秒--> 告警（firing）--满足恢复阈值--> 正常。
+    只有进入告警和持续告警满 repeat 秒时通知处理函数，同一次采样触发的告警合并为一批。
+    """
+
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, interval: float = 5.0):
+        self.interval = interval  # 采样周期（秒），用于确定窗口类规则的缓冲区容量
+        self._rules: List[Rule] = []
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._matches: Dict[str, List[Rule]] = {}  # 指标名 -> 匹配的规则，首次出现时计算
+        self._handlers: List[Callable[[List[Dict[str, Any]]], Any]] = []
+        self._tasks = set()
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=MAX_EVENTS)
+        self._last_sweep = 0.0
+        if rules:
+            self.set_rules(rules)
+
+    # -------- 配置 --------
+    def set_rules(self, specs: List[Dict[str, Any]]) -> None:
+        """替换全部规则（规格非法时抛出 ValueError，原规则不变）；未改动的规则保留其状态"""
+        rules = [Rule(spec) for spec in specs]
+        names = [rule.name for rule in rules]
+        if len(set(names)) != len(names):
+            raise ValueError("rule names must be unique")
+        old = {rule.name: rule.spec for rule in self._rules}
+        keep = {rule.name for rule in rules if old.get(rule.name) == rule.spec}
+        self._series = {key: s for key, s in self._series.items() if key[0] in keep}
+        for key, series in self._series.items():
+            series.rule = next(rule for rule in rules if rule.name == key[0])
+        self._rules = rules
+        self._matches.clear()
+
+    def on_alert(self, handler: Callable[[List[Dict[str, Any]]], Any]) -> None:
+        """注册告警处理函数，参数为同一次采样触发的告警列表；返回协程时在事件循环中调度执行"""
+        self._handlers.append(handler)
+
+    def rules(self) -> List[Dict[str, Any]]:
+        return [rule.spec for rule in self._rules]
+
+    # -------- 评估 --------
+    def _rules_for(self, metric: str) -> List[Rule]:
+        rules = self._matches.get(metric)
+        if rules is None:
+            rules = self._matches[metric] = [rule for rule in self._rules if rule.matches(metric)]
+        return rules
+
+    @staticmethod
+    def _alert(series: _Series, metric: str, state: str, ts: float, sample=None) -> Dict[str, Any]:
+        rule = series.rule
+        alert = {
+            "rule": rule.name,
+            "metric": metric,
+            "type": rule.type,
+            "severity": rule.severity,
+            "state": state,
+            "value": series.value,
+            "op": rule.op,
+            "threshold": rule.threshold if state == "firing" else rule.clear,
+            "since": series.firing_since,
+            "timestamp": ts,
+        }
+        if sample is not None:
+            alert["sample"] = sample
+        return alert
+
+    def _evaluate(self, series: _Series, metric: str, value: float, ts: float, data) -> Optional[Dict[str, Any]]:
+        rule = series.rule
+        current = series.update(ts, value)
+        if current is None:
+            return None
+        series.value = current
+        if series.firing_since is None:
+            if not rule.breached(current):
+                series.pending_since = None
+                return None
+            if series.pending_since is None:
+                series.pending_since = ts
+            if ts - series.pending_since < rule.duration:
+                return None
+            series.firing_since = ts
+        elif rule.recovered(current):
+            self._resolve(series, metric, ts)
+            return None
+        elif ts - series.notified < rule.repeat:
+            return None
+        series.notified = ts
+        return self._alert(series, metric, "firing", ts, data)
+
+    def _resolve(self, series: _Series, metric: str, ts: float) -> None:
+        event = self._alert(series, metric, "resolved", ts)
+        self.events.append(event)
+        logger.info(f"告警恢复: {series.rule.name} {metric} = {series.value}")
+        series.firing_since = series.pending_since = None
+        series.notified = 0.0
+
+    def feed(self, metrics: Dict[str, float], data: Dict[str, Any], timestamp: float,
+             scores: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+        """
+        评估一次采样：metrics 为展开后的 {指标名: 数值}，data 为原始快照（随告警一并交给处理函数），
+        scores 为同一次采样的异常分数 {指标名: z 分数}，供 anomaly 规则使用。
+        返回本次触发的告警列表。
+        """
+        fired = []
+        for metric, value in metrics.items():
+            for rule in self._rules_for(metric):
+                observed = value
+                if rule.type == "anomaly":
+                    # 基线尚未就绪的指标没有分数
+                    observed = (scores or {}).get(metric)
+                    if observed is None:
+                        continue
+                key = (rule.name, metric)
+                series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = _Series(rule, self.interval)
+                alert = self._evaluate(series, metric, observed, timestamp, data)
+                if alert is not None:
+                    fired.append(alert)
+        if timestamp - self._last_sweep > STALE_AFTER / 10:
+            self._sweep(timestamp)
+        if fired:
+            for alert in fired:
+                self.events.append({k: v for k, v in alert.items() if k != "sample"})
+                logger.warning(f"告警: {alert['rule']} {alert['metric']} = {alert['value']} "
+                               f"{alert['op']} {alert['threshold']}")
+            self._dispatch(fired)
+        return fired
+
+    def _sweep(self, now: float) -> None:
+        """丢弃长时间没有数据的资源，仍在告警的记为恢复"""
+        self._last_sweep = now
+        for key, series in list(self._series.items()):
+            if now - series.seen > STALE_AFTER:
+                if series.firing_since is not None:
+                    self._resolve(series, key[1], now)
+                del self._series[key]
+                self._matches.pop(key[1], None)
+
+    def _dispatch(self, alerts: List[Dict[str, Any]]) -> None:
+        for handler in self._handlers:
+            try:
+                result = handler(alerts)
+            except Exception as e:
+                logger.error(f"告警处理函数执行失败: {e}")
+                continue
+            if asyncio.iscoroutine(result):
+                task = asyncio.ensure_future(result)
+                # 持有任务引用直到完成，避免被垃圾回收
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+
+    # -------- 查询 --------
+    def active(self) -> List[Dict[str, Any]]:
+        """当前处于告警状态的 (规则, 指标)"""
+        return [
+            self._alert(series, metric, "firing", series.seen)
+            for (_, metric), series in self._series.items()
+            if series.firing_since is not None
+        ]
+
+    def status(self) -> Dict[str, Any]:
+        return {"rules": self.rules(), "active": self.active(), "recent": list(self.events)}
+
+
+def rules_from_thresholds(thresholds: Dict[str, float], duration: float = 60.0) -> List[Dict[str, Any]]:
+    """
+    由 USE_THRESHOLD 风格的 {'cpu': 90, 'memory': 90, 'disk': 95} 生成默认规则：
+    CPU/内存须持续 duration 秒超过阈值才告警（单次尖峰不告警），回落到阈值 -5 以下才恢复；
+    磁盘按分区逐个评估，回落到阈值 -2 以下恢复。
+    """
+    rules = []
+    for key, threshold in thresholds.items():
+        metric = THRESHOLD_METRICS.get(key)
+        if metric is None:
+            logger.warning(f"未知的阈值项 {key}，已忽略")
+            continue
+        disk = key == "disk"
+        rules.append({
+            "name": f"{key}_high",
+            "metric": metric,
+            "type": "threshold",
+            "op": ">",
+            "threshold": threshold,
+            "clear": threshold - (2 if disk else 5),
+            "for": 0 if disk else duration,
+        })
+    return rules
+
+
+def anomaly_rules(metrics: Tuple[str, ...] = ANOMALY_METRICS, threshold: float = 6.0,
+                  duration: float = 300.0) -> List[Dict[str, Any]]:
+    """
+    异常检测的默认规则：分数持续 duration 秒高于 threshold（显著高于该时段的历史基线）才告警，
+    回落到 threshold 的一半以下恢复。与固定百分比阈值不同，基线按每台主机各自学习。
+    """
+    return [{
+        "name": f"{metric.split('.')[-1]}_anomaly",
+        "metric": metric,
+        "type": "anomaly",
+        "op": ">",
+        "threshold": threshold,
+        "clear": threshold / 2,
+        "for": duration,
+    } for metric in metrics]
+
+
+# 模块级共享实例：由 os_info 喂入采样，由各 exporter 配置规则与通知方式
+engine = AlertEngine(interval=SAMPLE_INTERVAL)
+
+
+if __name__ == "__main__":
+    # 示例：CPU 持续超过阈值才告警、回差恢复；变化率与分位数规则；以及 10 万次评估的耗时
+    engine.set_rules(rules_from_thresholds({"cpu": 90, "disk": 95}, duration=10) + [
+        {"name": "mem_growth", "metric": "cpu.memory_used", "type": "rate", "threshold": 1e6, "window": 30},
+        {"name": "cpu_p90", "metric": "cpu.cpu_percent_overall", "type": "percentile", "q": 0.9,
+         "threshold": 95, "window": 60},
+    ])
+    engine.on_alert(lambda alerts: print("  notify:", [(a["rule"], a["metric"], a["value"]) for a in alerts]))
+    cpu = [50, 95, 50, 95, 96, 97, 98, 99, 88, 86, 84, 50]
+    for i, value in enumerate(cpu):
+        ts = 1000.0 + i * 5
+        print(f"t={ts:.0f} cpu={value}")
+        engine.feed({"cpu.cpu_percent_overall": value, "cpu.memory_used": 1e9 + i * 1e7,
+                     "disk./dev/sda1.percent": 96}, {"cpu": {"cpu_percent_overall": value}}, ts)
+    print("active:", [(a["rule"], a["metric"]) for a in engine.active()])
+
+    start = time.perf_counter()
+    for i in range(100000):
+        engine.feed({"cpu.cpu_percent_overall": 50.0, "cpu.memory_used": 1e9}, {}, 2000.0 + i * 5)
+    print(f"100000 feeds: {time.perf_counter() - start:.2f}s")
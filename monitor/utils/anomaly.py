@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : anomaly.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 在线异常检测：每个指标维护 EWMA 均值/方差与按"星期几 × 小时"（168 个桶）划分的季节基线，
+              每次采样增量更新并给出 z 分数。每个指标的状态大小固定，单次更新的开销与历史长短无关。
+"""
+import fnmatch
+import logging
+import math
+import time
+from array import array
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger("monitor.anomaly")
+
+# 建模的指标（flatten_metrics 展开后的点分路径，可用通配符）：瞬时量直接建模
+GAUGE_METRICS = (
+    "cpu.cpu_percent_overall",
+    "cpu.memory_percent",
+    "cpu.swap_percent",
+    "disk.*.percent",
+)
+# 累计计数器先换算为每秒速率再建模
+COUNTER_METRICS = (
+    "disk.io.*",
+    "network.total.*",
+)
+
+# EWMA 的半衰期（秒）：短期基线
+EWMA_HALF_LIFE = 600.0
+# 季节桶的半衰期（按落在该桶内的时间计，秒）：每周每个桶约有 1 小时的数据，即约两周的记忆
+SEASON_HALF_LIFE = 2 * 3600.0
+SEASON_BUCKETS = 7 * 24
+# 指标累计观测多久后才给出 EWMA 分数；季节桶累计多久后才使用该桶（秒）
+WARMUP = 600.0
+SEASON_WARMUP = 1800.0
+# 两次采样间隔超过该值时按该值计（秒），避免停机很久后一步"遗忘"全部历史
+MAX_STEP = 60.0
+# 标准差下限：绝对值与相对均值的比例，避免几乎恒定的指标因微小波动得到巨大的分数
+MIN_STD = 1.0
+MIN_STD_RATIO = 0.05
+# 指标超过该时间没有数据时丢弃其状态（秒）
+STALE_AFTER = 24 * 3600.0
+
+
+def _alpha(dt: float, half_life: float) -> float:
+    """按时间间隔折算的平滑系数，采样间隔不均匀时权重仍与时间一致"""
+    return 1.0 - math.exp(-dt * math.log(2) / half_life)
+
+
+def _zscore(value: float, mean: float, var: float) -> float:
+    std = max(math.sqrt(max(var, 0.0)), abs(mean) * MIN_STD_RATIO, MIN_STD)
+    return (value - mean) / std
+
+
+class _Model:
+    """
+    单个指标的状态：EWMA 均值/方差、已观测时间，以及 168 个季节桶的 (均值, 方差, 桶内已观测时间)。
+    计数器额外记录上一次的原始值用于求速率。
+    """
+    __slots__ = ("mean", "var", "seen", "season", "prev", "prev_ts", "updated")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.seen = 0.0
+        self.season = array("d", bytes(8 * 3 * SEASON_BUCKETS))
+        self.prev: Optional[float] = None
+        self.prev_ts = 0.0
+        self.updated = 0.0
+
+    def update(self, value: float, dt: float, alpha: float, season_alpha: float, bucket: int) -> Optional[Dict[str, Any]]:
+        """先用更新前的基线为 value 打分，再把 value 并入基线；基线尚未就绪时返回 None"""
+        season = self.season
+        i = bucket * 3
+        z = _zscore(value, self.mean, self.var) if self.seen >= WARMUP else None
+        seasonal_z = _zscore(value, season[i], season[i + 1]) if season[i + 2] >= SEASON_WARMUP else None
+
+        # EWMA 均值/方差的增量更新（West 的加权方差递推）
+        if self.seen == 0:
+            self.mean, self.var = value, 0.0
+        else:
+            diff = value - self.mean
+            incr = alpha * diff
+            self.mean += incr
+            self.var = (1 - alpha) * (self.var + diff * incr)
+        self.seen += dt
+
+        if season[i + 2] == 0:
+            season[i], season[i + 1] = value, 0.0
+        else:
+            diff = value - season[i]
+            incr = season_alpha * diff
+            season[i] += incr
+            season[i + 1] = (1 - season_alpha) * (season[i + 1] + diff * incr)
+        season[i + 2] += dt
+
+        if z is None and seasonal_z is None:
+            return None
+        # 季节桶就绪后以它为准（能区分"周一早高峰"与"深夜突增"），否则用短期基线
+        expected = season[i] if seasonal_z is not None else self.mean
+        return {
+            "value": value,
+            "score": round(seasonal_z if seasonal_z is not None else z, 3),
+            "z": round(z, 3) if z is not None else None,
+            "seasonal_z": round(seasonal_z, 3) if seasonal_z is not None else None,
+            "expected": expected,
+        }
+
+
+class AnomalyDetector:
+    """
+    对一组指标做在线异常检测，由采样线程逐个快照调用 update()。
+    分数为带符号的 z 分数：正数表示高于基线，负数表示低于基线。
+    """
+
+    def __init__(self, gauges: Iterable[str] = GAUGE_METRICS, counters: Iterable[str] = COUNTER_METRICS,
+                 interval: float = 5.0):
+        self.gauges = tuple(gauges)
+        self.counters = tuple(counters)
+        self.interval = interval
+        self._models: Dict[str, _Model] = {}
+        self._kinds: Dict[str, Optional[str]] = {}  # 指标名 -> 'gauge' | 'counter' | None，首次出现时计算
+        self._last = 0.0
+        self._last_sweep = 0.0
+        # 最近一次的结果，整体替换，读取方无需加锁
+        self.scores: Dict[str, Dict[str, Any]] = {}
+        self.timestamp: Optional[float] = None
+
+    def _kind(self, metric: str) -> Optional[str]:
+        if metric not in self._kinds:
+            if any(fnmatch.fnmatchcase(metric, p) for p in self.gauges):
+                self._kinds[metric] = "gauge"
+            elif any(fnmatch.fnmatchcase(metric, p) for p in self.counters):
+                self._kinds[metric] = "counter"
+            else:
+                self._kinds[metric] = None
+        return self._kinds[metric]
+
+    def update(self, metrics: Dict[str, float], timestamp: float) -> Dict[str, Dict[str, Any]]:
+        """
+        并入一次采样，返回 {指标名: {'value', 'score', 'z', 'seasonal_z', 'expected'}}（只含基线已就绪的指标）。
+        计数器的 value 为每秒速率。
+        """
+        if timestamp <= self._last:
+            # 时钟回拨或重复的快照：不更新基线
+            return self.scores
+        dt = min(timestamp - self._last, MAX_STEP) if self._last else self.interval
+        self._last = timestamp
+        alpha = _alpha(dt, EWMA_HALF_LIFE)
+        season_alpha = _alpha(dt, SEASON_HALF_LIFE)
+        local = time.localtime(timestamp)
+        bucket = local.tm_wday * 24 + local.tm_hour
+
+        scores = {}
+        for metric, value in metrics.items():
+            kind = self._kind(metric)
+            if kind is None:
+                continue
+            model = self._models.get(metric)
+            if model is None:
+                model = self._models[metric] = _Model()
+            model.updated = timestamp
+            value = float(value)
+            if kind == "counter":
+                prev, prev_ts = model.prev, model.prev_ts
+                model.prev, model.prev_ts = value, timestamp
+                if prev is None or value < prev:
+                    # 第一次出现或计数器被重置（如网卡重建），下一次再计算速率
+                    continue
+                value = (value - prev) / (timestamp - prev_ts)
+            result = model.update(value, dt, alpha, season_alpha, bucket)
+            if result is not None:
+                scores[metric] = result
+
+        if timestamp - self._last_sweep > STALE_AFTER / 24:
+            self._sweep(timestamp)
+        self.scores = scores
+        self.timestamp = timestamp
+        return scores
+
+    def _sweep(self, now: float) -> None:
+        self._last_sweep = now
+        for metric in [m for m, model in self._models.items() if now - model.updated > STALE_AFTER]:
+            logger.info(f"指标 {metric} 长时间没有数据，丢弃其基线")
+            del self._models[metric]
+            self._kinds.pop(metric, None)
+
+    def score(self, metric: str) -> Optional[float]:
+        result = self.scores.get(metric)
+        return result["score"] if result else None
+
+
+if __name__ == "__main__":
+    # 示例：模拟两周带日周期的 CPU 曲线（白天 60%、夜间 10%），再注入夜间突增与白天骤降，并测量单次更新的耗时
+    import random
+
+    detector = AnomalyDetector(interval=60.0)
+    start_ts = time.mktime((2026, 10, 5, 0, 0, 0, 0, 0, -1))  # 周一 00:00
+
+    def cpu_at(ts):
+        hour = time.localtime(ts).tm_hour
+        return (60.0 if 9 <= hour < 18 else 10.0) + random.gauss(0, 3)
+
+    ts = start_ts
+    for _ in range(14 * 24 * 60):
+        ts += 60
+        detector.update({"cpu.cpu_percent_overall": cpu_at(ts), "network.total.bytes_recv": ts * 1e5}, ts)
+    print("normal: ", detector.scores["cpu.cpu_percent_overall"])
+    night = start_ts + 14 * 86400 + 3 * 3600  # 第三周周一 03:00
+    print("night spike:", detector.update({"cpu.cpu_percent_overall": 60.0}, night)["cpu.cpu_percent_overall"])
+    noon = night + 9 * 3600
+    print("noon drop:  ", detector.update({"cpu.cpu_percent_overall": 10.0}, noon)["cpu.cpu_percent_overall"])
+
+    metrics = {f"disk./mnt/{i}.percent": 50.0 for i in range(1000)}
+    ts = noon
+    begin = time.perf_counter()
+    for _ in range(100):
+        ts += 5
+        detector.update(metrics, ts)
+    print(f"update: {(time.perf_counter() - begin) * 10:.2f} ms/tick for {len(metrics)} metrics")
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : mailer.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 邮件投递：待发邮件先写入本地磁盘队列，由后台线程复用已认证的 SMTP 会话批量发送，
+              临时失败按指数退避重试，进程重启后继续发送未完成的邮件。收件人较多时拆成多封。
+"""
+import json
+import logging
+import mimetypes
+import os
+import smtplib
+import ssl
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("monitor.mailer")
+
+# 队列目录：queue/ 为待发送，failed/ 为最终失败
+SPOOL_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sys-monitor", "mail")
+# 每封邮件最多的收件人数（服务器通常限制单封邮件的 RCPT 数）
+BATCH_RECIPIENTS = 50
+# 最多尝试次数，超过后移入 failed/
+MAX_ATTEMPTS = 8
+# 重试间隔：从 RETRY_INITIAL 开始每次翻倍，不超过 RETRY_MAX（秒）
+RETRY_INITIAL = 30.0
+RETRY_MAX = 3600.0
+# SMTP 会话空闲多久后关闭（秒）
+SESSION_IDLE = 60.0
+# 单次 SMTP 操作的超时（秒）
+SMTP_TIMEOUT = 30.0
+
+
+def build_message(subject: str, sender: str, body_html: str, attachments: Optional[List[str]] = None,
+                  inline_images: Optional[Dict[str, str]] = None) -> EmailMessage:
+    """构造 HTML 邮件：inline_images 为 {content_id: 图片路径}，正文中以 cid:content_id 引用"""
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["Date"] = formatdate(localtime=True)
+    msg["Message-ID"] = make_msgid()
+    msg.set_content(body_html, subtype="html")
+    for cid, path in (inline_images or {}).items():
+        maintype, subtype = (mimetypes.guess_type(path)[0] or "image/png").split("/", 1)
+        with open(path, "rb") as f:
+            msg.add_related(f.read(), maintype=maintype, subtype=subtype, cid=f"<{cid}>",
+                            filename=os.path.basename(path), disposition="inline")
+    for path in attachments or []:
+        maintype, subtype = (mimetypes.guess_type(path)[0] or "application/octet-stream").split("/", 1)
+        with open(path, "rb") as f:
+            msg.add_attachment(f.read(), maintype=maintype, subtype=subtype, filename=os.path.basename(path))
+    return msg
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Mailer:
+    """
+    磁盘队列 + 单个后台发送线程：
+    - submit() 把邮件写入 queue/（先写 .eml 再写 .json，.json 存在即表示该邮件完整入队）后立即返回；
+    - 发送线程按入队顺序发送到期的邮件，同一批次共用一个 SMTP 连接，空闲 SESSION_IDLE 秒后断开；
+    - 连接或认证失败时整个队列一起退避；单个收件人被临时拒绝（4xx）时只对这些收件人重试，
+      被永久拒绝（5xx）的收件人直接放弃。
+    """
+
+    def __init__(self, config: Dict[str, Any], spool_dir: str = SPOOL_DIR, use_ssl: bool = True):
+        self.host = config["host"]
+        self.port = int(config["port"])
+        self.username = config.get("username")
+        self.password = config.get("password")
+        self.sender = config.get("from") or self.username
+        self.use_ssl = use_ssl
+        self.queue_dir = os.path.join(spool_dir, "queue")
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self._pending: Dict[str, Dict[str, Any]] = {}  # id -> 元信息
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    # -------- 队列 --------
+    def _load(self) -> None:
+        """
+        读取上次未发完的邮件（只执行一次）；只有 .eml 没有 .json 的是写入中途中断的残留，直接删除。
+        整个过程持有 _load_lock，submit() 在加载完成后才会写入新邮件，避免其 .eml 被误当作残留删除。
+        """
+        with self._load_lock:
+            if self._loaded:
+                return
+            os.makedirs(self.queue_dir, exist_ok=True)
+            os.makedirs(self.failed_dir, exist_ok=True)
+            names = set(os.listdir(self.queue_dir))
+            with self._lock:
+                for name in sorted(names):
+                    base, ext = os.path.splitext(name)
+                    path = os.path.join(self.queue_dir, name)
+                    if ext == ".tmp" or (ext == ".eml" and base + ".json" not in names):
+                        os.remove(path)
+                    elif ext == ".json":
+                        try:
+                            with open(path, "r", encoding="utf-8") as f:
+                                self._pending[base] = json.load(f)
+                        except (OSError, ValueError) as e:
+                            logger.error(f"邮件队列文件 {name} 无法读取，已忽略: {e}")
+            self._loaded = True
+        if self._pending:
+            logger.info(f"邮件队列中有 {len(self._pending)} 封未发送的邮件")
+
+    def submit(self, message: EmailMessage, recipients: List[str]) -> List[str]:
+        """邮件入队，收件人超过 BATCH_RECIPIENTS 时拆成多封；返回各封邮件的 id"""
+        if not self._loaded:
+            self._load()
+        recipients = list(dict.fromkeys(recipients))
+        ids = []
+        for i in range(0, len(recipients), BATCH_RECIPIENTS):
+            batch = recipients[i:i + BATCH_RECIPIENTS]
+            del message["To"]
+            message["To"] = ", ".join(batch)
+            mail_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+            meta = {
+                "id": mail_id,
+                "subject": str(message["Subject"]),
+                "recipients": batch,
+                "created": time.time(),
+                "attempts": 0,
+                "next_attempt": 0.0,
+                "last_error": None,
+            }
+            _write_atomic(os.path.join(self.queue_dir, mail_id + ".eml"), message.as_bytes())
+            self._save(meta)
+            with self._lock:
+                self._pending[mail_id] = meta
+            ids.append(mail_id)
+        self._wake.set()
+        return ids
+
+    def _save(self, meta: Dict[str, Any]) -> None:
+        _write_atomic(os.path.join(self.queue_dir, meta["id"] + ".json"),
+                      json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+    def _remove(self, meta: Dict[str, Any], failed: bool = False) -> None:
+        with self._lock:
+            self._pending.pop(meta["id"], None)
+        for ext in (".eml", ".json"):
+            path = os.path.join(self.queue_dir, meta["id"] + ext)
+            try:
+                if failed:
+                    os.replace(path, os.path.join(self.failed_dir, meta["id"] + ext))
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _due(self, now: float) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [meta for _, meta in sorted(self._pending.items()) if meta["next_attempt"] <= now]
+
+    def _retry(self, meta: Dict[str, Any], error: str) -> None:
+        """记一次失败：未到上限则按退避时间重新排队，否则移入 failed/"""
+        meta["attempts"] += 1
+        meta["last_error"] = error
+        if meta["attempts"] >= MAX_ATTEMPTS:
+            logger.error(f"邮件 {meta['subject']} 尝试 {meta['attempts']} 次仍失败，已放弃: {error}")
+            self._save(meta)
+            self._remove(meta, failed=True)
+            return
+        delay = min(RETRY_INITIAL * 2 ** (meta["attempts"] - 1), RETRY_MAX)
+        meta["next_attempt"] = time.time() + delay
+        self._save(meta)
+        logger.warning(f"邮件 {meta['subject']} 发送失败（第 {meta['attempts']} 次），{delay:.0f}s 后重试: {error}")
+
+    # -------- SMTP 会话 --------
+    def _connect(self) -> smtplib.SMTP:
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT,
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            if self.username:
+                smtp.login(self.username, self.password)
+        except BaseException:
+            smtp.close()
+            raise
+        return smtp
+
+    def _close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (OSError, smtplib.SMTPException):
+                self._smtp.close()
+            self._smtp = None
+
+    def _sendmail(self, recipients: List[str], raw: bytes) -> Dict[str, Any]:
+        """复用现有会话发送；会话已被服务器断开时重新连接一次"""
+        reused = self._smtp is not None
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            refused = self._smtp.sendmail(self.sender, recipients, raw)
+        except smtplib.SMTPServerDisconnected:
+            self._smtp = None
+            if not reused:
+                raise
+            self._smtp = self._connect()
+            refused = self._smtp.sendmail(self.sender, recipients, raw)
+        self._last_used = time.monotonic()
+        return refused
+
+    def _deliver(self, meta: Dict[str, Any]) -> None:
+        try:
+            with open(os.path.join(self.queue_dir, meta["id"] + ".eml"), "rb") as f:
+                raw = f.read()
+        except OSError as e:
+            logger.error(f"邮件 {meta['subject']} 内容丢失，已放弃: {e}")
+            self._remove(meta, failed=True)
+            return
+        try:
+            refused = self._sendmail(meta["recipients"], raw)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except smtplib.SMTPAuthenticationError:
+            # 认证失败与邮件本身无关，交给发送循环整体退避
+            raise
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500:
+                logger.error(f"邮件 {meta['subject']} 被服务器拒绝，已放弃: {e.smtp_code} {e.smtp_error!r}")
+                meta["last_error"] = f"{e.smtp_code} {e.smtp_error!r}"
+                self._save(meta)
+                self._remove(meta, failed=True)
+            else:
+                self._retry(meta, f"{e.smtp_code} {e.smtp_error!r}")
+            return
+
+        retry = [rcpt for rcpt, (code, _) in refused.items() if code < 500]
+        for rcpt, (code, reply) in refused.items():
+            logger.warning(f"收件人 {rcpt} 被拒绝: {code} {reply!r}")
+        if retry:
+            meta["recipients"] = retry
+            self._retry(meta, f"{len(retry)} recipient(s) temporarily refused")
+        else:
+            logger.info(f"邮件发送成功: {meta['subject']} -> {meta['recipients']}")
+            self._remove(meta)
+
+    # -------- 后台线程 --------
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            now = time.time()
+            due = self._due(now)
+            if not due:
+                if self._smtp is not None and time.monotonic() - self._last_used > SESSION_IDLE:
+                    self._close()
+                with self._lock:
+                    upcoming = min((m["next_attempt"] for m in self._pending.values()), default=now + SESSION_IDLE)
+                self._wake.wait(max(0.05, min(upcoming - now, SESSION_IDLE)))
+                self._wake.clear()
+                continue
+            for meta in due:
+                if self._stop.is_set():
+                    break
+                try:
+                    self._deliver(meta)
+                except (OSError, smtplib.SMTPException) as e:
+                    # 连接、认证失败或连接中断：本批剩余邮件一起退避，下次重新建立会话
+                    self._close()
+                    for rest in due[due.index(meta):]:
+                        self._retry(rest, str(e) or type(e).__name__)
+                    break
+        self._close()
+
+    def start(self) -> None:
+        """启动后台发送线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._load()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="mailer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """停止发送线程；未发完的邮件留在队列中，下次启动时继续"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = list(self._pending.values())
+        return {
+            "pending": len(pending),
+            "retrying": sum(1 for m in pending if m["attempts"]),
+            "failed": len([n for n in os.listdir(self.failed_dir) if n.endswith(".json")])
+            if os.path.isdir(self.failed_dir) else 0,
+        }
+
+
+if __name__ == "__main__":
+    # 示例：本地起一个最简 SMTP 服务器（只支持发信所需的命令），先让它不可达再恢复，
+    # 观察邮件在磁盘队列中等待、退避后复用同一个会话批量送达
+    import asyncio
+    import tempfile
+
+    received = []
+    sessions = []
+
+    async def handle(reader, writer):
+        sessions.append(1)
+        writer.write(b"220 localhost ESMTP\r\n")
+        rcpts = []
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            cmd = line.decode().strip().upper()
+            if cmd.startswith("EHLO") or cmd.startswith("HELO"):
+                writer.write(b"250 localhost\r\n")
+            elif cmd.startswith("RCPT"):
+                rcpt = line.decode().split(":", 1)[1].strip().strip("<>")
+                rcpts.append(rcpt)
+                writer.write(b"450 mailbox busy\r\n" if rcpt.startswith("busy") else b"250 OK\r\n")
+            elif cmd == "DATA":
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                while (await reader.readline()) != b".\r\n":
+                    pass
+                received.append([r for r in rcpts if not r.startswith("busy")])
+                rcpts = []
+                writer.write(b"250 OK\r\n")
+            elif cmd == "QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:  # MAIL / RSET / NOOP
+                rcpts = [] if cmd.startswith(("MAIL", "RSET")) else rcpts
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    RETRY_INITIAL = 0.5
+
+    async def main():
+        spool = tempfile.mkdtemp()
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+
+        mailer = Mailer({"host": "127.0.0.1", "port": port, "from": "monitor@localhost"}, spool, use_ssl=False)
+        mailer.start()
+        recipients = [f"user{i}@example.com" for i in range(120)] + ["busy@example.com"]
+        start = time.perf_counter()
+        mailer.submit(build_message("test", "monitor@localhost", "<b>hello</b>"), recipients)
+        print(f"submit: {(time.perf_counter() - start) * 1000:.1f} ms", mailer.status())
+        await asyncio.sleep(0.3)
+        print("server down:", mailer.status())
+
+        server = await asyncio.start_server(handle, "127.0.0.1", port)
+        await asyncio.sleep(1.5)
+        print("server up:  ", mailer.status(), "messages:", [len(r) for r in received], "sessions:", len(sessions))
+        await asyncio.to_thread(mailer.stop)
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(main())
@@ -8,6 +8,8 @@ Description : Add your script's purpose here.
 """
 import matplotlib.pyplot as plt
 import os
+import time
+from datetime import datetime
 
 
 def bytes_to_mb(bytes_val):
@@ -79,26 +81,73 @@ def generate_disk_chart(disk_data, output_path="disk_chart.png"):
 
 def generate_network_chart(network_data, output_path="network_chart.png"):
     """
-    Generate a line chart for total network bytes sent and received (MB).
-    :param network_data: dict with key 'total' containing 'bytes_sent' and 'bytes_recv'
-                         (raw bytes)
+    Generate a bar chart for current network throughput (KB/s).
+    :param network_data: dict with key 'rates' -> 'total' containing 'bytes_sent_per_sec'
+                         and 'bytes_recv_per_sec'; falls back to the cumulative 'total'
+                         counters (MB since boot) when no rate is available yet
     :param output_path: file path to save the chart image
     """
-    sent_mb = bytes_to_mb(network_data["total"]["bytes_sent"])
-    recv_mb = bytes_to_mb(network_data["total"]["bytes_recv"])
+    rates = network_data.get("rates", {}).get("total", {})
     labels = ["Sent", "Received"]
-    values = [sent_mb, recv_mb]
+    if rates:
+        values = [rates["bytes_sent_per_sec"] / 1024, rates["bytes_recv_per_sec"] / 1024]
+        ylabel, title = "Throughput (KB/s)", "Network Throughput (KB/s)"
+    else:
+        values = [bytes_to_mb(network_data["total"]["bytes_sent"]), bytes_to_mb(network_data["total"]["bytes_recv"])]
+        ylabel, title = "Data (MB)", "Network Traffic Since Boot (MB)"
 
     plt.figure()
     plt.bar(labels, values)
     plt.xlabel("Type")
-    plt.ylabel("Data (MB)")
-    plt.title("Network Throughput Total (MB)")
+    plt.ylabel(ylabel)
+    plt.title(title)
     plt.tight_layout()
     plt.savefig(output_path)
     plt.close()
 
 
+def generate_trend_chart(series, output_path, title, ylabel="Usage (%)"):
+    """
+    Generate a line chart for metric history.
+    :param series: dict mapping label to (timestamps, values) sequences,
+                   e.g. the arrays returned by TimeSeriesStore.query
+    :param output_path: file path to save the chart image
+    """
+    plt.figure(figsize=(8, 4))
+    for label, (timestamps, values) in series.items():
+        if len(timestamps):
+            plt.plot([datetime.fromtimestamp(t) for t in timestamps], values, label=label)
+    plt.xlabel("Time")
+    plt.ylabel(ylabel)
+    plt.title(title)
+    plt.legend()
+    plt.gcf().autofmt_xdate()
+    plt.tight_layout()
+    plt.savefig(output_path)
+    plt.close()
+
+
+def generate_history_charts(store, output_path, days=7):
+    """
+    Generate CPU / memory trend charts from a TimeSeriesStore for the last `days` days.
+    Returns an empty dict when there is no history yet.
+    """
+    start = time.time() - days * 86400
+    cpu_series = store.query("cpu.cpu_percent_overall", start)
+    memory_series = store.query("cpu.memory_percent", start)
+    if not len(cpu_series[0]) and not len(memory_series[0]):
+        return {}
+
+    os.makedirs(output_path, exist_ok=True)
+    trend_path = os.path.join(output_path, "usage_trend_chart.png")
+    generate_trend_chart(
+        {"CPU": cpu_series, "Memory": memory_series},
+        trend_path,
+        title=f"CPU / Memory Usage Trend (last {days} days)",
+    )
+    return {"usage_trend_chart": trend_path}
+
+
 def generate_all_chart(data, output_path):
     os.makedirs(output_path, exist_ok=True)
 
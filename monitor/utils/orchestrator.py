@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : orchestrator.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 采集编排：各采集器在有界线程池中并发执行、各自有截止时间，
+              超时的采集器返回上一次的结果并标记为过期，记录每个采集器的耗时。
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("monitor.orchestrator")
+
+# 单个采集器的默认截止时间（秒）
+DEFAULT_TIMEOUT = 2.0
+# 线程池大小上限
+MAX_WORKERS = 8
+
+
+class _Pool:
+    """
+    有界的守护线程池：卡死在内核中的采集调用（如挂起的 NFS 上的 statvfs）无法被取消，
+    用守护线程保证它不会阻止进程退出。线程在第一次提交任务时才启动。
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _worker(self) -> None:
+        while True:
+            func, future = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func())
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, func: Callable[[], Any]) -> Future:
+        with self._lock:
+            if len(self._threads) < self.size:
+                thread = threading.Thread(target=self._worker, name=f"collector-{len(self._threads)}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        future: Future = Future()
+        self._queue.put((func, future))
+        return future
+
+
+class _State:
+    """单个采集器的运行状态与最近一次成功的结果"""
+
+    def __init__(self, func: Callable[[], Dict[str, Any]], timeout: float):
+        self.func = func
+        self.timeout = timeout
+        self.future: Optional[Future] = None
+        self.started = 0.0
+        self.value: Optional[Dict[str, Any]] = None
+        self.updated = 0.0  # value 产生时的 time.time()
+        self.latency: Optional[float] = None  # 最近一次完成的耗时（秒）
+
+
+class CollectorOrchestrator:
+    """
+    并发执行一组采集器：
+    - 每轮同时提交所有采集器，总耗时取决于最慢（或最先超时）的那个，而不是各自耗时之和；
+    - 超过截止时间的采集器返回上一次的结果，并在 'collectors' 元信息中标记 stale；
+    - 上一轮仍未结束的采集器不重复提交，卡死的调用最多占用一个线程。
+    返回格式：{名称: 采集结果, ..., 'collectors': {名称: {'latency', 'status', 'stale', 'age'}}}
+    """
+
+    def __init__(self, collectors: Dict[str, Callable[[], Dict[str, Any]]],
+                 timeouts: Optional[Dict[str, float]] = None, default_timeout: float = DEFAULT_TIMEOUT):
+        timeouts = timeouts or {}
+        self._states = {name: _State(func, timeouts.get(name, default_timeout)) for name, func in collectors.items()}
+        self._pool = _Pool(min(MAX_WORKERS, max(1, len(collectors))))
+
+    def _run(self, state: _State) -> Dict[str, Any]:
+        value = state.func()
+        # 超时后才完成的结果同样保存，下一轮超时时返回的就是它
+        state.value = value
+        state.updated = time.time()
+        state.latency = time.monotonic() - state.started
+        return value
+
+    def collect(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        # age 以本轮开始时刻为基准：本轮产生的结果为 0，沿用的旧结果为其产生至今的时间
+        round_start = time.time()
+        for state in self._states.values():
+            if state.future is None or state.future.done():
+                state.started = now
+                state.future = self._pool.submit(lambda s=state: self._run(s))
+
+        result: Dict[str, Any] = {}
+        meta: Dict[str, Dict[str, Any]] = {}
+        for name, state in self._states.items():
+            remaining = state.started + state.timeout - time.monotonic()
+            status = "ok"
+            try:
+                value = state.future.result(timeout=max(0.0, remaining))
+            except FutureTimeout:
+                status = "timeout"
+            except Exception as e:
+                status = "error"
+                logger.error(f"采集器 {name} 执行失败: {e}")
+            if status == "ok":
+                result[name] = value
+                stale = False
+            elif state.value is not None:
+                result[name] = state.value
+                stale = True
+            else:
+                result[name] = {"error": f"{name} collector {status}"}
+                stale = True
+            meta[name] = {
+                # 超时的采集器记录已耗费的时间，便于看出卡了多久
+                "latency": round(state.latency if status == "ok" else time.monotonic() - state.started, 4),
+                "status": status,
+                "stale": stale,
+                "age": round(max(0.0, round_start - state.updated), 3) if state.value is not None else None,
+            }
+            if status == "timeout":
+                logger.warning(f"采集器 {name} 超过 {state.timeout}s 未返回，使用上一次的结果")
+        result["collectors"] = meta
+        return result
+
+
+if __name__ == "__main__":
+    # 示例：一个卡住 10 秒的采集器不拖慢其余采集器，也不拖慢下一轮
+    def fast():
+        return {"value": 1}
+
+    def hang():
+        time.sleep(10)
+        return {"value": 2}
+
+    orchestrator = CollectorOrchestrator({"fast": fast, "hang": hang}, timeouts={"hang": 0.5})
+    for _ in range(3):
+        start = time.perf_counter()
+        data = orchestrator.collect()
+        print(f"{time.perf_counter() - start:.3f}s", data)
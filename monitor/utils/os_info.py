@@ -1,19 +1,99 @@
 from monitor.collector.cpu import CPUCollector
 from monitor.collector.disk import DiskCollector
 from monitor.collector.network import NetworkCollector
+from monitor.collector.net_accounting import accounting
+from monitor.collector.conntrack import tracker
+from monitor.utils.alerting import engine as alert_engine
+from monitor.utils.anomaly import AnomalyDetector
+from monitor.utils.orchestrator import CollectorOrchestrator
+from monitor.utils.sampler import SAMPLE_INTERVAL, Sampler
+from monitor.utils.tsdb import TimeSeriesStore
+from monitor.utils.window import WindowStore
 
 # 初始化收集器实例
 cpu = CPUCollector()
 disk = DiskCollector()
 net = NetworkCollector()
 
+# 三个采集器并发执行；CPU 采集本身要 sleep 0.5 秒，其余超时即使用上一次的结果
+orchestrator = CollectorOrchestrator(
+    {"cpu": cpu.collect, "disk": disk.collect, "network": net.collect},
+    timeouts={"cpu": 2.0, "disk": 2.0, "network": 1.0},
+)
+
 
 def get_os_info():
-    return {
-        "cpu": cpu.collect(),
-        "disk": disk.collect(),
-        "network": net.collect(),
-    }
+    """
+    并发采集一次全部指标，单个采集器超时不影响其余部分。
+    返回格式：{'cpu', 'disk', 'network', 'collectors': {名称: {'latency', 'status', 'stale', 'age'}}}
+    """
+    return orchestrator.collect()
+
+
+def flatten_metrics(data, prefix: str = "") -> dict:
+    """
+    将嵌套的监控数据展开为 {点分路径: 数值}，列表按下标展开，忽略非数值字段。
+    例如 {'cpu': {'cpu_percent_per_core': [1.0]}} -> {'cpu.cpu_percent_per_core.0': 1.0}
+    """
+    result = {}
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, (list, tuple)):
+        items = enumerate(data)
+    else:
+        return result
+    for key, value in items:
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            result[name] = value
+        else:
+            result.update(flatten_metrics(value, name))
+    return result
+
+
+# 全局后台采样器，由 FastAPI lifespan 启动
+sampler = Sampler(get_os_info)
+
+# 历史指标存储、滑动窗口聚合与异常检测，采样结果在采集线程中写入
+history = TimeSeriesStore(interval=SAMPLE_INTERVAL)
+windows = WindowStore(interval=SAMPLE_INTERVAL)
+anomaly = AnomalyDetector(interval=SAMPLE_INTERVAL)
+
+# 每个快照只展开一次：线程内回调先于事件循环回调执行，告警评估直接复用
+_flat = {"timestamp": None, "metrics": {}}
+
+
+def _flatten_once(data, ts) -> dict:
+    if _flat["timestamp"] != ts:
+        _flat["metrics"] = flatten_metrics(data)
+        _flat["timestamp"] = ts
+    return _flat["metrics"]
+
+
+def _store(data, ts):
+    metrics = _flatten_once(data, ts)
+    history.append_many(metrics, ts)
+    windows.update(metrics, ts)
+    # 异常分数随快照一起发布（/metrics 的 'anomaly' 字段），不写入历史
+    data["anomaly"] = anomaly.update(metrics, ts)
+
+
+sampler.subscribe(_store, in_thread=True)
+
+# 进程级网络流量统计与连接表随采样周期刷新，接口请求时只读取缓存结果
+sampler.subscribe(lambda data, ts: accounting.refresh(), in_thread=True)
+sampler.subscribe(lambda data, ts: tracker.refresh(), in_thread=True)
+
+
+# 告警规则在事件循环中逐个快照增量评估，触发的通知（如发邮件）作为任务调度
+def _alert(data, ts):
+    scores = {name: result["score"] for name, result in data.get("anomaly", {}).items()}
+    alert_engine.feed(_flatten_once(data, ts), data, ts, scores)
+
+
+sampler.subscribe(_alert)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : sampler.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 后台采样器，周期性采集监控数据并保存为共享快照，接口直接读取快照而不阻塞事件循环。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("monitor.sampler")
+
+# 默认采样周期（秒）
+SAMPLE_INTERVAL = 5.0
+
+
+class Sampler:
+    """
+    后台采样器：
+    在线程池中周期性执行采集函数（CPUCollector.collect 内部会 sleep），
+    结果作为共享快照保存，/metrics、告警与邮件直接读取最新快照。
+    """
+
+    def __init__(self, collect: Callable[[], Dict[str, Any]], interval: float = SAMPLE_INTERVAL):
+        self.collect = collect
+        self.interval = interval
+        self.generation = 0  # 每产生一次新快照加 1，可用于下游缓存失效
+        self._data: Optional[Dict[str, Any]] = None
+        self._timestamp: float = 0.0
+        self._listeners: List[Callable[[Dict[str, Any], float], None]] = []
+        self._thread_listeners: List[Callable[[Dict[str, Any], float], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    # -------- 订阅 --------
+    def subscribe(self, callback: Callable[[Dict[str, Any], float], None], in_thread: bool = False) -> None:
+        """
+        注册回调，每次产生新快照后以 (data, timestamp) 调用。
+        in_thread=True 的回调在采集线程中执行，适合写磁盘等耗时操作；否则在事件循环中执行。
+        """
+        (self._thread_listeners if in_thread else self._listeners).append(callback)
+
+    @staticmethod
+    def _notify(listeners, data: Dict[str, Any], timestamp: float) -> None:
+        for callback in listeners:
+            try:
+                callback(data, timestamp)
+            except Exception as e:
+                logger.error(f"采样回调执行失败: {e}")
+
+    def _sample(self):
+        """执行一次采集（在采集线程中运行），并调用线程内回调"""
+        data = self.collect()
+        timestamp = time.time()
+        self._notify(self._thread_listeners, data, timestamp)
+        return data, timestamp
+
+    def _publish(self, data: Dict[str, Any], timestamp: float) -> None:
+        self._data = data
+        self._timestamp = timestamp
+        self.generation += 1
+        self._ready.set()
+        self._notify(self._listeners, data, timestamp)
+
+    # -------- 生命周期 --------
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self._publish(*await asyncio.to_thread(self._sample))
+            except Exception as e:
+                logger.error(f"采样失败: {e}")
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, self.interval - elapsed))
+
+    def start(self) -> asyncio.Task:
+        """在当前事件循环中启动采样任务（在 lifespan 中调用）"""
+        if self._task is None or self._task.done():
+            self._ready = asyncio.Event()
+            if self._data is not None:
+                self._ready.set()
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    # -------- 读取快照 --------
+    def age(self) -> float:
+        """当前快照距今的秒数"""
+        return time.time() - self._timestamp
+
+    def latest(self) -> Dict[str, Any]:
+        """
+        返回最新快照数据（同步调用）。
+        尚无快照，或后台任务未运行且快照已过期时，就地采集一次。
+        """
+        if self._data is None or (not self.running and self.age() > self.interval):
+            self._publish(*self._sample())
+        return self._data
+
+    async def snapshot(self) -> Dict[str, Any]:
+        """
+        返回最新快照及其元信息，首个快照就绪前会等待。
+        返回格式：{**data, 'timestamp': 采样时间戳, 'snapshot_age': 快照年龄（秒）}
+        """
+        if self.running:
+            await self._ready.wait()
+        elif self._data is None or self.age() > self.interval:
+            self._publish(*await asyncio.to_thread(self._sample))
+        return {
+            **self._data,
+            "timestamp": self._timestamp,
+            "snapshot_age": round(self.age(), 3),
+        }
@@ -1,11 +1,11 @@
-import os
+import asyncio
 from hashlib import sha256
-from jinja2 import Template
 import time
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 from typing import List, Dict, Optional
-from monitor.utils.make_chart import generate_all_chart
-from monitor.utils.os_info import get_os_info
+from monitor.utils.mailer import Mailer, build_message
+from monitor.utils.templating import TemplateRenderer
+from monitor.utils.make_chart import generate_all_chart, generate_history_charts
+from monitor.utils.os_info import sampler, history
 import logging
 
 # 邮件配置
@@ -63,22 +63,11 @@ def get_default_config():
 # 配置日志
 logger = logging.getLogger("monitor.mail")
 
-# 配置邮件连接
-conf = ConnectionConfig(
-    MAIL_USERNAME=EMAIL_CONFIG.get("username"),
-    MAIL_PASSWORD=EMAIL_CONFIG.get("password"),
-    MAIL_FROM=EMAIL_CONFIG.get("from"),
-    MAIL_PORT=EMAIL_CONFIG.get("port"),
-    MAIL_SERVER=EMAIL_CONFIG.get("host"),
-    # 关闭 STARTTLS，启用 SSL/TLS
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True
-)
+# 邮件先写入本地队列，由后台线程经 SSL（465 端口）复用会话发送，FastAPI lifespan 启动/停止
+mailer = Mailer(EMAIL_CONFIG, use_ssl=True)
 
-# 初始化 FastMail 实例
-fm = FastMail(conf)
+# 邮件模板在内存中缓存，FastAPI lifespan 启动时预编译
+templates = TemplateRenderer(TEMPLATE_HTML_PATH)
 
 
 async def send_report_email(
@@ -88,44 +77,29 @@ async def send_report_email(
         attachments: Optional[List[str]] = None,
         inline_images: Optional[Dict[str, str]] = None
 ) -> bool:
-    attach_objs = []
-
-    # 处理普通附件
-    if attachments:
-        for file_path in attachments:
-            attach_objs.append({"file": file_path})
-
-    # 处理内联图片
-    if inline_images:
-        for cid, img_path in inline_images.items():
-            attach_objs.append({
-                "file": img_path,
-                "filename": os.path.basename(img_path),
-                "content_id": cid,
-                "disposition": "inline"
-            })
-
+    """
+    邮件写入发送队列后立即返回，不等待 SMTP 连接与发送；发送失败由队列按退避重试。
+    返回是否成功入队。
+    """
     try:
-        message = MessageSchema(
-            subject=subject,
-            recipients=recipients,
-            body=body_html,
-            subtype="html",
-            attachments=attach_objs,
-        )
-
-        await fm.send_message(message)
-        logger.info(f"邮件发送成功: {subject} -> {recipients}")
+        message = build_message(subject, EMAIL_CONFIG["from"], body_html, attachments, inline_images)
+        await asyncio.to_thread(mailer.submit, message, recipients)
+        logger.info(f"邮件已加入发送队列: {subject} -> {recipients}")
         return True
     except Exception as e:
-        logger.error(f"邮件发送失败: {e}\n主题: {subject}\n收件人: {recipients}")
+        logger.error(f"邮件入队失败: {e}\n主题: {subject}\n收件人: {recipients}")
         return False
 
 
 async def send_alert_email(
         recipients: List[str],
+        alerts: Optional[List[Dict]] = None,
 ):
-    data = get_os_info()
+    """
+    发送告警邮件。alerts 为告警引擎给出的同一批告警，邮件内容取自触发告警的那次采样；
+    未提供时使用最新快照。
+    """
+    data = alerts[0]["sample"] if alerts else sampler.latest()
     context = {
         "cpu_usage": data["cpu"]["cpu_percent_overall"],
         "cpu_threshold": USE_THRESHOLD.get("cpu", "N/A"),
@@ -140,13 +114,15 @@ async def send_alert_email(
             for part, info in data["disk"].items()
             if isinstance(info, dict) and info.get("percent", 0) >= USE_THRESHOLD.get("disk", "N/A")
         ],
+        "alerts": [
+            {**alert, "since": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(alert["since"]))}
+            for alert in alerts or []
+        ],
         "report_time": time.strftime("%Y-%m-%d %H:%M:%S")
     }
 
     subject = "系统警告报告 - " + context["report_time"]
-    with open(os.path.join(TEMPLATE_HTML_PATH, "alert.html"), "r", encoding="utf-8") as f:
-        tpl = Template(f.read())
-    body_html = tpl.render(**context)
+    body_html = templates.render("alert.html", **context)
     await send_report_email(subject, recipients, body_html)
 
 
@@ -154,12 +130,13 @@ async def send_info_email(
         recipients: List[str],
 ):
     subject = "系统信息报告 - " + time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    data = get_os_info()
+    # 快照为共享数据，裁剪前先复制
+    data = dict(sampler.latest())
+    data["cpu"] = dict(data["cpu"])
     data["cpu"]["cpu_percent_per_core"] = data["cpu"]["cpu_percent_per_core"][:9]
     charts = generate_all_chart(data, CHART_OUTPUT_PATH)
-    with open(os.path.join(TEMPLATE_HTML_PATH, "info.html"), "r", encoding="utf-8") as f:
-        tpl = Template(f.read())
-    body_html = tpl.render(**data)
+    charts.update(generate_history_charts(history, CHART_OUTPUT_PATH))
+    body_html = templates.render("info.html", **data)
     await send_report_email(subject, recipients, body_html, inline_images=charts)
 
 
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : templating.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 邮件模板渲染：共享的 Jinja Environment 在内存中缓存编译后的模板，并把字节码缓存到磁盘，
+              模板文件修改（mtime 变化）后自动重新加载。启动时预编译，发信时直接从内存渲染。
+"""
+import logging
+import os
+import time
+from typing import Dict, Iterable
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateError
+
+logger = logging.getLogger("monitor.templating")
+
+# 模板字节码缓存目录：重启后无需重新解析模板
+BYTECODE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sys-monitor", "jinja")
+# 启动时预编译的邮件模板
+EMAIL_TEMPLATES = ("alert.html", "info.html")
+# 内存中缓存的已编译模板数
+CACHE_SIZE = 64
+
+
+class TemplateRenderer:
+    """
+    按文件名渲染模板目录中的模板。
+    get_template 命中内存缓存时只检查一次文件 mtime（auto_reload），未变化则不读文件、不重新编译。
+    """
+
+    def __init__(self, path: str, cache_dir: str = BYTECODE_CACHE_DIR):
+        self.path = path
+        os.makedirs(cache_dir, exist_ok=True)
+        self.env = Environment(
+            loader=FileSystemLoader(path),
+            bytecode_cache=FileSystemBytecodeCache(cache_dir),
+            auto_reload=True,
+            cache_size=CACHE_SIZE,
+        )
+
+    def precompile(self, names: Iterable[str] = EMAIL_TEMPLATES) -> Dict[str, float]:
+        """
+        预先加载并编译模板，返回 {模板名: 耗时（秒）}。
+        模板缺失或有语法错误时只记录日志，不影响启动，发信时会再次报错。
+        """
+        timings = {}
+        for name in names:
+            start = time.perf_counter()
+            try:
+                self.env.get_template(name)
+            except TemplateError as e:
+                logger.error(f"模板 {name} 预编译失败: {e}")
+                continue
+            timings[name] = time.perf_counter() - start
+        logger.info(f"已预编译模板: {', '.join(timings) or '无'}")
+        return timings
+
+    def render(self, name: str, **context) -> str:
+        return self.env.get_template(name).render(**context)
+
+
+if __name__ == "__main__":
+    # 基准：与每次读文件并 jinja2.Template(f.read()) 的旧做法比较告警邮件的渲染耗时，
+    # 以及冷启动时有无字节码缓存的预编译耗时
+    import shutil
+    import tempfile
+
+    from jinja2 import Template
+
+    template_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "templates")
+    context = {
+        "cpu_usage": 97.3, "cpu_threshold": 90, "mem_usage": 71.2, "mem_threshold": 90,
+        "disk_alerts": [{"partition": "/", "percent": 96.1, "threshold": 95}],
+        "alerts": [{"rule": "cpu_high", "metric": "cpu.cpu_percent_overall", "value": 97.3, "op": ">",
+                    "threshold": 90.0, "since": "2026-10-17 15:30:00"}] * 5,
+        "report_time": "2026-10-17 15:31:00",
+    }
+    n = 2000
+
+    start = time.perf_counter()
+    for _ in range(n):
+        with open(os.path.join(template_dir, "alert.html"), "r", encoding="utf-8") as f:
+            old = Template(f.read()).render(**context)
+    per_old = (time.perf_counter() - start) / n
+
+    cache_dir = tempfile.mkdtemp()
+    renderer = TemplateRenderer(template_dir, cache_dir)
+    cold = renderer.precompile()
+    start = time.perf_counter()
+    for _ in range(n):
+        new = renderer.render("alert.html", **context)
+    per_new = (time.perf_counter() - start) / n
+    assert old == new
+
+    warm = TemplateRenderer(template_dir, cache_dir).precompile()
+    print(f"render alert.html: {per_old * 1e3:.3f} ms -> {per_new * 1e3:.3f} ms ({per_old / per_new:.0f}x)")
+    for name in cold:
+        print(f"precompile {name}: {cold[name] * 1e3:.2f} ms cold, {warm.get(name, 0) * 1e3:.2f} ms from bytecode cache")
+    shutil.rmtree(cache_dir)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : tsdb.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 嵌入式时序存储，按指标追加写入定宽列文件，自动降采样（raw/1m/1h）并按保留期清理。
+"""
+import bisect
+import fnmatch
+import logging
+import mmap
+import os
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, unquote
+
+logger = logging.getLogger("monitor.tsdb")
+
+# 历史数据目录
+HISTORY_DIR = os.path.join(os.path.expanduser("~"), ".cache", "sys-monitor", "history")
+
+# 写入历史的指标（flatten_metrics 展开后的点分路径，可用通配符）。
+# 只保存总体指标；每核、每网卡、每块磁盘的明细与采集器元信息不写入历史
+HISTORY_METRICS = (
+    "cpu.cpu_percent_overall",
+    "cpu.memory_percent",
+    "cpu.memory_used",
+    "cpu.swap_percent",
+    "disk.*.percent",
+    "disk.io.*",
+    "disk.io_rate.*",
+    "network.total.*",
+    "network.rates.total.*",
+)
+
+# 降采样层级：(名称, 步长秒, 保留秒)。raw 层原样保存每个采样点，容量按采样周期计算
+TIERS = [
+    ("raw", 1, 2 * 86400),
+    ("1m", 60, 30 * 86400),
+    ("1h", 3600, 365 * 86400),
+]
+
+# 文件记录数超过保留期容量的比例后触发一次压缩
+COMPACT_SLACK = 1.25
+# 常驻打开的列文件描述符数上限（只有 raw 层常驻，每个 _Series 两个），且不超过进程 RLIMIT_NOFILE 的 1/8，
+# 其余描述符留给 HTTP 连接、SQLite、inotify 等
+MAX_OPEN_FILES = 256
+
+_TS_CODE = "q"  # 时间戳列：int64 秒
+_VAL_CODE = "d"  # 数值列：float64
+
+
+class _Series:
+    """单个指标在单个层级上的一对列文件"""
+
+    def __init__(self, base: str, step: int, retention: int, interval: float = 1.0):
+        self.ts_path = base + ".t"
+        self.val_path = base + ".v"
+        self.step = step
+        self.retention = retention
+        # 按文件名加一点抖动，避免所有指标在同一时刻触发压缩；
+        # 保留期内的点数取决于步长与采样周期中较大的一个（raw 层每个采样周期一个点）
+        jitter = (zlib.crc32(base.encode()) % 100) / 400
+        self.capacity = int(retention / max(step, interval) * (COMPACT_SLACK + jitter)) + 1
+        # 只有每个采样周期都写入的 raw 层常驻打开；降采样层每个桶才写一次，用完即关闭
+        self.keep_open = step <= interval
+        self._ft: Optional[int] = None
+        self._fv: Optional[int] = None
+        self.count = self._recover()
+        # 当前未完成的降采样桶：[桶起点, 累加和, 个数]
+        self.bucket: Optional[List[float]] = None
+
+    def _recover(self) -> int:
+        """两列长度不一致（写入中途退出）时截断到较短的一列"""
+        sizes = [os.path.getsize(p) // 8 if os.path.exists(p) else 0 for p in (self.ts_path, self.val_path)]
+        count = min(sizes)
+        if sizes[0] != sizes[1]:
+            for path in (self.ts_path, self.val_path):
+                with open(path, "ab") as f:
+                    f.truncate(count * 8)
+        return count
+
+    # -------- 文件描述符（常驻打开，由 TimeSeriesStore 按 LRU 关闭） --------
+    def _open(self) -> None:
+        if self._ft is None:
+            flags = os.O_RDWR | os.O_APPEND | os.O_CREAT
+            self._ft = os.open(self.ts_path, flags, 0o644)
+            try:
+                self._fv = os.open(self.val_path, flags, 0o644)
+            except OSError:
+                os.close(self._ft)
+                self._ft = None
+                raise
+
+    def close_files(self) -> None:
+        for fd in (self._ft, self._fv):
+            if fd is not None:
+                os.close(fd)
+        self._ft = self._fv = None
+
+    def append(self, ts: int, value: float) -> None:
+        self._open()
+        os.write(self._ft, array(_TS_CODE, [ts]).tobytes())
+        os.write(self._fv, array(_VAL_CODE, [value]).tobytes())
+        self.count += 1
+        if self.count > self.capacity:
+            self.compact(ts)
+        elif not self.keep_open:
+            self.close_files()
+
+    def add(self, ts: float, value: float) -> None:
+        """写入一个采样点：raw 层直接追加，其余层累计到桶，跨桶时写入上一桶的均值"""
+        if self.step <= 1:
+            self.append(int(ts), value)
+            return
+        start = int(ts) // self.step * self.step
+        if self.bucket is not None and self.bucket[0] != start:
+            self.flush()
+        if self.bucket is None:
+            self.bucket = [start, 0.0, 0]
+        self.bucket[1] += value
+        self.bucket[2] += 1
+
+    def flush(self) -> None:
+        if self.bucket is not None and self.bucket[2]:
+            self.append(int(self.bucket[0]), self.bucket[1] / self.bucket[2])
+        self.bucket = None
+
+    def compact(self, now: int) -> None:
+        """丢弃超出保留期的记录（重写文件）"""
+        ts, vals = self.read(now - self.retention, None)
+        for path, arr in ((self.ts_path, ts), (self.val_path, vals)):
+            tmp = path + ".tmp"
+            with open(tmp, "wb") as f:
+                arr.tofile(f)
+            os.replace(tmp, path)
+        # 旧描述符指向已被替换的文件，下次写入时重新打开
+        self.close_files()
+        self.count = len(ts)
+
+    def read(self, start: Optional[float], end: Optional[float]) -> Tuple[array, array]:
+        """
+        通过 mmap 二分定位 [start, end] 区间，只把命中的切片复制为 array，
+        不会把整个文件读成 Python 对象。
+        """
+        ts_out, val_out = array(_TS_CODE), array(_VAL_CODE)
+        if not self.count:
+            return ts_out, val_out
+        self._open()
+        try:
+            self._read_into(ts_out, val_out, start, end)
+        finally:
+            if not self.keep_open:
+                self.close_files()
+        return ts_out, val_out
+
+    def _read_into(self, ts_out: array, val_out: array, start: Optional[float], end: Optional[float]) -> None:
+        n = min(os.fstat(self._ft).st_size // 8, os.fstat(self._fv).st_size // 8)
+        if not n:
+            return
+        with mmap.mmap(self._ft, n * 8, access=mmap.ACCESS_READ) as mt, \
+                mmap.mmap(self._fv, n * 8, access=mmap.ACCESS_READ) as mv:
+            tview = memoryview(mt).cast(_TS_CODE)
+            vview = memoryview(mv).cast(_VAL_CODE)
+            try:
+                lo = 0 if start is None else bisect.bisect_left(tview, int(start))
+                hi = n if end is None else bisect.bisect_right(tview, int(end))
+                if lo < hi:
+                    ts_out.frombytes(tview[lo:hi].tobytes())
+                    val_out.frombytes(vview[lo:hi].tobytes())
+            finally:
+                tview.release()
+                vview.release()
+
+
+class TimeSeriesStore:
+    """
+    时序存储：
+    每个指标每个层级两个定宽列文件（<name>.<tier>.t 为时间戳，.v 为数值），只追加写入。
+    查询时按时间范围自动选择满足保留期的最细层级。
+    只保存与 metrics 匹配的指标；raw 层的描述符常驻打开，超过上限时关闭最久未使用的。
+    interval 为采样周期（秒），用于计算 raw 层在保留期内的容量。
+    """
+
+    def __init__(self, root: str = HISTORY_DIR, tiers=None, interval: float = 1.0,
+                 metrics: Iterable[str] = HISTORY_METRICS):
+        self.root = root
+        self.tiers = tiers or TIERS
+        self.interval = interval
+        self.patterns = tuple(metrics)
+        self._kept: Dict[str, bool] = {}  # 指标名 -> 是否写入历史，首次出现时计算
+        self._series: Dict[Tuple[str, str], _Series] = {}
+        self._open: "OrderedDict[Tuple[str, str], _Series]" = OrderedDict()
+        self._max_open = self._open_budget()
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def _open_budget() -> int:
+        """常驻打开的 _Series 数：MAX_OPEN_FILES 与 RLIMIT_NOFILE 的 1/8 中较小者，每个 _Series 两个描述符"""
+        limit = MAX_OPEN_FILES
+        try:
+            import resource
+            soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if soft != resource.RLIM_INFINITY:
+                limit = min(limit, soft // 8)
+        except (ImportError, OSError, ValueError):
+            limit = min(limit, 128)
+        return max(4, limit // 2)
+
+    def _keep(self, name: str) -> bool:
+        if name not in self._kept:
+            self._kept[name] = any(fnmatch.fnmatchcase(name, p) for p in self.patterns)
+        return self._kept[name]
+
+    def _get(self, name: str, tier: str) -> _Series:
+        key = (name, tier)
+        series = self._series.get(key)
+        if series is None:
+            _, step, retention = next(t for t in self.tiers if t[0] == tier)
+            base = os.path.join(self.root, f"{quote(name, safe='')}.{tier}")
+            series = self._series[key] = _Series(base, step, retention, self.interval)
+        if not series.keep_open:
+            return series
+        # 调用方随后会读写文件：记为最近使用，超出上限时关闭最久未用的描述符
+        self._open[key] = series
+        self._open.move_to_end(key)
+        while len(self._open) > self._max_open:
+            _, old = self._open.popitem(last=False)
+            old.close_files()
+        return series
+
+    def append(self, name: str, value: float, ts: Optional[float] = None) -> None:
+        self.append_many({name: value}, ts)
+
+    def append_many(self, values: Dict[str, float], ts: Optional[float] = None) -> None:
+        """写入同一时刻的一组指标"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for name, value in values.items():
+                if not self._keep(name):
+                    continue
+                for tier, _, _ in self.tiers:
+                    try:
+                        self._get(name, tier).add(ts, float(value))
+                    except OSError as e:
+                        logger.error(f"写入 {name}.{tier} 失败: {e}")
+
+    def metrics(self) -> List[str]:
+        """返回已保存的指标名"""
+        raw = self.tiers[0][0]
+        suffix = f".{raw}.t"
+        return sorted(unquote(f[:-len(suffix)]) for f in os.listdir(self.root) if f.endswith(suffix))
+
+    def pick_tier(self, start: float) -> str:
+        """选择保留期能覆盖 start 的最细层级"""
+        age = time.time() - start
+        for tier, _, retention in self.tiers:
+            if age <= retention:
+                return tier
+        return self.tiers[-1][0]
+
+    def query(
+            self,
+            name: str,
+            start: float,
+            end: Optional[float] = None,
+            tier: Optional[str] = None,
+    ) -> Tuple[array, array]:
+        """
+        查询 [start, end] 内的数据，返回 (时间戳 array('q'), 数值 array('d'))。
+        tier 为空时自动选择层级。
+        """
+        tier = tier or self.pick_tier(start)
+        with self._lock:
+            series = self._get(name, tier)
+            return series.read(start, end)
+
+    def close(self) -> None:
+        """把未完成的降采样桶写盘并关闭所有列文件"""
+        with self._lock:
+            for series in self._series.values():
+                series.flush()
+                series.close_files()
+            self._open.clear()
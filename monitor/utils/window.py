@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+File Name   : window.py
+Author      : wzw
+Date Created: 2026/10/17
+Description : 滑动窗口聚合：每个指标一个定长环形缓冲区，按配置的窗口增量维护均值/最大/最小值
+              （单调队列，均摊 O(1)），分位数在查询时对窗口内的点求精确值，
+              需要频繁查询分位数时可增量维护窗口内的有序列表（bisect）。内存上限固定。
+"""
+import bisect
+import re
+import threading
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+# 默认维护的窗口（秒）
+DEFAULT_WINDOWS = {"1m": 60.0, "5m": 300.0, "15m": 900.0}
+# 环形缓冲区的最小/最大容量（点数）
+MIN_CAPACITY = 16
+MAX_CAPACITY = 4096
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_window(text: str) -> float:
+    """'90' / '30s' / '5m' / '1h' -> 秒数"""
+    m = _DURATION.match(str(text).lower())
+    if not m or float(m.group(1)) <= 0:
+        raise ValueError(f"invalid window: {text!r}")
+    return float(m.group(1)) * _UNITS[m.group(2)]
+
+
+def quantile(sorted_values: List[float], q: float) -> Optional[float]:
+    """已排序序列的分位数（线性插值）"""
+    if not sorted_values:
+        return None
+    pos = q * (len(sorted_values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class _Ring:
+    """
+    定长环形缓冲区，点按序号（单调递增）寻址；未写满前按需增长。
+    时间戳单调不减，可二分查找窗口起点。
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = array("d")
+        self.values = array("d")
+        self.end = 0  # 下一个点的序号
+
+    @property
+    def start(self) -> int:
+        return self.end - len(self.ts)
+
+    def append(self, ts: float, value: float) -> None:
+        if len(self.ts) < self.capacity:
+            self.ts.append(ts)
+            self.values.append(value)
+        else:
+            i = self.end % self.capacity
+            self.ts[i] = ts
+            self.values[i] = value
+        self.end += 1
+
+    def time(self, seq: int) -> float:
+        return self.ts[seq % self.capacity]
+
+    def value(self, seq: int) -> float:
+        return self.values[seq % self.capacity]
+
+    def seek(self, since: float) -> int:
+        """第一个时间戳 >= since 的点的序号"""
+        lo, hi = self.start, self.end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.time(mid) < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def slice(self, first: int) -> List[float]:
+        return [self.value(seq) for seq in range(max(first, self.start), self.end)]
+
+
+class _Running:
+    """单个窗口的增量聚合：累加和 + 最大/最小值的单调队列（存序号），可选的窗口内有序值列表"""
+
+    def __init__(self, span: float, ordered: bool = False):
+        self.span = span
+        self.first = 0  # 窗口内第一个点的序号
+        self.total = 0.0
+        self.maxq: Deque[int] = deque()
+        self.minq: Deque[int] = deque()
+        self.sorted: Optional[List[float]] = [] if ordered else None
+
+    def push(self, ring: _Ring, seq: int) -> None:
+        value = ring.value(seq)
+        self.total += value
+        if self.sorted is not None:
+            bisect.insort(self.sorted, value)
+        while self.maxq and ring.value(self.maxq[-1]) <= value:
+            self.maxq.pop()
+        self.maxq.append(seq)
+        while self.minq and ring.value(self.minq[-1]) >= value:
+            self.minq.pop()
+        self.minq.append(seq)
+
+    def expire(self, ring: _Ring, before_seq: int, since: float) -> None:
+        """移出时间早于 since 的点，以及序号小于 before_seq（即将被覆盖）的点；须在写入新点之前调用"""
+        while self.first < ring.end and (self.first < before_seq or ring.time(self.first) < since):
+            value = ring.value(self.first)
+            self.total -= value
+            if self.sorted is not None:
+                del self.sorted[bisect.bisect_left(self.sorted, value)]
+            self.first += 1
+        while self.maxq and self.maxq[0] < self.first:
+            self.maxq.popleft()
+        while self.minq and self.minq[0] < self.first:
+            self.minq.popleft()
+
+
+class SlidingWindow:
+    """
+    单个指标的滑动窗口：一个环形缓冲区 + 每个配置窗口的增量聚合。
+    配置窗口的 mean/max/min 为 O(1)；其他窗口长度（不超过缓冲区覆盖的时间）按需扫描计算。
+    ordered 为 True 时配置窗口另外维护有序列表，分位数查询为 O(1)，每次写入 O(窗口点数) 的内存移动。
+    """
+
+    def __init__(self, spans: Iterable[float], capacity: int, ordered: bool = False):
+        self._ring = _Ring(capacity)
+        self._ordered = ordered
+        self._running: Dict[float, _Running] = {span: _Running(span, ordered) for span in spans}
+
+    def __len__(self) -> int:
+        return len(self._ring.ts)
+
+    def update(self, ts: float, value: float) -> None:
+        ring = self._ring
+        if ring.end and ts < ring.time(ring.end - 1):
+            # 时钟回拨：丢弃旧数据，保证时间戳单调
+            self.__init__(self._running.keys(), ring.capacity, self._ordered)
+            ring = self._ring
+        # 缓冲区已满时，即将被覆盖的点要在覆盖前移出各窗口（移出时要读取它的值）
+        evict = ring.end - ring.capacity + 1
+        for running in self._running.values():
+            running.expire(ring, evict, ts - running.span)
+        seq = ring.end
+        ring.append(ts, value)
+        for running in self._running.values():
+            running.push(ring, seq)
+
+    def _first(self, span: float) -> int:
+        ring = self._ring
+        running = self._running.get(span)
+        if running is not None:
+            return running.first
+        return ring.seek(ring.time(ring.end - 1) - span) if ring.end else 0
+
+    def values(self, span: float) -> List[float]:
+        return self._ring.slice(self._first(span))
+
+    def mean(self, span: float) -> Optional[float]:
+        running = self._running.get(span)
+        if running is None:
+            values = self.values(span)
+            return sum(values) / len(values) if values else None
+        count = self._ring.end - running.first
+        return running.total / count if count else None
+
+    def max(self, span: float) -> Optional[float]:
+        running = self._running.get(span)
+        if running is None:
+            return max(self.values(span), default=None)
+        return self._ring.value(running.maxq[0]) if running.maxq else None
+
+    def min(self, span: float) -> Optional[float]:
+        running = self._running.get(span)
+        if running is None:
+            return min(self.values(span), default=None)
+        return self._ring.value(running.minq[0]) if running.minq else None
+
+    def quantile(self, span: float, q: float) -> Optional[float]:
+        running = self._running.get(span)
+        if running is not None and running.sorted is not None:
+            return quantile(running.sorted, q)
+        return quantile(sorted(self.values(span)), q)
+
+    def rate(self, span: float) -> Optional[float]:
+        """窗口内首尾两点的每秒变化量"""
+        ring = self._ring
+        first = max(self._first(span), ring.start)
+        if ring.end - first < 2:
+            return None
+        dt = ring.time(ring.end - 1) - ring.time(first)
+        return (ring.value(ring.end - 1) - ring.value(first)) / dt if dt > 0 else None
+
+    def summary(self, span: float) -> Dict[str, Any]:
+        ring = self._ring
+        first = max(self._first(span), ring.start)
+        ordered = sorted(ring.slice(first))
+        if not ordered:
+            return {"count": 0}
+        result = {
+            "count": len(ordered),
+            "span": round(ring.time(ring.end - 1) - ring.time(first), 3),
+            "last": ring.value(ring.end - 1),
+            "mean": self.mean(span),
+            "min": ordered[0],
+            "max": ordered[-1],
+        }
+        for q in QUANTILES:
+            result[f"p{round(q * 100)}"] = quantile(ordered, q)
+        return result
+
+
+class WindowStore:
+    """
+    所有指标的滑动窗口：由采样线程写入（update），接口与告警读取。
+    缓冲区容量按最长窗口与采样周期确定，超过最长窗口的查询只覆盖缓冲区内的数据。
+    """
+
+    def __init__(self, windows: Optional[Dict[str, float]] = None, interval: float = 5.0):
+        self.windows = dict(windows or DEFAULT_WINDOWS)
+        longest = max(self.windows.values())
+        self.capacity = max(MIN_CAPACITY, min(MAX_CAPACITY, int(longest / interval) + MIN_CAPACITY))
+        self._metrics: Dict[str, SlidingWindow] = {}
+        self._lock = threading.Lock()
+
+    def update(self, metrics: Dict[str, float], timestamp: float) -> None:
+        spans = list(self.windows.values())
+        with self._lock:
+            for name, value in metrics.items():
+                window = self._metrics.get(name)
+                if window is None:
+                    window = self._metrics[name] = SlidingWindow(spans, self.capacity)
+                window.update(timestamp, float(value))
+            # 消失的指标（如被移除的网卡）不再保留
+            if len(self._metrics) > len(metrics):
+                for name in [n for n in self._metrics if n not in metrics]:
+                    del self._metrics[name]
+
+    def match(self, field: str) -> List[str]:
+        """按完整指标名或末尾字段名（如 'cpu_percent_overall'、'percent'）查找指标"""
+        with self._lock:
+            if field in self._metrics:
+                return [field]
+            suffix = "." + field
+            return sorted(name for name in self._metrics if name.endswith(suffix))
+
+    def summary(self, field: str, span: float) -> Dict[str, Dict[str, Any]]:
+        """返回 {指标名: {'count', 'span', 'last', 'mean', 'min', 'max', 'p50', 'p90', 'p95', 'p99'}}"""
+        names = self.match(field)
+        with self._lock:
+            return {name: self._metrics[name].summary(span) for name in names if name in self._metrics}
+
+
+if __name__ == "__main__":
+    # 基准：1000 个指标、每 5 秒一次采样，维护 1m/5m/15m 三个窗口
+    import random
+    import time
+
+    store = WindowStore(interval=5.0)
+    names = [f"m.{i}" for i in range(1000)]
+    ts = 0.0
+    start = time.perf_counter()
+    for _ in range(1000):
+        ts += 5
+        store.update({name: random.random() * 100 for name in names}, ts)
+    per_tick = (time.perf_counter() - start) / 1000
+    print(f"update: {per_tick * 1000:.2f} ms/tick for {len(names)} metrics, capacity {store.capacity} points")
+    start = time.perf_counter()
+    summary = store.summary("m.7", parse_window("5m"))
+    print(f"query: {(time.perf_counter() - start) * 1000:.3f} ms", summary)
+
+    # 正确性：与直接计算比较
+    w = SlidingWindow([30.0], capacity=8, ordered=True)
+    points = [(t, random.random()) for t in range(0, 200, 3)]
+    for t, v in points:
+        w.update(float(t), v)
+        inside = [x for tt, x in points if t - 30 <= tt <= t][-8:]
+        assert abs(w.mean(30.0) - sum(inside) / len(inside)) < 1e-9
+        assert w.max(30.0) == max(inside) and w.min(30.0) == min(inside)
+        assert w.quantile(30.0, 0.9) == quantile(sorted(inside), 0.9)
+    print("ok")